@@ -0,0 +1,129 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+
+
+Microbenchmark of hot lookups made by SQLObject ``selectBy`` and by
+prepared queries of DBHandler.
+
+Run from root directory of project:
+
+    python -m benchmarks.prepared_queries --calls 20000
+"""
+
+import argparse
+import os
+import tempfile
+from time import perf_counter
+from typing import Any
+from typing import Callable
+
+from loguru import logger
+from sqlobject.sqlbuilder import AND
+
+from mod.db import models
+from mod.db.dbhandler import DBHandler
+
+USER_UUID = "123456"
+FLOW_UUID = "07d949"
+
+
+def measure(function: Callable[[], Any],
+            calls: int) -> float:
+    """
+    Measures average time of one call.
+
+    Args:
+        function: called function
+        calls: quantity of calls
+
+    Returns:
+        time of one call in microseconds
+    """
+
+    function()
+    start = perf_counter()
+    for _ in range(calls):
+        function()
+    return (perf_counter() - start) / calls * 1_000_000
+
+
+def main() -> None:
+    """
+    Parses arguments, runs benchmark and prints results.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark of prepared"
+                                                 " queries")
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--messages", type=int, default=1000)
+    args = parser.parse_args()
+
+    logger.remove()
+    directory = tempfile.TemporaryDirectory()
+    path = os.path.join(directory.name, "benchmark.db")
+    database = DBHandler(uri=f"sqlite:{path}")
+    database.create_table()
+    database.add_user(uuid=USER_UUID,
+                      login="login",
+                      password="password")
+    database.add_flow(uuid=FLOW_UUID,
+                      users=[USER_UUID])
+    database.add_messages([{"flow_uuid": FLOW_UUID,
+                            "user_uuid": USER_UUID,
+                            "message_uuid": str(number),
+                            "time": number}
+                           for number in range(args.messages)])
+    connection = database.connection
+    flow_id = database.get_flow_by_uuid(FLOW_UUID).id
+    recent = args.messages - 20
+
+    cases = {
+        "user by uuid": (
+            lambda: models.UserConfig.selectBy(connection,
+                                               uuid=USER_UUID).getOne(),
+            lambda: database.get_user_by_uuid(USER_UUID)),
+        "user by login": (
+            lambda: models.UserConfig.selectBy(connection,
+                                               login="login").getOne(),
+            lambda: database.get_user_by_login("login")),
+        "flow by uuid": (
+            lambda: models.Flow.selectBy(connection,
+                                         uuid=FLOW_UUID).getOne(),
+            lambda: database.get_flow_by_uuid(FLOW_UUID)),
+        "messages by flow and time": (
+            lambda: list(models.Message.select(
+                AND(models.Message.q.flowID == flow_id,
+                    models.Message.q.time >= recent),
+                connection=connection)[:20]),
+            lambda: database.queries["messages_by_flow_and_time"].page(
+                flow_id, recent, limit=20))}
+
+    for name, (select, prepared) in cases.items():
+        before = measure(select, args.calls)
+        after = measure(prepared, args.calls)
+        print(f"{name}: select {before:.1f} us, prepared {after:.1f} us,"
+              f" {before / after:.2f}x")
+
+    connection.close()
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
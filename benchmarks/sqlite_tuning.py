@@ -0,0 +1,220 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+
+Benchmark of concurrent "get_update" reads during "send_message" write storm
+with stock SQLite settings and with tuning profile from config.
+
+Run from root directory of project:
+
+    python -m benchmarks.sqlite_tuning --writers 4 --readers 4 --messages 200
+"""
+
+import argparse
+import os
+from statistics import median
+import tempfile
+import threading
+from time import perf_counter
+from typing import Any
+from typing import Optional
+from uuid import uuid4
+
+from loguru import logger
+
+from mod.config.models import ConfigModel
+from mod.db.dbhandler import DBHandler
+from mod.protocol import worker
+from mod.protocol.registry import RequestContext
+from mod.protocol.session import Session
+
+USER_UUID = "123456"
+AUTH_ID = "auth_id"
+FLOW_UUID = "07d949"
+
+
+def make_request(request_type: str,
+                 data: dict[str, Any]) -> dict[str, Any]:
+    """
+    Makes request of authenticated user.
+
+    Args:
+        request_type: type of request
+        data: Data object without user
+
+    Returns:
+        request in dict format
+    """
+
+    data["user"] = [{"uuid": USER_UUID,
+                     "auth_id": AUTH_ID}]
+    return {"type": request_type,
+            "data": data,
+            "jsonapi": {"version": "1.0"}}
+
+
+def percentile(values: list[float],
+               part: float) -> float:
+    """
+    Gives out value of percentile.
+
+    Args:
+        values: list of measurements
+        part: percentile from 0 to 1
+
+    Returns:
+        value of percentile or 0 if there are no values
+    """
+
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * part))]
+
+
+def run(pragmas: Optional[dict[str, Any]],
+        writers: int,
+        readers: int,
+        messages: int) -> dict[str, Any]:
+    """
+    Runs write storm with concurrent readers on new database file.
+
+    Args:
+        pragmas: tuning profile or None for stock settings
+        writers: quantity of threads which send messages
+        readers: quantity of threads which request updates
+        messages: quantity of messages sent by every writer
+
+    Returns:
+        dict with results of measurement
+    """
+
+    config = ConfigModel()
+    directory = tempfile.TemporaryDirectory()
+    path = os.path.join(directory.name, "benchmark.db")
+    database = DBHandler(uri=f"sqlite:{path}",
+                         pool_max_size=writers + readers + 1,
+                         sqlite_pragmas=pragmas)
+    database.create_table()
+    database.add_user(uuid=USER_UUID,
+                      login="login",
+                      password="password",
+                      auth_id=AUTH_ID)
+    database.add_flow(uuid=FLOW_UUID,
+                      users=[USER_UUID],
+                      time_created=1,
+                      flow_type="chat",
+                      title="benchmark",
+                      info="benchmark",
+                      owner=USER_UUID)
+
+    lock = threading.Lock()
+    done = threading.Event()
+    read_times: list[float] = []
+    write_times: list[float] = []
+    failed = {"read": 0, "write": 0}
+
+    def call(request: dict[str, Any]) -> bool:
+        ctx = RequestContext(database, config, Session())
+        try:
+            response = worker.process(request, ctx)
+        except Exception:
+            return False
+        return response.errors.code == 200
+
+    def writer() -> None:
+        for number in range(messages):
+            request = make_request("send_message",
+                                   {"flow": [{"uuid": FLOW_UUID}],
+                                    "message": [{"uuid": str(uuid4()),
+                                                 "text": f"text {number}",
+                                                 "client_id": number}]})
+            start = perf_counter()
+            success = call(request)
+            with lock:
+                write_times.append(perf_counter() - start)
+                failed["write"] += not success
+
+    def reader() -> None:
+        while not done.is_set():
+            start = perf_counter()
+            success = call(make_request("get_update", {"time": 1}))
+            with lock:
+                read_times.append(perf_counter() - start)
+                failed["read"] += not success
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    threads_read = [threading.Thread(target=reader) for _ in range(readers)]
+    start = perf_counter()
+    for thread in threads + threads_read:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - start
+    done.set()
+    for thread in threads_read:
+        thread.join()
+
+    database.connection.close()
+    directory.cleanup()
+    return {"elapsed": elapsed,
+            "writes": len(write_times),
+            "write_p50": median(write_times) if write_times else 0.0,
+            "write_p99": percentile(write_times, 0.99),
+            "write_errors": failed["write"],
+            "reads": len(read_times),
+            "read_p50": median(read_times) if read_times else 0.0,
+            "read_p99": percentile(read_times, 0.99),
+            "read_errors": failed["read"]}
+
+
+def main() -> None:
+    """
+    Parses arguments, runs benchmark and prints results.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark of SQLite"
+                                                 " tuning profile")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+
+    logger.remove()
+    profiles = {"stock": None,
+                "tuned": ConfigModel().sqlite.pragmas()}
+
+    for name, pragmas in profiles.items():
+        result = run(pragmas,
+                     args.writers,
+                     args.readers,
+                     args.messages)
+        print(f"{name}: {result['elapsed']:.2f} s,"
+              f" writes {result['writes']}"
+              f" (p50 {result['write_p50'] * 1000:.1f} ms,"
+              f" p99 {result['write_p99'] * 1000:.1f} ms,"
+              f" errors {result['write_errors']}),"
+              f" reads {result['reads']}"
+              f" (p50 {result['read_p50'] * 1000:.1f} ms,"
+              f" p99 {result['read_p99'] * 1000:.1f} ms,"
+              f" errors {result['read_errors']})")
+
+
+if __name__ == "__main__":
+    main()
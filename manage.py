@@ -15,6 +15,7 @@ from rich.table import Table
 from mod.config.handler import read_config
 from mod.config.models import ConfigModel
 from mod.db.dbhandler import DBHandler, DatabaseReadError, DatabaseAccessError, DatabaseWriteError
+from mod.lib import calibrate_scrypt
 from mod.lib import Hash
 
 cli = typer.Typer(help="CLI for management MoreliaServer",
@@ -46,7 +47,8 @@ def devserver(host: str = typer.Option("127.0.0.1",
                 port=port,
                 log_level=log_level,
                 debug=True,
-                reload=True)
+                reload=True,
+                ws_max_size=config_option.limits.frame_size)
 
 
 @cli.command()
@@ -95,6 +97,39 @@ def delete_tables():
         rich_output.print("[green]Tables in db successful deleted.")
 
 
+@cli.command()
+def compact(days: int = typer.Option(config_option.database.compact_after,
+                                     help="Age of deleted messages and "
+                                          "users in days"),
+            batch_size: int = typer.Option(
+                config_option.database.compact_batch_size,
+                help="Rows removed in one transaction"),
+            vacuum_pages: int = typer.Option(
+                config_option.database.vacuum_pages,
+                help="Pages freed in one step of vacuum"),
+            full: bool = typer.Option(False,
+                                      "--full",
+                                      help="Rebuild whole database file. "
+                                           "Blocks database until finished")):
+    database = DBHandler(config_option.database.url)
+    try:
+        result = database.compact(days,
+                                  batch_size,
+                                  vacuum_pages)
+        if full:
+            result["pages"] += database.vacuum(full=True)
+    except (DatabaseReadError,
+            DatabaseAccessError,
+            DatabaseWriteError) as err:
+        rich_output.print(f"[red]The database is unavailable, "
+                          f"database not compacted. {err}")
+    else:
+        rich_output.print(f"[green]Removed {result['messages']} messages, "
+                          f"{result['users']} users, "
+                          f"{result['joins']} flow members. "
+                          f"Freed {result['pages']} pages.")
+
+
 @cli.command()
 def create_user(login: str = typer.Argument(..., help="Login"),
                 username: Optional[str] = typer.Option(None, help="Username. If value is set to None, "
@@ -111,12 +146,17 @@ def create_user(login: str = typer.Argument(..., help="Login"),
     db = DBHandler(config_option.database.url)
 
     uuid = str(uuid4().int)
+    hash_options = config_option.hash_size.hash_options()
 
     try:
         db.add_user(uuid=uuid,
                     login=login,
                     password=password,
-                    hash_password=Hash(password, uuid).password_hash(),
+                    hash_password=Hash(password,
+                                       uuid,
+                                       b"salt",
+                                       b"key",
+                                       **hash_options).password_hash(),
                     username=username,
                     salt=b"salt",
                     key=b"key")
@@ -141,6 +181,40 @@ def create_user(login: str = typer.Argument(..., help="Login"),
         rich_output.print(output_table)
 
 
+@cli.command()
+def calibrate_kdf(target: float = typer.Option(0.25,
+                                               help="Wanted time of one "
+                                                    "password hash in "
+                                                    "seconds"),
+                  scrypt_r: int = typer.Option(
+                      config_option.hash_size.scrypt_r,
+                      help="Block size of scrypt"),
+                  scrypt_p: int = typer.Option(
+                      config_option.hash_size.scrypt_p,
+                      help="Parallelization of scrypt")):
+    results = calibrate_scrypt(target,
+                               scrypt_r,
+                               scrypt_p)
+
+    output_table = Table(box=box.SQUARE,
+                         header_style="bold green")
+
+    output_table.add_column("scrypt_n", justify="center")
+    output_table.add_column("Time, ms", justify="center")
+
+    for n, elapsed in results:
+        output_table.add_row(f"{n}",
+                             f"{elapsed * 1000:.1f}")
+
+    rich_output.print(output_table)
+    rich_output.print("Put in \\[hash_size] section of config:",
+                      style="bold green")
+    rich_output.print(f"scrypt_n = {results[-1][0]}\n"
+                      f"scrypt_r = {scrypt_r}\n"
+                      f"scrypt_p = {scrypt_p}",
+                      style="bold bright_yellow")
+
+
 @cli.command()
 def create_group(owner_login: str) -> None:
     db = DBHandler(config_option.database.url)
@@ -150,14 +224,13 @@ def create_group(owner_login: str) -> None:
     except DatabaseWriteError:
         rich_output.print("[red]Database write error, user not created. Check that tables is exist")
     else:
-        new_flow = db.add_flow(uuid=str(uuid4().int),
-                               users=[user.uuid],
-                               time_created=int(time()),
-                               flow_type="group",
-                               title="Test",
-                               info="Test flow",
-                               owner=user.uuid)
-        new_flow.addUserConfig(user)
+        db.add_flow(uuid=str(uuid4().int),
+                    users=[user.uuid],
+                    time_created=int(time()),
+                    flow_type="group",
+                    title="Test",
+                    info="Test flow",
+                    owner=user.uuid)
         rich_output.print("Flow created")
 
 
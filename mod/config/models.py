@@ -27,6 +27,94 @@ class DatabaseModel(BaseModel):
     Validation scheme for database field in configuration file.
     """
     url: str = "sqlite:db_sqlite.db"
+    # Connections opened on server start
+    pool_min_size: int = 1
+    # Maximum connections used at the same time
+    pool_max_size: int = 10
+    # Time in seconds to wait for free connection
+    pool_timeout: float = 5.0
+    # Reuse one connection for all queries made from one thread, queries
+    # of one request share connection in any case
+    pool_per_thread: bool = True
+    # Time in milliseconds to collect messages for one transaction,
+    # 0 disables group commit
+    write_window: float = 2
+    # Maximum messages saved in one transaction
+    write_batch_size: int = 100
+    # Time in seconds to wait for commit of message
+    write_timeout: float = 30
+    # Cache of rows read from database
+    cache_enabled: bool = True
+    # Maximum rows in cache of one table, 0 is unlimited
+    cache_max_entries: int = 1000
+    # Time in seconds to keep row in cache, 0 is unlimited
+    cache_ttl: float = 0
+    # Age of message in days after which it is moved to archive table,
+    # 0 disables archiving
+    archive_after: int = 0
+    # Time in seconds between runs of archiving
+    archive_interval: float = 3600
+    # Maximum messages moved to archive in one transaction
+    archive_batch_size: int = 500
+    # Age of deleted message or user in days after which it is purged
+    compact_after: int = 30
+    # Time in seconds between runs of background compaction,
+    # 0 disables it
+    compact_interval: float = 0
+    # Maximum rows purged in one transaction
+    compact_batch_size: int = 500
+    # Maximum free pages returned to file system by one step of vacuum
+    vacuum_pages: int = 100
+    # Record latency of DBHandler methods and queries
+    metrics_enabled: bool = True
+    # Time in milliseconds after which query is written to log,
+    # 0 disables slow query log
+    slow_query: float = 100
+    # Users in cache of uuid, login and auth_id, 0 disables cache
+    identity_cache_size: int = 10000
+    # Keep members of flows in memory, loaded on start of server
+    membership_index: bool = True
+    # Last messages of one flow kept in memory, 0 disables cache
+    recent_messages: int = 100
+    # Maximum estimated size in bytes of last messages of all flows
+    recent_cache_bytes: int = 16777216
+
+
+class SqliteModel(BaseModel):
+    """
+    Validation scheme for sqlite field in configuration file.
+    """
+    # Apply tuning profile to every new connection to SQLite database
+    enabled: bool = True
+    # WAL allows readers to work at the same time with writer
+    journal_mode: str = "WAL"
+    # NORMAL is safe with WAL and does not sync on every commit, so the
+    # last commits reported to clients can be lost by power failure,
+    # FULL syncs every commit
+    synchronous: str = "NORMAL"
+    # Negative value is size of page cache in KiB
+    cache_size: int = -20000
+    # Size of memory-mapped I/O in bytes
+    mmap_size: int = 268435456
+    # Time in milliseconds to wait for locked database
+    busy_timeout: int = 5000
+    temp_store: str = "MEMORY"
+    # INCREMENTAL allows to free pages in small steps, it is applied
+    # to database created after it is set or after full vacuum
+    # (manage.py compact --full)
+    auto_vacuum: str = "INCREMENTAL"
+
+    def pragmas(self) -> dict[str, int | str]:
+        """
+        Gives out tuning profile for DBHandler.
+
+        Returns:
+            dict where key is name of PRAGMA, empty if tuning disabled
+        """
+
+        if not self.enabled:
+            return {}
+        return self.dict(exclude={"enabled"})
 
 
 class HashSizeModel(BaseModel):
@@ -35,6 +123,37 @@ class HashSizeModel(BaseModel):
     """
     size_password: int = 32
     size_auth_id: int = 16
+    # Function which makes password hash, "scrypt" or "blake2b"
+    kdf: str = "scrypt"
+    # Cost of scrypt: CPU/memory cost (power of 2), block size and
+    # parallelization, "manage.py calibrate-kdf" picks cost for host
+    scrypt_n: int = 16384
+    scrypt_r: int = 8
+    scrypt_p: int = 1
+    # Processes which compute password hashes, 0 - compute in thread
+    # of request
+    kdf_processes: int = 2
+
+    def hash_options(self) -> dict[str, int | str]:
+        """
+        Gives out parameters of password hash for Hash.
+
+        Returns:
+            dict where key is name of argument of Hash
+        """
+
+        return self.dict(exclude={"kdf_processes"})
+
+
+class AuthModel(BaseModel):
+    """
+    Validation scheme for auth field in configuration file.
+    """
+    # Keys which sign tokens, the first key signs new tokens, others
+    # only check old tokens. Random key is used if list is empty
+    secret_keys: list[str] = []
+    # Lifetime of token in seconds
+    token_ttl: int = 86400
 
 
 class LoggingModel(BaseModel):
@@ -58,6 +177,24 @@ class LimitsModel(BaseModel):
     """
     messages: int = 100
     users: int = 100
+    # Size of one websocket frame in bytes. Uvicorn must be started with
+    # the same "--ws-max-size" to drop larger frames before they are
+    # read, server answers 413 to larger frames which reach it
+    frame_size: int = 10485760
+    # Length of message text in characters
+    text_length: int = 10000
+    # Size of one attachment (picture, video, audio, document, emoji)
+    # in bytes
+    attachment_size: int = 5242880
+    # Users in one flow created by add_flow
+    flow_users: int = 1000
+    # Attempts of authentication and registration allowed at once and
+    # restored in one minute for one client address, 0 - no limit
+    auth_host_burst: int = 20
+    auth_host_per_minute: int = 30
+    # The same for one login
+    auth_login_burst: int = 5
+    auth_login_per_minute: int = 5
 
 
 class ApiModel(BaseModel):
@@ -75,8 +212,12 @@ class ConfigModel(BaseModel):
 
     # Database section
     database: DatabaseModel = DatabaseModel()
+    # SQLite tuning section
+    sqlite: SqliteModel = SqliteModel()
     # Hash size section
     hash_size: HashSizeModel = HashSizeModel()
+    # Authentication tokens section
+    auth: AuthModel = AuthModel()
     # Logging section
     logging: LoggingModel = LoggingModel()
     # Server limit section
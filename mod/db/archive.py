@@ -0,0 +1,106 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from itertools import chain
+from typing import Any
+from typing import Iterator
+
+from sqlobject.sresults import SelectResults
+
+
+class MessageHistory:
+    """
+    Messages of flow stored in archive and in Message table.
+
+    Notes:
+        Behaves like one SelectResults: archived messages go first,
+        then messages from Message table. Part is counted only when
+        slice goes beyond it, so reading recent part of history does
+        not touch archive more than one COUNT query.
+
+    Args:
+        *parts: results of queries in order of history
+    """
+
+    def __init__(self,
+                 *parts: SelectResults) -> None:
+        self.parts = parts
+
+    def count(self) -> int:
+        """
+        Gives out quantity of messages in all parts.
+
+        Returns:
+            quantity of messages
+        """
+
+        return sum(part.count() for part in self.parts)
+
+    def __iter__(self) -> Iterator[Any]:
+        """
+        Iterates over messages of all parts.
+        """
+
+        return chain.from_iterable(self.parts)
+
+    def __getitem__(self,
+                    key: int | slice) -> Any:
+        """
+        Gives out message by number or list of messages by slice.
+
+        Args:
+            key: number of message or slice without step
+
+        Returns:
+            message or list of messages
+
+        Raises:
+            IndexError: occurs when there is no message with number
+            ValueError: occurs when slice has step or negative index
+        """
+
+        if isinstance(key, int):
+            items = self[key:key + 1] if key >= 0 else []
+            if not items:
+                raise IndexError("Message history index out of range")
+            return items[0]
+
+        if key.step is not None:
+            raise ValueError("Step of slice is not supported")
+        start = 0 if key.start is None else key.start
+        stop = key.stop
+        if start < 0 or (stop is not None and stop < 0):
+            raise ValueError("Negative index is not supported")
+
+        items: list[Any] = []
+        for number, part in enumerate(self.parts):
+            if stop is not None and stop <= 0:
+                break
+            if number == len(self.parts) - 1:
+                items.extend(part[start:stop])
+                break
+            size = part.count()
+            if start < size:
+                items.extend(part[start:stop])
+            start = max(start - size, 0)
+            if stop is not None:
+                stop -= size
+        return items
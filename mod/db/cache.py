@@ -0,0 +1,309 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+from collections import OrderedDict
+from time import monotonic
+from typing import Any
+from weakref import ref
+
+from sqlobject.cache import CacheFactory
+from sqlobject.cache import CacheSet
+
+
+class BoundedCache(CacheFactory):
+    """
+    Cache of rows of one table with limited size and time to live.
+
+    Notes:
+        Replaces culling of SQLObject cache by LRU order: when cache is
+        full, least recently used row is moved to cache of weak
+        references, so it is kept in memory only while it is used.
+
+        Row which stays in cache longer than ``ttl`` is expired, its
+        values are read from database again on next access.
+
+        If ``cache`` is False then rows are not cached, as it does
+        SQLObject, only weak references are kept.
+
+    Args:
+        max_entries: maximum quantity of rows in cache, 0 is unlimited
+        ttl: time in seconds to keep row in cache, 0 is unlimited
+        cache: enable or disable cache
+    """
+
+    def __init__(self,
+                 max_entries: int = 1000,
+                 ttl: float = 0,
+                 cache: bool = True) -> None:
+        super().__init__(cache=cache)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stored: dict[Any, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        if self.doCache:
+            self.cache = OrderedDict()
+
+    def _store(self,
+               id_: Any,
+               obj: Any) -> None:
+        """
+        Puts row in cache and evicts least recently used rows.
+
+        Notes:
+            Must be called when lock is acquired.
+        """
+
+        self.cache[id_] = obj
+        self.cache.move_to_end(id_)
+        if self.ttl:
+            self.stored[id_] = monotonic()
+
+        while self.max_entries and len(self.cache) > self.max_entries:
+            old_id, old_obj = self.cache.popitem(last=False)
+            self.stored.pop(old_id, None)
+            self.expiredCache[old_id] = ref(old_obj)
+            self.evictions += 1
+
+        if self.max_entries and len(self.expiredCache) > self.max_entries:
+            for key in list(self.expiredCache):
+                if self.expiredCache[key]() is None:
+                    del self.expiredCache[key]
+
+    def _is_stale(self,
+                  id_: Any) -> bool:
+        """
+        Checks that row is in cache longer than time to live.
+        """
+
+        if not self.ttl:
+            return False
+        return monotonic() - self.stored.get(id_, monotonic()) > self.ttl
+
+    def tryGet(self,
+               id_: Any) -> Any:
+        """
+        Returns row from cache or None, statistics is not changed.
+        """
+
+        value = self.expiredCache.get(id_)
+        if value is not None:
+            return value()
+        if not self.doCache:
+            return None
+        return self.cache.get(id_)
+
+    def get(self,
+            id_: Any) -> Any:
+        """
+        Returns row from cache.
+
+        Notes:
+            As in SQLObject, if row is not found then None is returned
+            and lock is kept until ``finishPut`` is called.
+        """
+
+        if not self.doCache:
+            val = super().get(id_)
+            if val is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return val
+
+        self.lock.acquire()
+        val = self.cache.get(id_)
+        if val is None:
+            weak = self.expiredCache.pop(id_, None)
+            val = weak() if weak is not None else None
+
+        if val is None:
+            self.misses += 1
+            return None
+
+        if self._is_stale(id_):
+            self.cache.pop(id_, None)
+            self.stored.pop(id_, None)
+            self.expirations += 1
+            self.misses += 1
+            self.lock.release()
+            # Values of row will be read from database on next access
+            val.expire()
+            self.lock.acquire()
+            current = self.cache.get(id_)
+            if current is not None:
+                self.lock.release()
+                return current
+        else:
+            self.hits += 1
+
+        self._store(id_, val)
+        self.lock.release()
+        return val
+
+    def put(self,
+            id_: Any,
+            obj: Any) -> None:
+        """
+        Puts row in cache, called when lock is acquired by ``get``.
+        """
+
+        if self.doCache:
+            self._store(id_, obj)
+        else:
+            self.expiredCache[id_] = ref(obj)
+
+    def created(self,
+                id_: Any,
+                obj: Any) -> None:
+        """
+        Puts new row in cache, called after INSERT.
+        """
+
+        if not self.doCache:
+            self.expiredCache[id_] = ref(obj)
+            return
+
+        with self.lock:
+            self._store(id_, obj)
+
+    def cull(self) -> None:
+        """
+        Removes dead weak references, rows are evicted by LRU order.
+        """
+
+        with self.lock:
+            for key in list(self.expiredCache):
+                if self.expiredCache[key]() is None:
+                    del self.expiredCache[key]
+
+    def expire(self,
+               id_: Any) -> None:
+        """
+        Removes row from cache, typically called after delete.
+        """
+
+        super().expire(id_)
+        self.stored.pop(id_, None)
+
+    def expireAll(self) -> None:
+        """
+        Moves all rows in cache of weak references.
+        """
+
+        if not self.doCache:
+            return
+
+        with self.lock:
+            for key, value in self.cache.items():
+                self.expiredCache[key] = ref(value)
+            self.cache = OrderedDict()
+            self.stored = {}
+
+    def clear(self) -> None:
+        """
+        Removes everything from cache.
+        """
+
+        super().clear()
+        self.stored = {}
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Gives out counters of cache.
+
+        Returns:
+            dict with quantity of rows, hits, misses, evictions
+            and expirations
+        """
+
+        total = self.hits + self.misses
+        return {"size": len(self.cache) if self.doCache else 0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations}
+
+
+class BoundedCacheSet(CacheSet):
+    """
+    Set of ``BoundedCache``, one cache for every table.
+
+    Args:
+        max_entries: maximum quantity of rows in cache of one table
+        ttl: time in seconds to keep row in cache
+        cache: enable or disable cache
+    """
+
+    def __init__(self,
+                 max_entries: int = 1000,
+                 ttl: float = 0,
+                 cache: bool = True) -> None:
+        super().__init__(max_entries=max_entries,
+                         ttl=ttl,
+                         cache=cache)
+
+    def _cache(self,
+               cls: Any) -> BoundedCache:
+        """
+        Gives out cache of table, creates it if there is no cache.
+        """
+
+        try:
+            return self.caches[cls.__name__]
+        except KeyError:
+            cache = BoundedCache(**self.kw)
+            self.caches[cls.__name__] = cache
+            return cache
+
+    def get(self,
+            id_: Any,
+            cls: Any) -> Any:
+        """
+        Returns row of table from cache.
+        """
+
+        return self._cache(cls).get(id_)
+
+    def created(self,
+                id_: Any,
+                cls: Any,
+                obj: Any) -> None:
+        """
+        Puts new row of table in cache.
+        """
+
+        self._cache(cls).created(id_, obj)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """
+        Gives out counters of cache for every table.
+
+        Returns:
+            dict where key is name of table
+        """
+
+        return {name: cache.stats()
+                for name, cache in self.caches.items()}
@@ -20,18 +20,67 @@ along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
 """
 
 from collections import namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
 import inspect
 import sys
-from typing import Any, Optional
+from time import time as unix_time
+from types import SimpleNamespace
+from typing import Any, Iterable, Iterator, Optional
 
+from loguru import logger
 import sqlobject as orm
 from sqlobject import SQLObject
 from sqlobject.main import SQLObjectIntegrityError
 from sqlobject.main import SQLObjectNotFound
+from sqlobject.sqlbuilder import Alias
 from sqlobject.sqlbuilder import AND
+from sqlobject.sqlbuilder import DESC
+from sqlobject.sqlbuilder import func
+from sqlobject.sqlbuilder import IN
+from sqlobject.sqlbuilder import Insert
+from sqlobject.sqlbuilder import Select
+from sqlobject.sqlbuilder import SQLConstant
+from sqlobject.sqlbuilder import Update
 from sqlobject.sresults import SelectResults
 
 from mod.db import models
+from mod.db import versions
+from mod.db.archive import MessageHistory
+from mod.db.cache import BoundedCacheSet
+from mod.db.identity import IdentityCache
+from mod.db.identity import UserIdentity
+from mod.db.membership import MembershipIndex
+from mod.db.metrics import instrument_methods
+from mod.db.metrics import QueryMetrics
+from mod.db.periodic import PeriodicTask
+from mod.db.pool import ConnectionPool
+from mod.db.pool import PoolTimeoutError
+from mod.db.queries import PreparedQuery
+from mod.db.recent import RecentMessages
+from mod.db.tuning import tune_sqlite
+from mod.db.versions import DataVersions
+from mod.db.writer import GroupWriter
+
+# Maximum quantity of values in one IN condition or one bulk INSERT
+CHUNK_SIZE = 500
+# Names of global counters in Stats table
+STATS_COUNTERS = ("user_count",
+                  "flow_count",
+                  "message_count")
+# Columns of message kept in cache of recent messages
+RECENT_COLUMNS = ("uuid",
+                  "text",
+                  "user",
+                  "time",
+                  "flow",
+                  "file_picture",
+                  "file_video",
+                  "file_audio",
+                  "file_document",
+                  "emoji",
+                  "edited_time",
+                  "edited_status")
 
 
 class DatabaseReadError(SQLObjectNotFound):
@@ -47,12 +96,19 @@ class DatabaseAccessError(Exception):
     """
 
 
+class DatabasePoolError(DatabaseAccessError):
+    """
+    Occurs when there is no free connection in pool of connections.
+    """
+
+
 class DatabaseWriteError(SQLObjectNotFound):
     """
     Occurs when there is an unknown problem when writing to database.
     """
 
 
+@instrument_methods
 class DBHandler:
     """
     A layer for interaction with the database ORM.
@@ -67,17 +123,84 @@ class DBHandler:
                   or stderr, stdout
         path_to_models: path to the location of the file describing
                         database tables
+        pool_min_size: quantity of connections opened on start
+        pool_max_size: maximum quantity of connections used at the
+                       same time
+        pool_timeout: time in seconds to wait for free connection
+        pool_per_thread: reuse one connection for all queries in thread
+        sqlite_pragmas: tuning profile applied to every new connection
+                        to SQLite database, dict where key is name
+                        of PRAGMA like ``journal_mode``
+        cache_enabled: enable or disable cache of rows
+        cache_max_entries: maximum quantity of rows in cache of one
+                           table, 0 is unlimited
+        cache_ttl: time in seconds to keep row in cache, 0 is unlimited
+        metrics_enabled: record execution time of methods and queries
+        slow_query: time in milliseconds after which query is written
+                    to log, 0 disables log
+        identity_cache_size: maximum quantity of users in cache of
+                             uuid, login and auth_id, 0 disables cache
+        membership_index: keep members of flows in memory
+        recent_messages: maximum quantity of last messages kept in
+                         memory for one flow, 0 disables cache
+        recent_cache_bytes: maximum estimated size of cache of last
+                            messages of all flows
     """
     _logger: Optional[str]
     _loglevel: Optional[str]
+    # Methods which execution time is not recorded
+    _not_measured = ("unit_of_work",
+                     "cache_stats",
+                     "pool_stats",
+                     "query_stats",
+                     "identity_stats",
+                     "membership_stats",
+                     "recent_stats",
+                     "data_version")
 
     def __init__(self,
                  uri: str = 'sqlite:/:memory:',
                  debug: bool = False,
                  logger: str = 'stderr',
                  loglevel: str = 'critical',
-                 path_to_models: str = "mod.db.models") -> None:
+                 path_to_models: str = "mod.db.models",
+                 pool_min_size: int = 1,
+                 pool_max_size: int = 10,
+                 pool_timeout: float = 5.0,
+                 pool_per_thread: bool = True,
+                 sqlite_pragmas: Optional[dict[str, Any]] = None,
+                 cache_enabled: bool = True,
+                 cache_max_entries: int = 1000,
+                 cache_ttl: float = 0,
+                 metrics_enabled: bool = True,
+                 slow_query: float = 0,
+                 identity_cache_size: int = 10000,
+                 membership_index: bool = True,
+                 recent_messages: int = 100,
+                 recent_cache_bytes: int = 16777216) -> None:
         self.uri = uri
+        self.recent: Optional[RecentMessages] = None
+        self._recent_options = {"per_flow": recent_messages,
+                                "max_bytes": recent_cache_bytes}
+        self.metrics: Optional[QueryMetrics] = None
+        self.identities: Optional[IdentityCache] = None
+        self.membership: Optional[MembershipIndex] = None
+        self._membership_index = membership_index
+        self._identity_cache_size = identity_cache_size
+        self._metrics_options = {"enabled": metrics_enabled,
+                                 "slow_query": slow_query}
+        self._sqlite_pragmas = sqlite_pragmas
+        self._cache_options = {"max_entries": cache_max_entries,
+                               "ttl": cache_ttl,
+                               "cache": cache_enabled}
+        self.writer: Optional[GroupWriter] = None
+        self.archiver: Optional[PeriodicTask] = None
+        self.compactor: Optional[PeriodicTask] = None
+        self._vacuum_warned = False
+        self._pool_options = {"min_size": pool_min_size,
+                              "max_size": pool_max_size,
+                              "timeout": pool_timeout,
+                              "per_thread": pool_per_thread}
 
         if debug:
             self._debug = "1"
@@ -94,8 +217,7 @@ class DBHandler:
             self._uri = "".join((uri,
                                  f"?debug={self._debug}"))
 
-        self.connection = orm.connectionForURI(self._uri)
-        orm.sqlhub.processConnection = self.connection
+        self.__connect()
         self.path = path_to_models
 
     def __str__(self) -> str:
@@ -137,8 +259,167 @@ class DBHandler:
             class_ = getattr(models, item)
             class_.createTable(ifNotExists=True,
                                connection=self.connection)
+        if self.membership is not None:
+            self.membership.clear()
+        if self.recent is not None:
+            self.recent.clear()
+        self.versions.bump()
+
+        # Groups absent in database are treated as changed now
+        known = {row.name for row
+                 in models.ChangeTime.select(connection=self.connection)}
+        for name in versions.GROUPS:
+            if name not in known:
+                models.ChangeTime(connection=self.connection,
+                                  name=name,
+                                  time=unix_time())
+
+        # Counters added to existing database are calculated once
+        added = self.__add_missing_columns()
+        if added or models.Stats.select(connection=self.connection
+                                        ).count() < len(STATS_COUNTERS):
+            self.recount()
         return
 
+    def __add_missing_columns(self) -> bool:
+        """
+        Adds columns which described in models but absent in tables.
+
+        Notes:
+            Used to upgrade database created by previous version of
+            server. If database can't give out its schema, tables are
+            not changed.
+
+        Returns:
+            True if some column was added
+        """
+
+        added = False
+        for item in self.__search_db_in_models():
+            class_ = getattr(models, item)
+            table = class_.sqlmeta.table
+            style = class_.sqlmeta.style
+            try:
+                exists = {column.name for column
+                          in self.connection.columnsFromSchema(table,
+                                                               class_)}
+            except Exception:
+                continue
+
+            for column in class_.sqlmeta.columnList:
+                name = style.dbColumnToPythonAttr(column.dbName)
+                if name not in exists and column.dbName not in exists:
+                    self.connection.addColumn(table, column)
+                    added = True
+        return added
+
+    def recount(self) -> None:
+        """
+        Calculates again counters of flows and global counters.
+
+        Notes:
+            Counters are updated when rows are added, so it is needed
+            only after upgrade of database or its manual editing.
+        """
+
+        flow = models.Flow.sqlmeta.table
+        message = models.Message.sqlmeta.table
+        flow_column = models.Message.sqlmeta.columns["flowID"].dbName
+        transaction = self.connection.transaction()
+        try:
+            transaction.query(
+                f"UPDATE {flow} SET"
+                f" message_count = (SELECT COUNT(*) FROM {message}"
+                f" WHERE {message}.{flow_column} = {flow}.id),"
+                f" last_message_time = (SELECT MAX(time) FROM {message}"
+                f" WHERE {message}.{flow_column} = {flow}.id)")
+            counts = {"user_count": models.UserConfig,
+                      "flow_count": models.Flow,
+                      "message_count": models.Message}
+            for name, class_ in counts.items():
+                value = class_.select(connection=transaction).count()
+                row = models.Stats.selectBy(transaction,
+                                            name=name).getOne(None)
+                if row is None:
+                    models.Stats(connection=transaction,
+                                 name=name,
+                                 value=value)
+                else:
+                    row.value = value
+            transaction.commit(close=True)
+        except Exception as err:
+            transaction.rollback()
+            raise DatabaseWriteError(err)
+        self.connection.cache.clear(models.Flow)
+        self.connection.cache.clear(models.Stats)
+
+    @staticmethod
+    def __change_stats(connection: Any,
+                       **deltas: int) -> None:
+        """
+        Changes global counters in Stats table.
+
+        Args:
+            connection: transaction in which rows are added or deleted
+            **deltas: name of counter and value added to it
+        """
+
+        table = models.Stats.sqlmeta.table
+        for name, delta in deltas.items():
+            if not delta:
+                continue
+            query = Update(table,
+                           values={"value": SQLConstant(f"value + {delta:d}")},
+                           where=models.Stats.q.name == name)
+            connection.query(connection.sqlrepr(query))
+
+    @staticmethod
+    def __change_flow_counters(connection: Any,
+                               counters: dict[int, tuple[int, int]]) -> None:
+        """
+        Changes quantity of messages and time of last message of flows.
+
+        Args:
+            connection: transaction in which messages are added
+                        or deleted
+            counters: dict where key is id of flow and value is pair of
+                      quantity of added (negative for deleted) messages
+                      and time of last added message or None
+        """
+
+        table = models.Flow.sqlmeta.table
+        for flow_id, (delta, last_time) in counters.items():
+            values = {"message_count":
+                      SQLConstant(f"message_count + {delta:d}")}
+            if last_time is not None:
+                values["last_message_time"] = SQLConstant(
+                    f"CASE WHEN last_message_time IS NULL"
+                    f" OR last_message_time < {last_time:d}"
+                    f" THEN {last_time:d} ELSE last_message_time END")
+            query = Update(table,
+                           values=values,
+                           where=models.Flow.q.id == flow_id)
+            connection.query(connection.sqlrepr(query))
+
+    def __mark_changed(self,
+                       *names: str) -> None:
+        """
+        Changes versions of groups of data and saves time of change.
+
+        Notes:
+            Time is saved in ChangeTime table, so change is seen by
+            all processes which use the same database.
+
+        Args:
+            *names: names of groups like ``messages``
+        """
+
+        self.versions.bump(*names)
+        query = Update(models.ChangeTime.sqlmeta.table,
+                       values={"time": unix_time()},
+                       where=IN(models.ChangeTime.q.name, names))
+        self.connection.query(self.connection.sqlrepr(query))
+
     def delete_table(self) -> None:
         """
         Delete all table which contains in models.
@@ -150,6 +431,13 @@ class DBHandler:
                              dropJoinTables=True,
                              cascade=True,
                              connection=self.connection)
+        if self.identities is not None:
+            self.identities.clear()
+        if self.membership is not None:
+            self.membership.clear()
+        if self.recent is not None:
+            self.recent.clear()
+        self.versions.bump()
         return
 
     @property
@@ -184,8 +472,287 @@ class DBHandler:
             self._debug = "0"
             self._uri = "".join((self.uri,
                                  f"?debug={self._debug}"))
+        self.__connect()
+
+    def __connect(self) -> None:
+        """
+        Creates connection to database and pool of connections.
+
+        Notes:
+            Tuning profile is applied before pool is created, so
+            connections opened by pool on start are tuned too.
+        """
+
         self.connection = orm.connectionForURI(self._uri)
         orm.sqlhub.processConnection = self.connection
+        if self._sqlite_pragmas:
+            tune_sqlite(self.connection,
+                        self._sqlite_pragmas)
+        # SQLObject caches connection for every URI, so cache of rows
+        # is replaced only once for connection
+        if not isinstance(self.connection.cache, BoundedCacheSet):
+            self.connection.cache = BoundedCacheSet(**self._cache_options)
+        self.pool = ConnectionPool.attach(self.connection,
+                                          **self._pool_options)
+        if self._metrics_options["enabled"]:
+            self.metrics = QueryMetrics.attach(
+                self.connection,
+                self._metrics_options["slow_query"])
+        if self._identity_cache_size > 0:
+            self.identities = IdentityCache.attach(self.connection,
+                                                   self._identity_cache_size)
+        if self._membership_index:
+            self.membership = MembershipIndex.attach(self.connection,
+                                                     self.__read_membership)
+        if self._recent_options["per_flow"] > 0:
+            self.recent = RecentMessages.attach(self.connection,
+                                                **self._recent_options)
+        self.versions = DataVersions.attach(self.connection)
+        self.queries = self.__prepare_queries()
+
+    def __prepare_queries(self) -> dict[str, PreparedQuery]:
+        """
+        Makes prepared queries for frequent lookups.
+
+        Returns:
+            dict where key is name of query
+        """
+
+        by_uuid = (("uuid", "="),)
+        by_flow_and_time = (("flowID", "="),
+                            ("time", ">="))
+        queries = {"user_by_uuid": (models.UserConfig, by_uuid),
+                   "user_by_login": (models.UserConfig, (("login", "="),)),
+                   "flow_by_uuid": (models.Flow, by_uuid),
+                   "message_by_uuid": (models.Message, by_uuid),
+                   "messages_by_flow_and_time": (models.Message,
+                                                 by_flow_and_time),
+                   "archived_by_flow_and_time": (models.ArchivedMessage,
+                                                 by_flow_and_time)}
+        return {name: PreparedQuery(self.connection, model, conditions)
+                for name, (model, conditions) in queries.items()}
+
+    def __read_membership(self) -> tuple[list[tuple[int, str]],
+                                         list[tuple[int, str]],
+                                         list[tuple[int, int]]]:
+        """
+        Reads flows, users and their membership for index.
+
+        Returns:
+            rows (id, uuid) of flows, rows (id, uuid) of users and
+            rows (flow id, user id) of membership
+        """
+
+        join = next(item for item in models.Flow.sqlmeta.joins
+                    if item.joinMethodName == "users")
+        flows = self.connection.queryAll(
+            f"SELECT id, uuid FROM {models.Flow.sqlmeta.table}")
+        users = self.connection.queryAll(
+            f"SELECT id, uuid FROM {models.UserConfig.sqlmeta.table}")
+        members = self.connection.queryAll(
+            f"SELECT {join.joinColumn}, {join.otherColumn}"
+            f" FROM {join.intermediateTable}")
+        return flows, users, members
+
+    def load_membership(self) -> None:
+        """
+        Reads members of all flows into index.
+
+        Notes:
+            Index is loaded on first use too, this method allows to
+            load it on start of server.
+        """
+
+        if self.membership is not None:
+            self.membership.load()
+
+    def __read_prepared(self,
+                        name: str,
+                        *params: Any) -> SQLObject:
+        """
+        Reads one row by prepared query.
+
+        Args:
+            name: name of prepared query
+            *params: values of conditions
+
+        Returns:
+            (SQLObject):
+
+        Raises:
+            DatabaseReadError: occurs when there is no row or there are
+                               many rows
+            DatabaseAccessError: occurs when there is an unknown problem
+                                 when reading from database
+            DatabasePoolError: occurs when there is no free connection
+                               in pool during acquire timeout
+        """
+
+        try:
+            return self.queries[name].one(*params)
+        except (SQLObjectNotFound, SQLObjectIntegrityError) as err:
+            raise DatabaseReadError(err)
+        except PoolTimeoutError as err:
+            raise DatabasePoolError(err)
+        except Exception as err:
+            raise DatabaseAccessError(err)
+
+    @contextmanager
+    def unit_of_work(self) -> Iterator[None]:
+        """
+        Checks out one connection from pool for several queries.
+
+        Notes:
+            All queries made in block from the same thread use one
+            connection, so it is taken from pool only once, also when
+            pool does not reuse connections per thread. Queries
+            made in block are counted as queries of one request.
+
+        Raises:
+            DatabasePoolError: occurs when there is no free connection
+                               in pool during acquire timeout
+        """
+
+        try:
+            conn = self.pool.acquire(pin=True)
+        except PoolTimeoutError as err:
+            raise DatabasePoolError(err)
+
+        if self.metrics is not None:
+            self.metrics.begin_request()
+        try:
+            yield
+        finally:
+            if self.metrics is not None:
+                self.metrics.end_request()
+            self.pool.release(conn)
+
+    def data_version(self,
+                     name: str = versions.FLOWS) -> int:
+        """
+        Gives out version of group of data.
+
+        Notes:
+            Version is changed by every change made by DBHandler, so
+            response built from data of the same version is the same.
+
+        Args:
+            name: name of group, ``flows`` is changed by every change
+                  of flows or their members
+
+        Returns:
+            version
+        """
+
+        return self.versions.get(name)
+
+    def changed_since(self,
+                      time: int,
+                      names: Iterable[str] = versions.GROUPS) -> bool:
+        """
+        Checks that data was changed since time.
+
+        Notes:
+            Changes made by DBHandler are tracked, so data changed
+            without it (like field of object set directly) must be
+            marked by ``invalidate_user`` or ``update_recent_message``.
+
+            Times of changes are read from ChangeTime table, so changes
+            made by other processes with the same database are seen.
+            Group absent in table is treated as changed.
+
+        Args:
+            time: Unix-like time
+            names: names of groups of data
+
+        Returns:
+            True if some of groups was changed at time or later
+        """
+
+        names = tuple(names)
+        query = Select([models.ChangeTime.q.name,
+                        models.ChangeTime.q.time],
+                       where=IN(models.ChangeTime.q.name, names))
+        changed = dict(self.connection.queryAll(
+            self.connection.sqlrepr(query)))
+        return any(changed.get(name, time) >= time
+                   for name in names)
+
+    def cache_stats(self) -> dict[str, dict[str, Any]]:
+        """
+        Gives out counters of cache of rows.
+
+        Returns:
+            dict where key is name of table and value is dict with
+            quantity of rows, hits, misses, evictions and expirations
+        """
+
+        return self.connection.cache.stats()
+
+    def query_stats(self) -> dict[str, Any]:
+        """
+        Gives out latency histograms of methods and queries.
+
+        Returns:
+            dict with histograms of every method, all queries and
+            quantity of queries in one request, empty if metrics are
+            disabled
+        """
+
+        if self.metrics is None:
+            return {}
+        return self.metrics.stats()
+
+    def identity_stats(self) -> dict[str, Any]:
+        """
+        Gives out counters of cache of user identity.
+
+        Returns:
+            dict with quantity of users, hits, misses, hit rate,
+            evictions and invalidations, empty if cache is disabled
+        """
+
+        if self.identities is None:
+            return {}
+        return self.identities.stats()
+
+    def membership_stats(self) -> dict[str, int]:
+        """
+        Gives out size of index of flow membership.
+
+        Returns:
+            dict with quantity of flows, users, memberships and size
+            of index in bytes, empty if index is disabled
+        """
+
+        if self.membership is None:
+            return {}
+        return self.membership.stats()
+
+    def recent_stats(self) -> dict[str, Any]:
+        """
+        Gives out counters of cache of recent messages.
+
+        Returns:
+            dict with quantity of flows, messages, estimated size in
+            bytes, hits, misses and evictions, empty if cache is
+            disabled
+        """
+
+        if self.recent is None:
+            return {}
+        return self.recent.stats()
+
+    def pool_stats(self) -> dict[str, Any]:
+        """
+        Gives out counters of connection pool.
+
+        Returns:
+            dict with quantity of checkouts, timeouts, connections in use
+            and waiting time in seconds
+        """
+
+        return self.pool.stats.as_dict()
 
     def __read_db(self,
                   table: str,
@@ -209,6 +776,8 @@ class DBHandler:
                                database
             DatabaseAccessError: occurs when there is an unknown problem when
                                  reading from database
+            DatabasePoolError: occurs when there is no free connection
+                               in pool during acquire timeout
         """
 
         # The SelectResults object type when the result
@@ -221,6 +790,8 @@ class DBHandler:
                                       **kwargs).getOne()
             except (SQLObjectNotFound, SQLObjectIntegrityError) as err:
                 raise DatabaseReadError(err)
+            except PoolTimeoutError as err:
+                raise DatabasePoolError(err)
             except Exception as err:
                 raise DatabaseAccessError(err)
             else:
@@ -231,6 +802,8 @@ class DBHandler:
                                       **kwargs)
             except SQLObjectNotFound as err:
                 raise DatabaseReadError(err)
+            except PoolTimeoutError as err:
+                raise DatabasePoolError(err)
             except Exception as err:
                 raise DatabaseAccessError(err)
             else:
@@ -252,16 +825,180 @@ class DBHandler:
         Raises:
             DatabaseWriteError: occurs when there is an unknown problem when
                                 writing to database
+            DatabasePoolError: occurs when there is no free connection
+                               in pool during acquire timeout
         """
 
         db = getattr(models, table)
         try:
             dbquery = db(**kwargs)
+        except PoolTimeoutError as err:
+            raise DatabasePoolError(err)
         except (Exception, SQLObjectIntegrityError) as err:
             raise DatabaseWriteError(err)
         else:
             return dbquery
 
+    def __select_fields(self,
+                        table: str,
+                        fields: tuple[str, ...] | list[str],
+                        where: Any = None,
+                        start: int = None,
+                        end: int = None,
+                        descending: bool = False) -> list[dict[str, Any]]:
+        """
+        Universal method for read only requested columns from database.
+
+        Notes:
+            Foreign key column (like ``user`` in Message table) is
+            returned as uuid of related row.
+
+        Args:
+            table: name of table
+            fields: names of columns, ``id`` is allowed too
+            where: additional SQL condition
+            start: number of first row
+            end: number of row after last row
+            descending: sort rows from the last id
+
+        Returns:
+            list of dict, where key is name of column
+
+        Raises:
+            DatabaseAccessError: occurs when table has no requested column
+                                 or there is an unknown problem when
+                                 reading from database
+            DatabasePoolError: occurs when there is no free connection
+                               in pool during acquire timeout
+        """
+
+        db = getattr(models, table)
+        state = SimpleNamespace(connection=self.connection,
+                                soObject=db)
+        items = []
+        validators = []
+        conditions = [] if where is None else [where]
+
+        for name in fields:
+            if name == "id":
+                items.append(db.q.id)
+                validators.append(None)
+                continue
+
+            column = db.sqlmeta.columns.get(name)
+            if column is not None:
+                items.append(getattr(db.q, name))
+                validators.append(column.validator)
+                continue
+
+            column = db.sqlmeta.columns.get(f"{name}ID")
+            if column is None or column.foreignKey is None:
+                raise DatabaseAccessError(f"Table {table} has no"
+                                          f" column {name}")
+            related = Alias(getattr(models, column.foreignKey),
+                            f"{name}_ref")
+            items.append(related.q.uuid)
+            validators.append(None)
+            conditions.append(getattr(db.q, f"{name}ID") == related.q.id)
+
+        # SQLObject gives out LIMIT 0 for start without end,
+        # so such rows are skipped after reading
+        query = Select(items,
+                       orderBy=DESC(db.q.id) if descending else db.q.id,
+                       start=None if end is None else start,
+                       end=end)
+        if conditions:
+            query = query.newClause(AND(*conditions))
+        try:
+            rows = self.connection.queryAll(self.connection.sqlrepr(query))
+        except PoolTimeoutError as err:
+            raise DatabasePoolError(err)
+        except Exception as err:
+            raise DatabaseAccessError(err)
+        if end is None and start:
+            rows = rows[start:]
+
+        result = []
+        for row in rows:
+            item = {}
+            for name, validator, value in zip(fields, validators, row):
+                if validator is not None:
+                    value = validator.to_python(value, state)
+                item[name] = value
+            result.append(item)
+        return result
+
+    @staticmethod
+    def __get_ids(connection: Any,
+                  table: str,
+                  uuids: list[str]) -> dict[str, int]:
+        """
+        Reads id of rows by list of uuid.
+
+        Notes:
+            Rows are read by chunks of ``CHUNK_SIZE`` uuid in one query.
+
+        Args:
+            connection: connection or transaction
+            table: name of table
+            uuids: list of uuid
+
+        Returns:
+            dict where key is uuid and value is id, uuid which are not
+            found in table are missing
+        """
+
+        db = getattr(models, table)
+        result = {}
+        for start in range(0, len(uuids), CHUNK_SIZE):
+            query = Select([db.q.uuid, db.q.id],
+                           where=IN(db.q.uuid,
+                                    uuids[start:start + CHUNK_SIZE]))
+            for uuid, id_ in connection.queryAll(connection.sqlrepr(query)):
+                result[uuid] = id_
+        return result
+
+    def __read_by_uuids(self,
+                        table: str,
+                        uuids: list[str] | tuple[str, ...]
+                        ) -> dict[str, SQLObject]:
+        """
+        Universal method for read many rows by list of uuid.
+
+        Notes:
+            Rows are read by chunks of ``CHUNK_SIZE`` uuid in one query.
+
+        Args:
+            table: name of table
+            uuids: list of uuid
+
+        Returns:
+            dict where key is uuid and value is row, uuid which are not
+            found in table are missing
+
+        Raises:
+            DatabaseAccessError: occurs when there is an unknown problem
+                                 when reading from database
+            DatabasePoolError: occurs when there is no free connection
+                               in pool during acquire timeout
+        """
+
+        db = getattr(models, table)
+        unique = list(dict.fromkeys(uuids))
+        result = {}
+        try:
+            for start in range(0, len(unique), CHUNK_SIZE):
+                dbquery = db.select(IN(db.q.uuid,
+                                       unique[start:start + CHUNK_SIZE]),
+                                    connection=self.connection)
+                for row in dbquery:
+                    result[row.uuid] = row
+        except PoolTimeoutError as err:
+            raise DatabasePoolError(err)
+        except Exception as err:
+            raise DatabaseAccessError(err)
+        return result
+
     def get_all_user(self) -> SelectResults:
         """
         Gives out all user contains in UserConfig table.
@@ -285,9 +1022,111 @@ class DBHandler:
             (SQLObject):
         """
 
-        return self.__read_db(table="UserConfig",
-                              get_one=True,
-                              uuid=uuid)
+        return self.__read_prepared("user_by_uuid",
+                                    uuid)
+
+    def get_user_identity(self,
+                          uuid: str) -> UserIdentity:
+        """
+        Gives out uuid, login and auth_id of user by uuid.
+
+        Notes:
+            Identity is taken from cache, user is read from database
+            only if he is absent in cache.
+
+        Args:
+            uuid: unique user identify number
+
+        Returns:
+            (UserIdentity):
+
+        Raises:
+            DatabaseReadError: occurs when there is no such user
+        """
+
+        if self.identities is None:
+            user = self.get_user_by_uuid(uuid)
+            return UserIdentity(user.uuid,
+                                user.login,
+                                user.auth_id,
+                                user.deleted_time)
+
+        identity = self.identities.get(uuid)
+        if identity is None:
+            version = self.identities.version
+            user = self.get_user_by_uuid(uuid)
+            identity = UserIdentity(user.uuid,
+                                    user.login,
+                                    user.auth_id,
+                                    user.deleted_time)
+            self.identities.put(identity,
+                                version)
+        return identity
+
+    def get_user_identity_by_login(self,
+                                   login: str) -> UserIdentity:
+        """
+        Gives out uuid, login and auth_id of user by login.
+
+        Notes:
+            Identity is taken from cache, user is read from database
+            only if he is absent in cache.
+
+        Args:
+            login: user login
+
+        Returns:
+            (UserIdentity):
+
+        Raises:
+            DatabaseReadError: occurs when there is no such user or
+                               there are many users with this login
+        """
+
+        if self.identities is None:
+            user = self.get_user_by_login(login)
+            return UserIdentity(user.uuid,
+                                user.login,
+                                user.auth_id,
+                                user.deleted_time)
+
+        identity = self.identities.get_by_login(login)
+        if identity is None:
+            version = self.identities.version
+            user = self.get_user_by_login(login)
+            identity = UserIdentity(user.uuid,
+                                    user.login,
+                                    user.auth_id,
+                                    user.deleted_time)
+            self.identities.put(identity,
+                                version,
+                                by_login=True)
+        return identity
+
+    def invalidate_user(self,
+                        uuid: str = None,
+                        login: str = None,
+                        changed: bool = False) -> None:
+        """
+        Removes user from cache of identity.
+
+        Notes:
+            Must be called after login or auth_id of user is changed
+            not by DBHandler methods. Users are marked as changed only
+            when ``changed`` is set, so new token of user does not
+            change answer to ``get_update``.
+
+        Args:
+            uuid: unique user identify number
+            login: user login
+            changed: data of user given out to other users was changed
+        """
+
+        if self.identities is not None:
+            self.identities.invalidate(uuid,
+                                       login)
+        if changed:
+            self.__mark_changed(versions.USERS)
 
     def get_user_by_login(self,
                           login: str) -> SQLObject:
@@ -301,9 +1140,8 @@ class DBHandler:
             (SQLObject):
         """
 
-        return self.__read_db(table="UserConfig",
-                              get_one=True,
-                              login=login)
+        return self.__read_prepared("user_by_login",
+                                    login)
 
     def get_user_by_login_and_password(self,
                                        login: str,
@@ -324,6 +1162,45 @@ class DBHandler:
                               login=login,
                               password=password)
 
+    def get_users_by_uuids(self,
+                           uuids: list[str] | tuple[str, ...]
+                           ) -> dict[str, SQLObject]:
+        """
+        Gives out many users by list of uuid.
+
+        Args:
+            uuids: list of unique user identify number
+
+        Returns:
+            dict where key is uuid and value is user, not found users
+            are missing
+        """
+
+        return self.__read_by_uuids(table="UserConfig",
+                                    uuids=uuids)
+
+    def get_user_fields(self,
+                        fields: tuple[str, ...] | list[str],
+                        uuids: list[str] = None) -> list[dict[str, Any]]:
+        """
+        Gives out only requested columns of users from UserConfig table.
+
+        Args:
+            fields: names of columns
+            uuids: unique user identify numbers, if None then
+                   all users is returned
+
+        Returns:
+            list of dict, where key is name of column
+        """
+
+        where = None
+        if uuids is not None:
+            where = IN(models.UserConfig.q.uuid, uuids)
+        return self.__select_fields(table="UserConfig",
+                                    fields=fields,
+                                    where=where)
+
     def add_user(self,
                  uuid: str,
                  login: str,
@@ -367,20 +1244,38 @@ class DBHandler:
         if key is None:
             key = b''
 
-        return self.__write_db(table="UserConfig",
-                               uuid=uuid,
-                               login=login,
-                               password=password,
-                               hash_password=hash_password,
-                               username=username,
-                               is_bot=is_bot,
-                               auth_id=auth_id,
-                               token_ttl=token_ttl,
-                               email=email,
-                               avatar=avatar,
-                               bio=bio,
-                               salt=salt,
-                               key=key)
+        transaction = self.connection.transaction()
+        try:
+            user_id = models.UserConfig(connection=transaction,
+                                        uuid=uuid,
+                                        login=login,
+                                        password=password,
+                                        hash_password=hash_password,
+                                        username=username,
+                                        is_bot=is_bot,
+                                        auth_id=auth_id,
+                                        token_ttl=token_ttl,
+                                        email=email,
+                                        avatar=avatar,
+                                        bio=bio,
+                                        salt=salt,
+                                        key=key).id
+            self.__change_stats(transaction,
+                                user_count=1)
+            transaction.commit(close=True)
+        except Exception as err:
+            transaction.rollback()
+            raise DatabaseWriteError(err)
+
+        # Login is not unique, so cached user with this login
+        # is not the only one now
+        self.invalidate_user(login=login,
+                             changed=True)
+        if self.membership is not None:
+            self.membership.add_user(user_id, uuid)
+
+        return models.UserConfig.get(user_id,
+                                     connection=self.connection)
 
     def update_user(self,
                     uuid: str,
@@ -421,6 +1316,7 @@ class DBHandler:
         dbquery = self.__read_db(table="UserConfig",
                                  get_one=True,
                                  uuid=uuid)
+        old_login = dbquery.login
         if login:
             dbquery.login = login
 
@@ -457,6 +1353,13 @@ class DBHandler:
         if salt:
             dbquery.salt = salt
 
+        # Password and token are not given out to other users
+        changed = any((login, username, is_bot, email, avatar, bio))
+        self.invalidate_user(uuid,
+                             old_login,
+                             changed)
+        if login:
+            self.invalidate_user(login=login)
         return "Updated"
 
     def get_all_message(self) -> SelectResults:
@@ -475,6 +1378,10 @@ class DBHandler:
         """
         Gives out one message by uuid which contains in Message table.
 
+        Notes:
+            If message is absent in Message table, then it is searched
+            in ArchivedMessage table.
+
         Args:
             uuid: unique user identify number
 
@@ -482,12 +1389,33 @@ class DBHandler:
             (SQLObject):
         """
 
-        return self.__read_db(table="Message",
-                              get_one=True,
-                              uuid=uuid)
+        try:
+            return self.__read_prepared("message_by_uuid",
+                                        uuid)
+        except DatabaseReadError:
+            return self.__read_db(table="ArchivedMessage",
+                                  get_one=True,
+                                  uuid=uuid)
 
-    def get_message_by_text(self,
-                            text: str) -> SelectResults:
+    def get_messages_by_uuids(self,
+                              uuids: list[str] | tuple[str, ...]
+                              ) -> dict[str, SQLObject]:
+        """
+        Gives out many messages by list of uuid.
+
+        Args:
+            uuids: list of unique identify number from message
+
+        Returns:
+            dict where key is uuid and value is message, not found
+            messages are missing
+        """
+
+        return self.__read_by_uuids(table="Message",
+                                    uuids=uuids)
+
+    def get_message_by_text(self,
+                            text: str) -> SelectResults:
         """
         Gives out all message which contains desired text string.
 
@@ -502,8 +1430,8 @@ class DBHandler:
                               get_one=False,
                               text=text)
 
-    @staticmethod
-    def get_message_by_exact_time(time: int) -> SelectResults:
+    def get_message_by_exact_time(self,
+                                  time: int) -> SelectResults:
         """
         Gives out message by time == requested time.
 
@@ -516,8 +1444,8 @@ class DBHandler:
 
         return models.Message.select(models.Message.q.time == time)
 
-    @staticmethod
-    def get_message_by_less_time(time: int) -> SelectResults:
+    def get_message_by_less_time(self,
+                                 time: int) -> SelectResults:
         """
         Gives out message by time <= requested time.
 
@@ -530,8 +1458,8 @@ class DBHandler:
 
         return models.Message.select(models.Message.q.time <= time)
 
-    @staticmethod
-    def get_message_by_more_time(time: int) -> SelectResults:
+    def get_message_by_more_time(self,
+                                 time: int) -> SelectResults:
         """
         Gives out message by time >= requested time.
 
@@ -565,6 +1493,171 @@ class DBHandler:
             AND(models.Message.q.flow == flow,
                 models.Message.q.time >= time))
 
+    def get_message_history(self,
+                            flow_uuid: str,
+                            time: int) -> MessageHistory:
+        """
+        Gives out history of flow by time >= than requested.
+
+        Notes:
+            Unlike ``get_message_by_more_time_and_flow`` archived messages
+            are included.
+
+            Archived messages go first, because they are older than
+            messages in Message table.
+
+        Args:
+            flow_uuid: unique identify number from flow
+            time: Unix-like time
+
+        Returns:
+            (MessageHistory): behaves like SelectResults
+        """
+
+        flow = self.get_flow_by_uuid(flow_uuid)
+        parts = [self.queries[name].results(flow.id, time)
+                 for name in ("archived_by_flow_and_time",
+                              "messages_by_flow_and_time")]
+        return MessageHistory(*parts)
+
+    def get_recent_messages(self,
+                            flow_uuid: str,
+                            time: int) -> Optional[list[dict[str, Any]]]:
+        """
+        Gives out history of flow by time >= than requested from memory.
+
+        Notes:
+            Last messages of flow are read in cache on first request.
+            If cache has not all messages of flow since time (or cache
+            is disabled), None is returned and history must be read by
+            ``get_message_history``.
+
+            Columns ``user`` and ``flow`` contains uuid of user and flow.
+            Returned dicts are shared with cache and must not be changed.
+
+        Args:
+            flow_uuid: unique identify number from flow
+            time: Unix-like time
+
+        Returns:
+            list of dict, where key is name of column, or None
+
+        Raises:
+            DatabaseReadError: occurs when flow is not found
+        """
+
+        if self.recent is None or time is None:
+            return None
+
+        items = self.recent.get(flow_uuid, time)
+        if items is not None:
+            return items
+
+        version = self.recent.begin_load(flow_uuid)
+        loaded = None
+        try:
+            loaded = self.__read_recent(flow_uuid)
+        finally:
+            self.recent.end_load(flow_uuid, version, loaded)
+
+        rows, floor = loaded
+        if floor is not None and floor >= time:
+            return None
+        return [item for _, item in rows
+                if item["time"] is not None and item["time"] >= time]
+
+    def __read_recent(self,
+                      flow_uuid: str) -> tuple[list[tuple[int,
+                                                          dict[str, Any]]],
+                                               Optional[int]]:
+        """
+        Reads last messages of flow for cache of recent messages.
+
+        Args:
+            flow_uuid: unique identify number from flow
+
+        Returns:
+            pairs of id and columns of messages sorted by id and
+            maximum time of older messages of flow
+
+        Raises:
+            DatabaseReadError: occurs when flow is not found
+        """
+
+        flow = self.get_flow_by_uuid(flow_uuid)
+        limit = self.recent.per_flow
+        rows: list[dict[str, Any]] = []
+        for table in ("Message", "ArchivedMessage"):
+            db = getattr(models, table)
+            rows += self.__select_fields(table=table,
+                                         fields=("id",) + RECENT_COLUMNS,
+                                         where=db.q.flowID == flow.id,
+                                         start=0,
+                                         end=limit - len(rows),
+                                         descending=True)
+            if len(rows) >= limit:
+                break
+        rows.reverse()
+
+        floor = None
+        if len(rows) >= limit:
+            floor = self.__get_floor(flow.id, rows[0]["id"])
+        return [(item.pop("id"), item) for item in rows], floor
+
+    def __get_floor(self,
+                    flow_id: int,
+                    before_id: int) -> Optional[int]:
+        """
+        Gives out maximum time of messages of flow older than message.
+
+        Args:
+            flow_id: id of flow
+            before_id: id of message
+
+        Returns:
+            Unix-like time or None if there are no such messages
+        """
+
+        times = []
+        for db in (models.Message, models.ArchivedMessage):
+            query = Select(func.MAX(db.q.time),
+                           where=AND(db.q.flowID == flow_id,
+                                     db.q.id < before_id))
+            times.append(self.connection.queryOne(
+                self.connection.sqlrepr(query))[0])
+        times = [item for item in times if item is not None]
+        return max(times) if times else None
+
+    def update_recent_message(self,
+                              message: SQLObject) -> None:
+        """
+        Puts changed message in cache of recent messages.
+
+        Notes:
+            Must be called after message is changed without
+            ``update_message``.
+
+        Args:
+            message: row of Message or ArchivedMessage table
+        """
+
+        self.__mark_changed(versions.MESSAGES)
+        if self.recent is None:
+            return
+        self.recent.update(message.flow.uuid,
+                           {"uuid": message.uuid,
+                            "text": message.text,
+                            "user": message.user.uuid,
+                            "time": message.time,
+                            "flow": message.flow.uuid,
+                            "file_picture": message.file_picture,
+                            "file_video": message.file_video,
+                            "file_audio": message.file_audio,
+                            "file_document": message.file_document,
+                            "emoji": message.emoji,
+                            "edited_time": message.edited_time,
+                            "edited_status": message.edited_status})
+
     def get_message_by_less_time_and_flow(self,
                                           flow_uuid: str,
                                           time: int) -> SelectResults:
@@ -607,6 +1700,67 @@ class DBHandler:
             AND(models.Message.q.flow == flow,
                 models.Message.q.time == time))
 
+    def get_message_fields(self,
+                           fields: tuple[str, ...] | list[str],
+                           time: int,
+                           flow_uuid: str = None,
+                           start: int = None,
+                           end: int = None) -> list[dict[str, Any]]:
+        """
+        Gives out only requested columns of messages by time >= time.
+
+        Notes:
+            If ``flow_uuid`` is set, then only messages of this flow
+            are returned, archived messages of flow go first.
+
+            Columns ``user`` and ``flow`` contains uuid of user and flow.
+
+        Args:
+            fields: names of columns
+            time: Unix-like time
+            flow_uuid: unique identify number from flow
+            start: number of first message
+            end: number of message after last message
+
+        Returns:
+            list of dict, where key is name of column
+        """
+
+        where = models.Message.q.time >= time
+        if flow_uuid is None:
+            return self.__select_fields(table="Message",
+                                        fields=fields,
+                                        where=where,
+                                        start=start,
+                                        end=end)
+
+        flow = self.__read_db(table="Flow",
+                              get_one=True,
+                              uuid=flow_uuid)
+        start = start or 0
+        rows = []
+        archive = models.ArchivedMessage
+        archived = archive.select(AND(archive.q.flowID == flow.id,
+                                      archive.q.time >= time),
+                                  connection=self.connection).count()
+        if archived and start < archived:
+            rows = self.__select_fields(table="ArchivedMessage",
+                                        fields=fields,
+                                        where=AND(archive.q.flowID == flow.id,
+                                                  archive.q.time >= time),
+                                        start=start,
+                                        end=(archived if end is None
+                                             else min(end, archived)))
+        if end is not None and end <= archived:
+            return rows
+        return rows + self.__select_fields(
+            table="Message",
+            fields=fields,
+            where=AND(models.Message.q.flowID == flow.id,
+                      where),
+            start=max(start - archived, 0),
+            end=None if end is None else end - archived)
+
     def add_message(self,
                     flow_uuid: str,
                     user_uuid: str,
@@ -641,25 +1795,648 @@ class DBHandler:
             (SQLObject):
         """
 
-        flow = self.__read_db(table="Flow",
-                              get_one=True,
-                              uuid=flow_uuid)
-        user = self.__read_db(table="UserConfig",
-                              get_one=True,
-                              uuid=user_uuid)
-        return self.__write_db(table="Message",
-                               uuid=message_uuid,
-                               text=text,
-                               time=time,
-                               file_picture=picture,
-                               file_video=video,
-                               file_audio=audio,
-                               file_document=document,
-                               emoji=emoji,
-                               edited_time=None,
-                               edited_status=False,
-                               user=user,
-                               flow=flow)
+        result = self.add_messages([{"flow_uuid": flow_uuid,
+                                     "user_uuid": user_uuid,
+                                     "message_uuid": message_uuid,
+                                     "time": time,
+                                     "text": text,
+                                     "picture": picture,
+                                     "video": video,
+                                     "audio": audio,
+                                     "document": document,
+                                     "emoji": emoji}])[0]
+        if isinstance(result, Exception):
+            raise result
+        return self.get_message_by_uuid(result)
+
+    def add_messages(self,
+                     messages: list[dict[str, Any]]) -> list[Any]:
+        """
+        Added group of messages to the Message table in one transaction.
+
+        Notes:
+            Every message is dict with arguments of ``add_message``.
+            Flow and user are read once for all messages of group.
+
+            If transaction failed, then messages are added one by one,
+            so one wrong message does not fail other messages.
+
+            Counters of flows and Stats table are changed in the same
+            transaction.
+
+        Args:
+            messages: list of dict with arguments of ``add_message``
+
+        Returns:
+            list where for every message contains its uuid or exception:
+            DatabaseReadError if there is no flow or user,
+            DatabaseWriteError if message was not saved
+        """
+
+        results: list[Any] = []
+        found: dict[tuple[str, str], Any] = {}
+
+        def get_id(table: str, uuid: str, connection: Any) -> int:
+            key = (table, uuid)
+            if key not in found:
+                try:
+                    found[key] = getattr(models, table).selectBy(
+                        connection,
+                        uuid=uuid).getOne().id
+                except (SQLObjectNotFound, SQLObjectIntegrityError) as err:
+                    found[key] = DatabaseReadError(err)
+            if isinstance(found[key], Exception):
+                raise found[key]
+            return found[key]
+
+        counters: dict[int, tuple[int, int]] = {}
+        added: list[tuple[int, dict[str, Any]]] = []
+        transaction = self.connection.transaction()
+        try:
+            for message in messages:
+                try:
+                    flow_id = get_id("Flow",
+                                     message["flow_uuid"],
+                                     transaction)
+                    user_id = get_id("UserConfig",
+                                     message["user_uuid"],
+                                     transaction)
+                except DatabaseReadError as err:
+                    results.append(err)
+                    continue
+                message_id = models.Message(
+                    connection=transaction,
+                    uuid=message["message_uuid"],
+                    text=message.get("text"),
+                    time=message["time"],
+                    file_picture=message.get("picture"),
+                    file_video=message.get("video"),
+                    file_audio=message.get("audio"),
+                    file_document=message.get("document"),
+                    emoji=message.get("emoji"),
+                    edited_time=None,
+                    edited_status=False,
+                    userID=user_id,
+                    flowID=flow_id).id
+                added.append((message_id, message))
+                results.append(message["message_uuid"])
+                count, last_time = counters.get(flow_id, (0, None))
+                if last_time is None or last_time < message["time"]:
+                    last_time = message["time"]
+                counters[flow_id] = (count + 1, last_time)
+            self.__change_flow_counters(transaction,
+                                        counters)
+            self.__change_stats(transaction,
+                                message_count=sum(count for count, _
+                                                  in counters.values()))
+            transaction.commit(close=True)
+        except Exception as err:
+            transaction.rollback()
+            if len(messages) == 1:
+                return [DatabaseWriteError(err)]
+            return [self.add_messages([message])[0]
+                    for message in messages]
+        self.__expire(models.Flow, counters)
+        self.__mark_changed(versions.MESSAGES)
+        if self.recent is not None:
+            for message_id, message in added:
+                self.recent.add(message["flow_uuid"],
+                                message_id,
+                                {"uuid": message["message_uuid"],
+                                 "text": message.get("text"),
+                                 "user": message["user_uuid"],
+                                 "time": message["time"],
+                                 "flow": message["flow_uuid"],
+                                 "file_picture": message.get("picture"),
+                                 "file_video": message.get("video"),
+                                 "file_audio": message.get("audio"),
+                                 "file_document": message.get("document"),
+                                 "emoji": message.get("emoji"),
+                                 "edited_time": None,
+                                 "edited_status": False})
+        return results
+
+    def __expire(self,
+                 class_: Any,
+                 ids: Iterable[int]) -> None:
+        """
+        Marks cached rows as outdated after they are changed by query.
+
+        Args:
+            class_: model of table
+            ids: id of changed rows
+        """
+
+        for id_ in ids:
+            row = self.connection.cache.tryGet(id_, class_)
+            if row is not None:
+                row.expire()
+
+    def submit_message(self,
+                       flow_uuid: str,
+                       user_uuid: str,
+                       message_uuid: str,
+                       time: int,
+                       text: str = None,
+                       picture: bytes = None,
+                       video: bytes = None,
+                       audio: bytes = None,
+                       document: bytes = None,
+                       emoji: bytes = None) -> Future:
+        """
+        Added new message to the Message table through group writer.
+
+        Notes:
+            If group writer is not started, message is added at once.
+
+        Args:
+            flow_uuid: unique identify number from flow
+            user_uuid: unique user identify number
+            message_uuid: unique identify number from message
+            time: Unix-like time
+            text: message text
+            picture: appending image
+            video: appending video
+            audio: appending audio
+            document: appending document
+            emoji: appending emoji image
+
+        Returns:
+            future which resolves with uuid of message after transaction
+            is committed or raises DatabaseReadError if there is no flow
+            or user, DatabaseWriteError if message was not saved
+        """
+
+        message = {"flow_uuid": flow_uuid,
+                   "user_uuid": user_uuid,
+                   "message_uuid": message_uuid,
+                   "time": time,
+                   "text": text,
+                   "picture": picture,
+                   "video": video,
+                   "audio": audio,
+                   "document": document,
+                   "emoji": emoji}
+
+        if self.writer is not None:
+            try:
+                return self.writer.submit(message)
+            except RuntimeError:
+                # Writer is stopped, message is added at once
+                pass
+
+        future: Future = Future()
+        result = self.add_messages([message])[0]
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+        return future
+
+    def start_writer(self,
+                     window: float = 2,
+                     batch_size: int = 100) -> None:
+        """
+        Starts group writer for messages.
+
+        Notes:
+            Writer thread is not limited by size of pool, because
+            requests which wait for commit hold their connections.
+
+        Args:
+            window: time in milliseconds to wait for more messages
+                    before commit
+            batch_size: maximum quantity of messages in one transaction
+        """
+
+        if self.writer is None:
+            self.writer = GroupWriter(self.add_messages,
+                                      window,
+                                      batch_size,
+                                      name="message-writer",
+                                      prepare=self.pool.dedicate)
+        self.writer.start()
+
+    def stop_writer(self) -> None:
+        """
+        Saves messages which are waiting in queue and stops group writer.
+        """
+
+        if self.writer is not None:
+            self.writer.stop()
+            self.writer = None
+
+    def archive_messages(self,
+                         before: int,
+                         batch_size: int = CHUNK_SIZE) -> int:
+        """
+        Moves one batch of old messages to ArchivedMessage table.
+
+        Notes:
+            Messages are copied with their id and deleted from Message
+            table in one transaction. Counters of flows and Stats table
+            are not changed, because archived messages are still part
+            of history.
+
+        Args:
+            before: Unix-like time, messages older than it are moved
+            batch_size: maximum quantity of messages moved at once
+
+        Returns:
+            quantity of moved messages
+        """
+
+        table = models.Message.sqlmeta.table
+        archive = models.ArchivedMessage.sqlmeta.table
+        columns = ", ".join(["id"] + [column.dbName for column
+                                      in models.Message.sqlmeta.columnList])
+        transaction = self.connection.transaction()
+        try:
+            query = Select(models.Message.q.id,
+                           where=models.Message.q.time < before,
+                           orderBy=models.Message.q.id,
+                           limit=batch_size)
+            ids = [row[0] for row in transaction.queryAll(
+                transaction.sqlrepr(query))]
+            if ids:
+                where = ", ".join(str(id_) for id_ in ids)
+                transaction.query(f"INSERT INTO {archive} ({columns})"
+                                  f" SELECT {columns} FROM {table}"
+                                  f" WHERE id IN ({where})")
+                transaction.query(f"DELETE FROM {table}"
+                                  f" WHERE id IN ({where})")
+            transaction.commit(close=True)
+        except Exception as err:
+            transaction.rollback()
+            raise DatabaseWriteError(err)
+
+        for id_ in ids:
+            self.connection.cache.expire(id_, models.Message)
+        if ids:
+            self.__mark_changed(versions.MESSAGES)
+        if ids and self.recent is not None:
+            self.recent.clear()
+        return len(ids)
+
+    def archive_old_messages(self,
+                             days: int,
+                             batch_size: int = CHUNK_SIZE) -> int:
+        """
+        Moves messages older than ``days`` to ArchivedMessage table.
+
+        Notes:
+            Messages are moved in batches, every batch in its own
+            transaction, so writers are not blocked for long time.
+            When called by archiver, stops after current batch if
+            archiver is stopped.
+
+        Args:
+            days: age of message in days
+            batch_size: maximum quantity of messages moved at once
+
+        Returns:
+            quantity of moved messages
+        """
+
+        before = int(unix_time()) - days * 86400
+        total = 0
+        while True:
+            moved = self.archive_messages(before,
+                                          batch_size)
+            total += moved
+            if moved < batch_size:
+                break
+            if self.archiver is not None and not self.archiver.running:
+                break
+        return total
+
+    def start_archiver(self,
+                       days: int,
+                       interval: float = 3600,
+                       batch_size: int = CHUNK_SIZE) -> None:
+        """
+        Starts background archiving of old messages.
+
+        Args:
+            days: age of message in days after which it is archived
+            interval: time in seconds between runs of archiving
+            batch_size: maximum quantity of messages moved at once
+        """
+
+        if self.archiver is None:
+            self.archiver = PeriodicTask(
+                lambda: self.archive_old_messages(days,
+                                                  batch_size),
+                interval,
+                name="message-archiver",
+                prepare=self.pool.dedicate)
+        self.archiver.start()
+
+    def stop_archiver(self) -> None:
+        """
+        Stops background archiving of old messages.
+        """
+
+        if self.archiver is not None:
+            self.archiver.stop()
+            self.archiver = None
+
+    def purge_deleted_messages(self,
+                               before: int,
+                               batch_size: int = CHUNK_SIZE) -> int:
+        """
+        Removes one batch of deleted messages including archived.
+
+        Notes:
+            Counters of flows and Stats table are changed in the same
+            transaction.
+
+        Args:
+            before: Unix-like time, messages deleted before it are removed
+            batch_size: maximum quantity of messages removed at once
+
+        Returns:
+            quantity of removed messages
+        """
+
+        removed = 0
+        for class_ in (models.Message, models.ArchivedMessage):
+            if removed >= batch_size:
+                break
+            table = class_.sqlmeta.table
+            transaction = self.connection.transaction()
+            try:
+                query = Select([class_.q.id, class_.q.flowID],
+                               where=class_.q.deleted_time < before,
+                               orderBy=class_.q.id,
+                               limit=batch_size - removed)
+                rows = transaction.queryAll(transaction.sqlrepr(query))
+                counters: dict[int, tuple[int, None]] = {}
+                for _, flow_id in rows:
+                    count, _ = counters.get(flow_id, (0, None))
+                    counters[flow_id] = (count - 1, None)
+                if rows:
+                    where = ", ".join(str(id_) for id_, _ in rows)
+                    transaction.query(f"DELETE FROM {table}"
+                                      f" WHERE id IN ({where})")
+                    self.__change_flow_counters(transaction,
+                                                counters)
+                    self.__change_stats(transaction,
+                                        message_count=-len(rows))
+                transaction.commit(close=True)
+            except Exception as err:
+                transaction.rollback()
+                raise DatabaseWriteError(err)
+
+            for id_, _ in rows:
+                self.connection.cache.expire(id_, class_)
+            self.__expire(models.Flow, counters)
+            removed += len(rows)
+        if removed:
+            self.__mark_changed(versions.MESSAGES)
+        if removed and self.recent is not None:
+            self.recent.clear()
+        return removed
+
+    def purge_deleted_users(self,
+                            before: int,
+                            batch_size: int = CHUNK_SIZE) -> int:
+        """
+        Removes one batch of deleted users from UserConfig table.
+
+        Notes:
+            Users are removed from all flows. Row of user is kept while
+            there are messages of this user, so history of flows stays
+            readable.
+
+        Args:
+            before: Unix-like time, users deleted before it are removed
+            batch_size: maximum quantity of users removed at once
+
+        Returns:
+            quantity of removed users
+        """
+
+        user = models.UserConfig
+        join = user.sqlmeta.joins[[item.joinMethodName for item
+                                   in user.sqlmeta.joins].index("flows")]
+        deleted = f"deleted_time IS NOT NULL AND deleted_time < {before:d}"
+        has_messages = " OR ".join(
+            f"EXISTS (SELECT 1 FROM {class_.sqlmeta.table} WHERE"
+            f" {class_.sqlmeta.columns['userID'].dbName}"
+            f" = {user.sqlmeta.table}.id)"
+            for class_ in (models.Message, models.ArchivedMessage))
+        transaction = self.connection.transaction()
+        try:
+            members = transaction.queryAll(
+                f"SELECT DISTINCT {join.joinColumn}"
+                f" FROM {join.intermediateTable}"
+                f" WHERE {join.joinColumn} IN"
+                f" (SELECT id FROM {user.sqlmeta.table} WHERE {deleted})")
+            transaction.query(f"DELETE FROM {join.intermediateTable}"
+                              f" WHERE {join.joinColumn} IN"
+                              f" (SELECT id FROM {user.sqlmeta.table}"
+                              f" WHERE {deleted})")
+            rows = transaction.queryAll(f"SELECT id FROM {user.sqlmeta.table}"
+                                        f" WHERE {deleted}"
+                                        f" AND NOT ({has_messages})"
+                                        f" ORDER BY id LIMIT {batch_size:d}")
+            ids = [row[0] for row in rows]
+            if ids:
+                where = ", ".join(str(id_) for id_ in ids)
+                transaction.query(f"DELETE FROM {user.sqlmeta.table}"
+                                  f" WHERE id IN ({where})")
+                self.__change_stats(transaction,
+                                    user_count=-len(ids))
+            transaction.commit(close=True)
+        except Exception as err:
+            transaction.rollback()
+            raise DatabaseWriteError(err)
+
+        for id_ in ids:
+            self.connection.cache.expire(id_, user)
+        if ids:
+            self.__mark_changed(versions.USERS)
+        if ids and self.identities is not None:
+            self.identities.clear()
+        if self.membership is not None:
+            self.membership.leave_flows(row[0] for row in members)
+            self.membership.remove_users(ids)
+        if members:
+            self.__mark_changed(versions.FLOWS)
+        return len(ids)
+
+    def remove_orphan_joins(self) -> int:
+        """
+        Removes rows of flow membership which refer to absent rows.
+
+        Returns:
+            quantity of removed rows
+        """
+
+        join = models.Flow.sqlmeta.joins[
+            [item.joinMethodName for item
+             in models.Flow.sqlmeta.joins].index("users")]
+        where = (f" WHERE {join.joinColumn} NOT IN"
+                 f" (SELECT id FROM {models.Flow.sqlmeta.table})"
+                 f" OR {join.otherColumn} NOT IN"
+                 f" (SELECT id FROM {models.UserConfig.sqlmeta.table})")
+        transaction = self.connection.transaction()
+        try:
+            count = transaction.queryOne(f"SELECT COUNT(*) FROM"
+                                         f" {join.intermediateTable}"
+                                         f"{where}")[0]
+            if count:
+                transaction.query(f"DELETE FROM {join.intermediateTable}"
+                                  f"{where}")
+            transaction.commit(close=True)
+        except Exception as err:
+            transaction.rollback()
+            raise DatabaseWriteError(err)
+
+        if count:
+            if self.membership is not None:
+                self.membership.clear()
+            self.__mark_changed(versions.FLOWS)
+        return count
+
+    def vacuum(self,
+               pages: int = 100,
+               full: bool = False) -> int:
+        """
+        Returns free pages of SQLite database file to file system.
+
+        Notes:
+            Incremental vacuum frees ``pages`` pages in one step and
+            releases database between steps, so it does not block
+            server. It works only when ``auto_vacuum`` is INCREMENTAL.
+
+            Full vacuum rebuilds whole file and switches it to
+            INCREMENTAL mode, it blocks database until finished.
+            Until then incremental vacuum frees nothing and warning
+            is logged once.
+
+            Other databases are not changed.
+
+        Args:
+            pages: quantity of pages freed in one step
+            full: rebuild whole database file
+
+        Returns:
+            quantity of freed pages
+        """
+
+        if self.connection.dbName != "sqlite":
+            return 0
+
+        before = self.connection.queryOne("PRAGMA freelist_count")[0]
+        if full:
+            self.connection.query("PRAGMA auto_vacuum = INCREMENTAL")
+            self.connection.query("VACUUM")
+            return before
+
+        if self.connection.queryOne("PRAGMA auto_vacuum")[0] != 2:
+            # Setting of pragma does not change existing database file,
+            # freed pages stay in file until full vacuum
+            if not self._vacuum_warned:
+                self._vacuum_warned = True
+                logger.warning("Incremental vacuum is not available, "
+                               "database file is not in INCREMENTAL "
+                               "auto_vacuum mode. Run "
+                               "'manage.py compact --full' once to "
+                               "return free pages to file system")
+            return 0
+
+        free = before
+        while free:
+            # Driver makes only one step of statement which frees
+            # one page, script is executed to the end
+            with self.pool.checkout() as conn:
+                conn.executescript(f"PRAGMA incremental_vacuum({pages:d});")
+            left = self.connection.queryOne("PRAGMA freelist_count")[0]
+            if left >= free:
+                break
+            free = left
+        return before - free
+
+    def compact(self,
+                days: int,
+                batch_size: int = CHUNK_SIZE,
+                vacuum_pages: int = 100) -> dict[str, int]:
+        """
+        Purges deleted rows and frees pages of database file.
+
+        Notes:
+            Deleted messages and users older than ``days`` and orphan
+            rows of flow membership are removed.
+
+            Rows are removed in batches, every batch in its own
+            transaction. When called by compactor, stops after current
+            batch if compactor is stopped.
+
+        Args:
+            days: age of deleted message or user in days
+            batch_size: maximum quantity of rows removed at once
+            vacuum_pages: quantity of pages freed in one step of vacuum
+
+        Returns:
+            dict with quantity of removed messages, users, joins
+            and freed pages
+        """
+
+        before = int(unix_time()) - days * 86400
+        result = {"messages": 0,
+                  "users": 0,
+                  "joins": 0,
+                  "pages": 0}
+        for name, purge in (("messages", self.purge_deleted_messages),
+                            ("users", self.purge_deleted_users)):
+            while True:
+                removed = purge(before,
+                                batch_size)
+                result[name] += removed
+                if removed < batch_size:
+                    break
+                if self.compactor is not None and not self.compactor.running:
+                    return result
+        result["joins"] = self.remove_orphan_joins()
+        result["pages"] = self.vacuum(vacuum_pages)
+        return result
+
+    def start_compactor(self,
+                        days: int,
+                        interval: float,
+                        batch_size: int = CHUNK_SIZE,
+                        vacuum_pages: int = 100) -> None:
+        """
+        Starts background compaction of database.
+
+        Args:
+            days: age of deleted message or user in days after which
+                  it is purged
+            interval: time in seconds between runs of compaction
+            batch_size: maximum quantity of rows removed at once
+            vacuum_pages: quantity of pages freed in one step of vacuum
+        """
+
+        if self.compactor is None:
+            self.compactor = PeriodicTask(
+                lambda: self.compact(days,
+                                     batch_size,
+                                     vacuum_pages),
+                interval,
+                name="database-compactor",
+                prepare=self.pool.dedicate)
+        self.compactor.start()
+
+    def stop_compactor(self) -> None:
+        """
+        Stops background compaction of database.
+        """
+
+        if self.compactor is not None:
+            self.compactor.stop()
+            self.compactor = None
 
     def update_message(self,
                        uuid: str,
@@ -689,9 +2466,7 @@ class DBHandler:
             "Updated" message
         """
 
-        dbquery = self.__read_db(table="Message",
-                                 get_one=True,
-                                 uuid=uuid)
+        dbquery = self.get_message_by_uuid(uuid)
         if text:
             dbquery.text = text
 
@@ -716,6 +2491,7 @@ class DBHandler:
         if edited_status:
             dbquery.edited_status = edited_status
 
+        self.update_recent_message(dbquery)
         return "Updated"
 
     def get_all_flow(self) -> SelectResults:
@@ -741,9 +2517,25 @@ class DBHandler:
             (SQLObject):
         """
 
-        return self.__read_db(table="Flow",
-                              get_one=True,
-                              uuid=uuid)
+        return self.__read_prepared("flow_by_uuid",
+                                    uuid)
+
+    def get_flows_by_uuids(self,
+                           uuids: list[str] | tuple[str, ...]
+                           ) -> dict[str, SQLObject]:
+        """
+        Gives out many flows by list of uuid.
+
+        Args:
+            uuids: list of unique identify number from flow
+
+        Returns:
+            dict where key is uuid and value is flow, not found flows
+            are missing
+        """
+
+        return self.__read_by_uuids(table="Flow",
+                                    uuids=uuids)
 
     def get_flow_by_title(self,
                           title: str) -> SelectResults:
@@ -761,8 +2553,30 @@ class DBHandler:
                               get_one=False,
                               title=title)
 
-    @staticmethod
-    def get_flow_by_more_time(time: int) -> SelectResults:
+    def get_flow_by_last_activity(self,
+                                  limit: int = None) -> SelectResults:
+        """
+        Gives out flows sorted by time of last message, newest first.
+
+        Notes:
+            Flows without messages are at the end of list.
+
+        Args:
+            limit: maximum quantity of flows, None is unlimited
+
+        Returns:
+            (SelectResults):
+        """
+
+        dbquery = models.Flow.select(orderBy=DESC(
+                                     models.Flow.q.last_message_time),
+                                     connection=self.connection)
+        if limit is not None:
+            dbquery = dbquery.limit(limit)
+        return dbquery
+
+    def get_flow_by_more_time(self,
+                              time: int) -> SelectResults:
         """
         Gives flow by time => requested time.
 
@@ -775,8 +2589,8 @@ class DBHandler:
 
         return models.Flow.select(models.Flow.q.time_created >= time)
 
-    @staticmethod
-    def get_flow_by_less_time(time: int) -> SelectResults:
+    def get_flow_by_less_time(self,
+                              time: int) -> SelectResults:
         """
         Gives out flow by time <= requested time.
 
@@ -789,8 +2603,8 @@ class DBHandler:
 
         return models.Flow.select(models.Flow.q.time_created <= time)
 
-    @staticmethod
-    def get_flow_by_exact_time(time: int) -> SelectResults:
+    def get_flow_by_exact_time(self,
+                               time: int) -> SelectResults:
         """
         Gives out flow by time == requested time.
 
@@ -814,6 +2628,12 @@ class DBHandler:
         """
         Added new flow to the Flow table.
 
+        Notes:
+            Flow and its users are added in one transaction. Users are
+            read by one query and linked to flow by one insert (for every
+            ``CHUNK_SIZE`` users), if some user is not found then flow
+            is not added.
+
         Args:
             uuid: unique identify number from flow
             users: uuid user which used that flow
@@ -825,20 +2645,58 @@ class DBHandler:
 
         Returns:
             (SQLObject):
+
+        Raises:
+            DatabaseReadError: occurs when some of users is not found
+            DatabaseWriteError: occurs when there is an unknown problem
+                                when writing to database
         """
 
-        dbquery = self.__write_db(table="Flow",
+        members = list(dict.fromkeys(users))
+        join = next(item for item in models.Flow.sqlmeta.joins
+                    if item.joinMethodName == "users")
+
+        transaction = self.connection.transaction()
+        try:
+            ids = self.__get_ids(transaction,
+                                 "UserConfig",
+                                 members)
+            missing = [item for item in members if item not in ids]
+            if missing:
+                raise DatabaseReadError("".join(("Users not found: ",
+                                                 ", ".join(missing))))
+
+            flow_id = models.Flow(connection=transaction,
                                   uuid=uuid,
                                   time_created=time_created,
                                   flow_type=flow_type,
                                   title=title,
                                   info=info,
-                                  owner=owner)
-        for user_uuid in users:
-            dbquery.addUserConfig(self.__read_db(table="UserConfig",
-                                                 get_one=True,
-                                                 uuid=user_uuid))
-        return dbquery
+                                  owner=owner).id
+            rows = [(flow_id, ids[item]) for item in members]
+            for start in range(0, len(rows), CHUNK_SIZE):
+                query = Insert(join.intermediateTable,
+                               template=[join.joinColumn,
+                                         join.otherColumn],
+                               valueList=rows[start:start + CHUNK_SIZE])
+                transaction.query(transaction.sqlrepr(query))
+            self.__change_stats(transaction,
+                                flow_count=1)
+            transaction.commit(close=True)
+        except DatabaseReadError:
+            transaction.rollback()
+            raise
+        except Exception as err:
+            transaction.rollback()
+            raise DatabaseWriteError(err)
+
+        if self.membership is not None:
+            self.membership.add_flow(flow_id,
+                                     uuid,
+                                     [(ids[item], item) for item in members])
+        self.__mark_changed(versions.FLOWS)
+        return models.Flow.get(flow_id,
+                               connection=self.connection)
 
     def update_flow(self,
                     uuid: str,
@@ -876,12 +2734,213 @@ class DBHandler:
         if owner:
             dbquery.owner = owner
 
+        self.__mark_changed(versions.FLOWS)
         return "Updated"
 
+    def get_flow_member_uuids(self,
+                              flow_uuid: str) -> list[str]:
+        """
+        Gives out uuid of users which are members of flow.
+
+        Notes:
+            Members are taken from index, flow which is absent in index
+            (added without DBHandler) is read from database.
+
+        Args:
+            flow_uuid: unique identify number from flow
+
+        Returns:
+            list of uuid of users
+
+        Raises:
+            DatabaseReadError: occurs when flow is not found
+        """
+
+        if self.membership is not None:
+            members = self.membership.users_of(flow_uuid)
+            if members is not None:
+                return members
+        flow = self.get_flow_by_uuid(flow_uuid)
+        return [item.uuid for item in flow.users]
+
+    def get_user_flow_uuids(self,
+                            user_uuid: str) -> list[str]:
+        """
+        Gives out uuid of flows which user is member of.
+
+        Args:
+            user_uuid: unique user identify number
+
+        Returns:
+            list of uuid of flows
+
+        Raises:
+            DatabaseReadError: occurs when user is not found
+        """
+
+        if self.membership is not None:
+            flows = self.membership.flows_of(user_uuid)
+            if flows is not None:
+                return flows
+        user = self.get_user_by_uuid(user_uuid)
+        return [item.uuid for item in user.flows]
+
+    def is_flow_member(self,
+                       flow_uuid: str,
+                       user_uuid: str) -> bool:
+        """
+        Checks that user is member of flow.
+
+        Args:
+            flow_uuid: unique identify number from flow
+            user_uuid: unique user identify number
+
+        Returns:
+            True or False
+        """
+
+        if self.membership is not None:
+            member = self.membership.is_member(flow_uuid, user_uuid)
+            if member is not None:
+                return member
+        try:
+            return user_uuid in self.get_flow_member_uuids(flow_uuid)
+        except DatabaseReadError:
+            return False
+
+    def add_flow_members(self,
+                         flow_uuid: str,
+                         users: list[str] | tuple[str, ...]) -> int:
+        """
+        Adds users to flow.
+
+        Notes:
+            Users which are already members of flow are skipped.
+
+        Args:
+            flow_uuid: unique identify number from flow
+            users: uuid of users
+
+        Returns:
+            quantity of added members
+
+        Raises:
+            DatabaseReadError: occurs when flow or some of users is not
+                               found
+            DatabaseWriteError: occurs when there is an unknown problem
+                                when writing to database
+        """
+
+        members = list(dict.fromkeys(users))
+        join = next(item for item in models.Flow.sqlmeta.joins
+                    if item.joinMethodName == "users")
+
+        transaction = self.connection.transaction()
+        try:
+            flow_id = self.__get_ids(transaction,
+                                     "Flow",
+                                     [flow_uuid]).get(flow_uuid)
+            ids = self.__get_ids(transaction,
+                                 "UserConfig",
+                                 members)
+            missing = [item for item in members if item not in ids]
+            if flow_id is None:
+                raise DatabaseReadError(f"Flow not found: {flow_uuid}")
+            if missing:
+                raise DatabaseReadError("".join(("Users not found: ",
+                                                 ", ".join(missing))))
+
+            exists = {row[0] for row in transaction.queryAll(
+                f"SELECT {join.otherColumn} FROM {join.intermediateTable}"
+                f" WHERE {join.joinColumn} = {flow_id:d}")}
+            added = [item for item in members if ids[item] not in exists]
+            rows = [(flow_id, ids[item]) for item in added]
+            for start in range(0, len(rows), CHUNK_SIZE):
+                query = Insert(join.intermediateTable,
+                               template=[join.joinColumn,
+                                         join.otherColumn],
+                               valueList=rows[start:start + CHUNK_SIZE])
+                transaction.query(transaction.sqlrepr(query))
+            transaction.commit(close=True)
+        except DatabaseReadError:
+            transaction.rollback()
+            raise
+        except Exception as err:
+            transaction.rollback()
+            raise DatabaseWriteError(err)
+
+        if self.membership is not None:
+            self.membership.add_members(flow_id,
+                                        [(ids[item], item)
+                                         for item in added])
+        self.__mark_changed(versions.FLOWS)
+        return len(added)
+
+    def remove_flow_members(self,
+                            flow_uuid: str,
+                            users: list[str] | tuple[str, ...]) -> int:
+        """
+        Removes users from flow.
+
+        Args:
+            flow_uuid: unique identify number from flow
+            users: uuid of users
+
+        Returns:
+            quantity of removed members
+
+        Raises:
+            DatabaseReadError: occurs when flow is not found
+            DatabaseWriteError: occurs when there is an unknown problem
+                                when writing to database
+        """
+
+        members = list(dict.fromkeys(users))
+        join = next(item for item in models.Flow.sqlmeta.joins
+                    if item.joinMethodName == "users")
+
+        transaction = self.connection.transaction()
+        try:
+            flow_id = self.__get_ids(transaction,
+                                     "Flow",
+                                     [flow_uuid]).get(flow_uuid)
+            if flow_id is None:
+                raise DatabaseReadError(f"Flow not found: {flow_uuid}")
+            ids = list(self.__get_ids(transaction,
+                                      "UserConfig",
+                                      members).values())
+            removed = 0
+            for start in range(0, len(ids), CHUNK_SIZE):
+                where = ", ".join(str(id_) for id_
+                                  in ids[start:start + CHUNK_SIZE])
+                condition = (f" WHERE {join.joinColumn} = {flow_id:d}"
+                             f" AND {join.otherColumn} IN ({where})")
+                removed += transaction.queryOne(
+                    f"SELECT COUNT(*) FROM {join.intermediateTable}"
+                    f"{condition}")[0]
+                transaction.query(f"DELETE FROM {join.intermediateTable}"
+                                  f"{condition}")
+            transaction.commit(close=True)
+        except DatabaseReadError:
+            transaction.rollback()
+            raise
+        except Exception as err:
+            transaction.rollback()
+            raise DatabaseWriteError(err)
+
+        if self.membership is not None:
+            self.membership.remove_members(flow_id, ids)
+        self.__mark_changed(versions.FLOWS)
+        return removed
+
     def get_table_count(self) -> Any:
         """
         Gives out quantity all row from Message, Flow or UserConfig table.
 
+        Notes:
+            Quantity is read from Stats table, counters absent in it
+            are calculated by COUNT query.
+
         Returns:
             (namedtuple): where
 
@@ -895,15 +2954,17 @@ class DBHandler:
         TableCount = namedtuple('TableCount', ["user_count",
                                                "flow_count",
                                                "message_count"])
-        user = self.__read_db(table="UserConfig",
-                              get_one=False)
-        flow = self.__read_db(table="Flow",
-                              get_one=False)
-        message = self.__read_db(table="Message",
-                                 get_one=False)
-        return TableCount(user.count(),
-                          flow.count(),
-                          message.count())
+        tables = {"user_count": models.UserConfig,
+                  "flow_count": models.Flow,
+                  "message_count": models.Message}
+        query = Select([models.Stats.q.name,
+                        models.Stats.q.value])
+        stats = dict(self.connection.queryAll(
+            self.connection.sqlrepr(query)))
+        return TableCount(*(stats[name] if name in stats
+                            else class_.select(connection=self.connection
+                                               ).count()
+                            for name, class_ in tables.items()))
 
     def get_all_admin(self) -> SelectResults:
         """
@@ -0,0 +1,234 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+from collections import OrderedDict
+import threading
+from typing import Any
+from typing import NamedTuple
+from typing import Optional
+
+from sqlobject.dbconnection import DBAPI
+
+
+class UserIdentity(NamedTuple):
+    """
+    Fields of user which are checked on every request.
+    """
+
+    uuid: str
+    login: str
+    auth_id: Optional[str]
+    deleted_time: Optional[int] = None
+
+
+class IdentityCache:
+    """
+    LRU cache of identity of users by uuid and by login.
+
+    Notes:
+        Login is mapped to uuid only when user was found by login,
+        because login is not unique in UserConfig table. Absence of
+        user is not cached.
+
+        Cache must be invalidated by every change of login, auth_id
+        or deleted_time of user. Identity read from database before
+        invalidation is not put in cache, ``version`` is taken before
+        reading for that.
+
+    Args:
+        max_entries: maximum quantity of users in cache
+    """
+
+    def __init__(self,
+                 max_entries: int = 10000) -> None:
+        if max_entries < 1:
+            raise ValueError("Size of cache must be >= 1")
+
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.version = 0
+        self._by_uuid: OrderedDict[str, UserIdentity] = OrderedDict()
+        self._by_login: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def attach(cls,
+               connection: DBAPI,
+               max_entries: int = 10000) -> "IdentityCache":
+        """
+        Gives out cache of connection, creates it if there is no cache.
+
+        Notes:
+            SQLObject caches connection for every URI, so all DBHandler
+            objects with the same URI share one cache and invalidate it
+            for each other.
+
+        Args:
+            connection: SQLObject connection
+            max_entries: maximum quantity of users in cache
+
+        Returns:
+            cache of connection
+        """
+
+        cache = getattr(connection, "_identity_cache", None)
+        if cache is None:
+            cache = cls(max_entries)
+            connection._identity_cache = cache
+        return cache
+
+    def _get(self,
+             uuid: Optional[str]) -> Optional[UserIdentity]:
+        """
+        Gives out identity by uuid and counts hit or miss.
+
+        Notes:
+            Must be called when lock is acquired.
+        """
+
+        identity = self._by_uuid.get(uuid) if uuid is not None else None
+        if identity is None:
+            self.misses += 1
+            return None
+        self._by_uuid.move_to_end(uuid)
+        self.hits += 1
+        return identity
+
+    def get(self,
+            uuid: str) -> Optional[UserIdentity]:
+        """
+        Gives out identity of user by uuid.
+
+        Args:
+            uuid: unique user identify number
+
+        Returns:
+            identity or None if user is not in cache
+        """
+
+        with self._lock:
+            return self._get(uuid)
+
+    def get_by_login(self,
+                     login: str) -> Optional[UserIdentity]:
+        """
+        Gives out identity of user by login.
+
+        Args:
+            login: user login
+
+        Returns:
+            identity or None if user is not in cache
+        """
+
+        with self._lock:
+            return self._get(self._by_login.get(login))
+
+    def put(self,
+            identity: UserIdentity,
+            version: int,
+            by_login: bool = False) -> None:
+        """
+        Puts identity of user in cache.
+
+        Args:
+            identity: identity of user
+            version: value of ``version`` taken before reading of user
+            by_login: user was found by login, so login is unique
+        """
+
+        with self._lock:
+            if version != self.version:
+                return
+            self._by_uuid[identity.uuid] = identity
+            self._by_uuid.move_to_end(identity.uuid)
+            if by_login:
+                self._by_login[identity.login] = identity.uuid
+            while len(self._by_uuid) > self.max_entries:
+                _, evicted = self._by_uuid.popitem(last=False)
+                self._forget_login(evicted)
+                self.evictions += 1
+
+    def _forget_login(self,
+                      identity: UserIdentity) -> None:
+        """
+        Removes login of identity from index.
+
+        Notes:
+            Must be called when lock is acquired.
+        """
+
+        if self._by_login.get(identity.login) == identity.uuid:
+            del self._by_login[identity.login]
+
+    def invalidate(self,
+                   uuid: str = None,
+                   login: str = None) -> None:
+        """
+        Removes user from cache.
+
+        Args:
+            uuid: unique user identify number
+            login: user login, removed even if it belongs to other user
+        """
+
+        with self._lock:
+            self.version += 1
+            identity = self._by_uuid.pop(uuid, None)
+            if identity is not None:
+                self._forget_login(identity)
+                self.invalidations += 1
+            if login is not None and login in self._by_login:
+                self._by_uuid.pop(self._by_login.pop(login), None)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        """
+        Removes all users from cache.
+        """
+
+        with self._lock:
+            self.version += 1
+            self.invalidations += len(self._by_uuid)
+            self._by_uuid.clear()
+            self._by_login.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Gives out counters of cache.
+
+        Returns:
+            dict with quantity of users, hits, misses, hit rate,
+            evictions and invalidations
+        """
+
+        with self._lock:
+            requests = self.hits + self.misses
+            return {"size": len(self._by_uuid),
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "hit_rate": self.hits / requests if requests else 0.0,
+                    "evictions": self.evictions,
+                    "invalidations": self.invalidations}
@@ -0,0 +1,397 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+from array import array
+from bisect import bisect_left
+import threading
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Optional
+
+from sqlobject.dbconnection import DBAPI
+
+# Type code of arrays with id of rows
+ID_TYPE = "q"
+
+
+def _insert(ids: array,
+            id_: int) -> bool:
+    """
+    Puts id in sorted array if it is absent.
+
+    Returns:
+        True if id was added
+    """
+
+    position = bisect_left(ids, id_)
+    if position < len(ids) and ids[position] == id_:
+        return False
+    ids.insert(position, id_)
+    return True
+
+
+def _remove(ids: array,
+            id_: int) -> bool:
+    """
+    Removes id from sorted array.
+
+    Returns:
+        True if id was removed
+    """
+
+    position = bisect_left(ids, id_)
+    if position < len(ids) and ids[position] == id_:
+        del ids[position]
+        return True
+    return False
+
+
+def _contains(ids: array,
+              id_: Optional[int]) -> bool:
+    """
+    Checks that id is in sorted array.
+    """
+
+    if id_ is None:
+        return False
+    position = bisect_left(ids, id_)
+    return position < len(ids) and ids[position] == id_
+
+
+class MembershipIndex:
+    """
+    Members of flows and flows of users held in memory.
+
+    Notes:
+        Id of users and flows are kept in sorted arrays of 8 bytes
+        integers, so flow with 100 000 members takes about 800 KB in
+        every direction. Uuid are kept once for every user and flow.
+
+        Index is filled by ``load`` and must be changed by every
+        change of membership made after it.
+
+    Args:
+        loader: function which gives out rows of flows, users and
+                membership as three lists of pairs (id, uuid),
+                (id, uuid) and (flow id, user id)
+    """
+
+    def __init__(self,
+                 loader: Callable[[], tuple[Iterable[tuple[int, str]],
+                                            Iterable[tuple[int, str]],
+                                            Iterable[tuple[int, int]]]]
+                 ) -> None:
+        self.loader = loader
+        self.loaded = False
+        self._lock = threading.RLock()
+        self._clear()
+
+    @classmethod
+    def attach(cls,
+               connection: DBAPI,
+               loader: Callable[[], Any]) -> "MembershipIndex":
+        """
+        Gives out index of connection, creates it if there is no index.
+
+        Notes:
+            SQLObject caches connection for every URI, so all DBHandler
+            objects with the same URI share one index.
+
+        Args:
+            connection: SQLObject connection
+            loader: function which reads membership from database
+
+        Returns:
+            index of connection
+        """
+
+        index = getattr(connection, "_membership_index", None)
+        if index is None:
+            index = cls(loader)
+            connection._membership_index = index
+        return index
+
+    def _clear(self) -> None:
+        """
+        Removes all rows from index.
+        """
+
+        self._users_of: dict[int, array] = {}
+        self._flows_of: dict[int, array] = {}
+        self._flow_ids: dict[str, int] = {}
+        self._flow_uuids: dict[int, str] = {}
+        self._user_ids: dict[str, int] = {}
+        self._user_uuids: dict[int, str] = {}
+
+    def load(self) -> None:
+        """
+        Reads membership from database.
+
+        Notes:
+            Changes of index wait until loading is finished, so they
+            are not lost.
+        """
+
+        with self._lock:
+            flows, users, members = self.loader()
+            self._clear()
+            for id_, uuid in flows:
+                self._flow_ids[uuid] = id_
+                self._flow_uuids[id_] = uuid
+                self._users_of[id_] = array(ID_TYPE)
+            for id_, uuid in users:
+                self._user_ids[uuid] = id_
+                self._user_uuids[id_] = uuid
+                self._flows_of[id_] = array(ID_TYPE)
+            for flow_id, user_id in members:
+                if flow_id in self._users_of and user_id in self._flows_of:
+                    _insert(self._users_of[flow_id], user_id)
+                    _insert(self._flows_of[user_id], flow_id)
+            self.loaded = True
+
+    def ensure_loaded(self) -> None:
+        """
+        Loads index if it is not loaded yet.
+        """
+
+        if not self.loaded:
+            with self._lock:
+                if not self.loaded:
+                    self.load()
+
+    def clear(self) -> None:
+        """
+        Removes all rows, index is loaded again on next use.
+        """
+
+        with self._lock:
+            self._clear()
+            self.loaded = False
+
+    def add_user(self,
+                 id_: int,
+                 uuid: str) -> None:
+        """
+        Adds user without flows.
+
+        Args:
+            id_: id of user
+            uuid: unique user identify number
+        """
+
+        with self._lock:
+            if not self.loaded:
+                return
+            self._user_ids[uuid] = id_
+            self._user_uuids[id_] = uuid
+            self._flows_of.setdefault(id_, array(ID_TYPE))
+
+    def leave_flows(self,
+                    ids: Iterable[int]) -> None:
+        """
+        Removes users from all their flows.
+
+        Args:
+            ids: id of users
+        """
+
+        with self._lock:
+            if not self.loaded:
+                return
+            for id_ in ids:
+                flows = self._flows_of.get(id_)
+                if flows is None:
+                    continue
+                for flow_id in flows:
+                    _remove(self._users_of[flow_id], id_)
+                self._flows_of[id_] = array(ID_TYPE)
+
+    def remove_users(self,
+                     ids: Iterable[int]) -> None:
+        """
+        Removes users and their membership in flows.
+
+        Args:
+            ids: id of users
+        """
+
+        with self._lock:
+            if not self.loaded:
+                return
+            ids = list(ids)
+            self.leave_flows(ids)
+            for id_ in ids:
+                self._flows_of.pop(id_, None)
+                uuid = self._user_uuids.pop(id_, None)
+                self._user_ids.pop(uuid, None)
+
+    def add_flow(self,
+                 id_: int,
+                 uuid: str,
+                 users: Iterable[tuple[int, str]] = ()) -> None:
+        """
+        Adds flow with members.
+
+        Args:
+            id_: id of flow
+            uuid: unique identify number from flow
+            users: pairs of id and uuid of members
+        """
+
+        with self._lock:
+            if not self.loaded:
+                return
+            self._flow_ids[uuid] = id_
+            self._flow_uuids[id_] = uuid
+            self._users_of.setdefault(id_, array(ID_TYPE))
+            self.add_members(id_, users)
+
+    def add_members(self,
+                    flow_id: int,
+                    users: Iterable[tuple[int, str]]) -> None:
+        """
+        Adds users to flow.
+
+        Notes:
+            Flow which is absent in index is skipped, its members are
+            read from database.
+
+        Args:
+            flow_id: id of flow
+            users: pairs of id and uuid of users
+        """
+
+        with self._lock:
+            if not self.loaded:
+                return
+            members = self._users_of.get(flow_id)
+            if members is None:
+                return
+            for user_id, user_uuid in users:
+                self._user_ids[user_uuid] = user_id
+                self._user_uuids[user_id] = user_uuid
+                _insert(members, user_id)
+                _insert(self._flows_of.setdefault(user_id,
+                                                  array(ID_TYPE)),
+                        flow_id)
+
+    def remove_members(self,
+                       flow_id: int,
+                       user_ids: Iterable[int]) -> None:
+        """
+        Removes users from flow.
+
+        Args:
+            flow_id: id of flow
+            user_ids: id of users
+        """
+
+        with self._lock:
+            if not self.loaded:
+                return
+            members = self._users_of.get(flow_id)
+            for user_id in user_ids:
+                if members is not None:
+                    _remove(members, user_id)
+                if user_id in self._flows_of:
+                    _remove(self._flows_of[user_id], flow_id)
+
+    def users_of(self,
+                 flow_uuid: str) -> Optional[list[str]]:
+        """
+        Gives out uuid of members of flow.
+
+        Args:
+            flow_uuid: unique identify number from flow
+
+        Returns:
+            list of uuid sorted by id of users or None if flow is
+            absent in index
+        """
+
+        self.ensure_loaded()
+        with self._lock:
+            members = self._users_of.get(self._flow_ids.get(flow_uuid))
+            if members is None:
+                return None
+            return [self._user_uuids[id_] for id_ in members]
+
+    def flows_of(self,
+                 user_uuid: str) -> Optional[list[str]]:
+        """
+        Gives out uuid of flows of user.
+
+        Args:
+            user_uuid: unique user identify number
+
+        Returns:
+            list of uuid sorted by id of flows or None if user is
+            absent in index
+        """
+
+        self.ensure_loaded()
+        with self._lock:
+            flows = self._flows_of.get(self._user_ids.get(user_uuid))
+            if flows is None:
+                return None
+            return [self._flow_uuids[id_] for id_ in flows]
+
+    def is_member(self,
+                  flow_uuid: str,
+                  user_uuid: str) -> Optional[bool]:
+        """
+        Checks that user is member of flow.
+
+        Args:
+            flow_uuid: unique identify number from flow
+            user_uuid: unique user identify number
+
+        Returns:
+            True or False, None if flow is absent in index
+        """
+
+        self.ensure_loaded()
+        with self._lock:
+            members = self._users_of.get(self._flow_ids.get(flow_uuid))
+            if members is None:
+                return None
+            return _contains(members, self._user_ids.get(user_uuid))
+
+    def stats(self) -> dict[str, int]:
+        """
+        Gives out size of index.
+
+        Returns:
+            dict with quantity of flows, users, memberships and size
+            of arrays in bytes
+        """
+
+        with self._lock:
+            memberships = sum(len(item) for item in self._users_of.values())
+            size = sum(item.buffer_info()[1] * item.itemsize
+                       for item in (*self._users_of.values(),
+                                    *self._flows_of.values()))
+            return {"flows": len(self._flow_ids),
+                    "users": len(self._user_ids),
+                    "memberships": memberships,
+                    "bytes": size}
@@ -0,0 +1,363 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+from bisect import bisect_left
+from functools import wraps
+import inspect
+import re
+import threading
+from time import perf_counter
+from typing import Any
+from typing import Callable
+
+from loguru import logger
+from sqlobject.dbconnection import DBAPI
+
+# Upper bounds of buckets of latency histogram in milliseconds
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+                   1000, 2500, 5000)
+# Upper bounds of buckets of histogram of queries made by one request
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+# Maximum length of SQL text written in slow query log
+SLOW_QUERY_TEXT = 1000
+# String, blob and number literals hidden in slow query log
+SQL_LITERAL = re.compile(r"(?<!\w)[xX]?'(?:[^']|'')*'"
+                         r"|(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?")
+
+
+class Histogram:
+    """
+    Quantity of values in buckets with fixed upper bounds.
+
+    Notes:
+        Last bucket has no upper bound. Percentile is estimated as
+        upper bound of bucket which contains it.
+
+    Args:
+        bounds: sorted upper bounds of buckets
+    """
+
+    __slots__ = ("bounds",
+                 "buckets",
+                 "count",
+                 "total",
+                 "max")
+
+    def __init__(self,
+                 bounds: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self,
+            value: float) -> None:
+        """
+        Adds one value.
+
+        Args:
+            value: measured value
+        """
+
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self,
+                   part: float) -> float:
+        """
+        Estimates percentile.
+
+        Args:
+            part: percentile from 0 to 1
+
+        Returns:
+            upper bound of bucket or maximum value for last bucket,
+            0 if there are no values
+        """
+
+        if not self.count:
+            return 0.0
+        rank = part * self.count
+        passed = 0
+        for number, quantity in enumerate(self.buckets):
+            passed += quantity
+            if passed >= rank and quantity:
+                if number < len(self.bounds):
+                    return min(self.bounds[number], self.max)
+                break
+        return self.max
+
+    def as_dict(self) -> dict[str, Any]:
+        """
+        Gives out histogram as dict.
+
+        Returns:
+            dict with count, total, average, maximum, percentiles
+            and quantity of values in every bucket
+        """
+
+        average = self.total / self.count if self.count else 0.0
+        buckets = {f"le_{bound:g}": quantity for bound, quantity
+                   in zip(self.bounds, self.buckets)}
+        buckets["inf"] = self.buckets[-1]
+        return {"count": self.count,
+                "total": self.total,
+                "average": average,
+                "max": self.max,
+                "p50": self.percentile(0.5),
+                "p99": self.percentile(0.99),
+                "buckets": buckets}
+
+
+class QueryMetrics:
+    """
+    Latency of DBHandler methods and SQL queries.
+
+    Notes:
+        Latency is recorded in milliseconds. Queries made by thread
+        inside ``begin_request`` and ``end_request`` are counted as
+        queries of one request.
+
+    Args:
+        slow_query: time in milliseconds after which query is written
+                    to log, 0 disables log
+    """
+
+    def __init__(self,
+                 slow_query: float = 0) -> None:
+        self.slow_query = slow_query
+        self.methods: dict[str, Histogram] = {}
+        self.queries = Histogram()
+        self.requests = Histogram(COUNT_BUCKETS)
+        self.slow_queries = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @classmethod
+    def attach(cls,
+               connection: DBAPI,
+               slow_query: float = 0) -> "QueryMetrics":
+        """
+        Gives out metrics of connection, creates them if there are none.
+
+        Notes:
+            Every query executed by SQLObject connection or its
+            transactions is measured. SQLObject caches connection for
+            every URI, so all DBHandler objects with the same URI share
+            metrics, threshold of slow query log is taken from last
+            of them.
+
+        Args:
+            connection: SQLObject connection
+            slow_query: time in milliseconds after which query is
+                        written to log, 0 disables log
+
+        Returns:
+            metrics of connection
+        """
+
+        metrics = getattr(connection, "_query_metrics", None)
+        if metrics is not None:
+            metrics.slow_query = slow_query
+            return metrics
+
+        metrics = cls(slow_query)
+        execute = connection._executeRetry
+
+        def timed_execute(conn: Any,
+                          cursor: Any,
+                          query: str,
+                          *args: Any) -> Any:
+            start = perf_counter()
+            try:
+                return execute(conn, cursor, query, *args)
+            finally:
+                metrics.add_query(query, perf_counter() - start)
+
+        connection._executeRetry = timed_execute
+        connection._query_metrics = metrics
+        return metrics
+
+    def add_method(self,
+                   name: str,
+                   elapsed: float) -> None:
+        """
+        Adds execution time of DBHandler method.
+
+        Args:
+            name: name of method
+            elapsed: execution time in seconds
+        """
+
+        with self._lock:
+            histogram = self.methods.get(name)
+            if histogram is None:
+                histogram = self.methods[name] = Histogram()
+            histogram.add(elapsed * 1000)
+
+    def add_query(self,
+                  query: str,
+                  elapsed: float) -> None:
+        """
+        Adds execution time of SQL query.
+
+        Args:
+            query: SQL text
+            elapsed: execution time in seconds
+        """
+
+        elapsed *= 1000
+        self._local.count = getattr(self._local, "count", 0) + 1
+        with self._lock:
+            self.queries.add(elapsed)
+            slow = 0 < self.slow_query <= elapsed
+            if slow:
+                self.slow_queries += 1
+        if slow:
+            logger.warning(f"Slow query ({elapsed:.1f} ms):"
+                           f" {mask_literals(query)[:SLOW_QUERY_TEXT]}")
+
+    def begin_request(self) -> None:
+        """
+        Starts counting of queries made by current thread.
+        """
+
+        self._local.depth = getattr(self._local, "depth", 0) + 1
+        if self._local.depth == 1:
+            self._local.count = 0
+
+    def end_request(self) -> int:
+        """
+        Finishes counting of queries made by current thread.
+
+        Returns:
+            quantity of queries made since ``begin_request``
+        """
+
+        count = getattr(self._local, "count", 0)
+        self._local.depth = getattr(self._local, "depth", 1) - 1
+        if self._local.depth == 0:
+            with self._lock:
+                self.requests.add(count)
+        return count
+
+    def request_queries(self) -> int:
+        """
+        Gives out quantity of queries made by current thread in request.
+
+        Returns:
+            quantity of queries
+        """
+
+        return getattr(self._local, "count", 0)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Gives out histograms of methods, queries and requests.
+
+        Returns:
+            dict with histograms of every method, all queries and
+            quantity of queries in one request, and quantity of slow
+            queries
+        """
+
+        with self._lock:
+            return {"methods": {name: histogram.as_dict() for name,
+                                histogram in self.methods.items()},
+                    "queries": self.queries.as_dict(),
+                    "requests": self.requests.as_dict(),
+                    "slow_queries": self.slow_queries}
+
+    def reset(self) -> None:
+        """
+        Removes all recorded values.
+        """
+
+        with self._lock:
+            self.methods = {}
+            self.queries = Histogram()
+            self.requests = Histogram(COUNT_BUCKETS)
+            self.slow_queries = 0
+
+
+def mask_literals(query: str) -> str:
+    """
+    Replaces literals of SQL query with placeholders.
+
+    Notes:
+        SQLObject inlines values into SQL text, so query can contain
+        passwords and tokens. Strings, blobs and numbers are replaced
+        with ``?``, names of tables and columns are kept.
+
+    Args:
+        query: SQL text
+
+    Returns:
+        SQL text without values
+    """
+
+    return SQL_LITERAL.sub("?", query)
+
+
+def instrument_methods(cls: type) -> type:
+    """
+    Records execution time of every public method of class.
+
+    Notes:
+        Time is added to ``metrics`` attribute of object, methods are
+        called without measurement if it is None. Static and class
+        methods, properties and methods listed in ``_not_measured``
+        attribute of class are not changed.
+
+    Args:
+        cls: class of DBHandler
+
+    Returns:
+        the same class
+    """
+
+    def measure(name: str,
+                func: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(func)
+        def wrapper(self, *args: Any, **kwargs: Any) -> Any:
+            metrics = self.metrics
+            if metrics is None:
+                return func(self, *args, **kwargs)
+            start = perf_counter()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                metrics.add_method(name, perf_counter() - start)
+
+        return wrapper
+
+    skipped = set(getattr(cls, "_not_measured", ()))
+    for name, value in list(vars(cls).items()):
+        if name.startswith("_") or name in skipped:
+            continue
+        if inspect.isfunction(value):
+            setattr(cls, name, measure(name, value))
+    return cls
@@ -41,6 +41,7 @@ class UserConfig(orm.SQLObject):
         bio (str, optional): text for added in information about user
         salt (str, optional): added in password string for create hash_password
         key (str, optional): added in password string for create hash_password
+        deleted_time (int, optional): time when user is deleted
     """
 
     uuid = orm.StringCol(notNone=True, unique=True)
@@ -56,6 +57,7 @@ class UserConfig(orm.SQLObject):
     bio = orm.StringCol(default=None)
     salt = orm.BLOBCol(default=None)
     key = orm.BLOBCol(default=None)
+    deleted_time = orm.IntCol(default=None)
     # Connection to Message and Flow table
     messages = orm.MultipleJoin('Message')
     flows = orm.RelatedJoin('Flow')
@@ -72,6 +74,8 @@ class Flow(orm.SQLObject):
         flow_type (str, optional): which contains chat, channel, group
         title (str, optional): name added in public information about flow
         info (str, optional): text added in public information about flow
+        message_count (int, optional): quantity of messages in flow
+        last_message_time (int, optional): time of last message in flow
     """
 
     uuid = orm.StringCol(notNone=True, unique=True)
@@ -80,6 +84,10 @@ class Flow(orm.SQLObject):
     title = orm.StringCol(default=None)
     info = orm.StringCol(default=None)
     owner = orm.StringCol(default=None)
+    # Counters updated together with adding of message
+    message_count = orm.IntCol(default=0)
+    last_message_time = orm.IntCol(default=None)
+    last_message_time_index = orm.DatabaseIndex("last_message_time")
     # Connection to the Message and UserConfig table
     messages = orm.MultipleJoin('Message')
     users = orm.RelatedJoin('UserConfig')
@@ -102,6 +110,7 @@ class Message(orm.SQLObject):
         edited_time (int, optional): time when user last time is corrected his
                                      message
         edited_status (bool, optional): True if user corrected his message
+        deleted_time (int, optional): time when message is deleted
     """
 
     uuid = orm.StringCol(notNone=True, unique=True)
@@ -114,11 +123,65 @@ class Message(orm.SQLObject):
     emoji = orm.BLOBCol(default=None)
     edited_time = orm.IntCol(default=None)
     edited_status = orm.BoolCol(default=False)
+    deleted_time = orm.IntCol(default=None)
     # Connection to UserConfig and Flow table
     user = orm.ForeignKey('UserConfig')
     flow = orm.ForeignKey('Flow')
 
 
+class ArchivedMessage(orm.SQLObject):
+    """
+    Archive table containing old messages moved from Message table.
+
+    Notes:
+        Columns are the same as in Message table, row keeps id which
+        message had in Message table.
+    """
+
+    uuid = orm.StringCol(notNone=True, unique=True)
+    text = orm.StringCol(default=None)
+    time = orm.IntCol(default=None)
+    file_picture = orm.BLOBCol(default=None)
+    file_video = orm.BLOBCol(default=None)
+    file_audio = orm.BLOBCol(default=None)
+    file_document = orm.BLOBCol(default=None)
+    emoji = orm.BLOBCol(default=None)
+    edited_time = orm.IntCol(default=None)
+    edited_status = orm.BoolCol(default=False)
+    deleted_time = orm.IntCol(default=None)
+    # Connection to UserConfig and Flow table
+    user = orm.ForeignKey('UserConfig')
+    flow = orm.ForeignKey('Flow')
+    flow_time_index = orm.DatabaseIndex("flow", "time")
+
+
+class Stats(orm.SQLObject):
+    """
+    Stats table containing global counters like quantity of messages.
+
+    Args:
+        name (str, required, unique): name of counter like
+                                      ``message_count``
+        value (int, required): value of counter
+    """
+
+    name = orm.StringCol(notNone=True, unique=True)
+    value = orm.IntCol(notNone=True, default=0)
+
+
+class ChangeTime(orm.SQLObject):
+    """
+    ChangeTime table containing time of last change of groups of data.
+
+    Args:
+        name (str, required, unique): name of group like ``messages``
+        time (float, required): Unix-like time of last change
+    """
+
+    name = orm.StringCol(notNone=True, unique=True)
+    time = orm.FloatCol(notNone=True, default=0)
+
+
 class Admin(orm.SQLObject):
     """
     Admin table containing information about users with administrators role.
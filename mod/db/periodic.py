@@ -0,0 +1,122 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import threading
+from typing import Callable
+from typing import Optional
+
+from loguru import logger
+
+
+class PeriodicTask:
+    """
+    Dedicated thread which calls function at regular intervals.
+
+    Notes:
+        Exception raised by ``action`` is logged and does not stop
+        thread. First call is made after ``interval`` seconds.
+
+        Long ``action`` can check ``running`` to finish its work
+        earlier when task is stopped.
+
+    Args:
+        action: function called in thread
+        interval: time in seconds between end of call and next call
+        name: name of thread
+        prepare: function called in thread before first call
+    """
+
+    def __init__(self,
+                 action: Callable[[], None],
+                 interval: float,
+                 name: str = "periodic-task",
+                 prepare: Optional[Callable[[], None]] = None) -> None:
+        if interval <= 0:
+            raise ValueError("Interval must be > 0")
+
+        self.action = action
+        self.interval = interval
+        self.name = name
+        self.prepare = prepare
+        self.calls = 0
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        """
+        Shows is thread started and not asked to stop.
+
+        Returns:
+            True or False
+        """
+
+        if self._thread is None or self._stop.is_set():
+            return False
+        return self._thread.is_alive()
+
+    def start(self) -> None:
+        """
+        Starts thread.
+        """
+
+        if self.running:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name=self.name,
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self,
+             timeout: Optional[float] = None) -> None:
+        """
+        Stops thread after current call of ``action``.
+
+        Args:
+            timeout: time in seconds to wait for thread
+        """
+
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        """
+        Loop of thread.
+        """
+
+        if self.prepare is not None:
+            self.prepare()
+
+        while not self._stop.wait(self.interval):
+            self.calls += 1
+            try:
+                self.action()
+            except Exception as ERROR:
+                self.failures += 1
+                logger.exception(f"Task {self.name} failed: {ERROR}")
@@ -0,0 +1,291 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+from contextlib import contextmanager
+import threading
+from time import perf_counter
+from typing import Any
+from typing import Iterator
+
+from sqlobject.dbconnection import DBAPI
+
+
+class PoolTimeoutError(Exception):
+    """
+    Occurs when free connection was not received in acquire timeout.
+    """
+
+
+class PoolStats:
+    """
+    Counters of connection pool, used to see saturation under load.
+    """
+
+    __slots__ = ("acquired",
+                 "timeouts",
+                 "in_use",
+                 "peak_in_use",
+                 "total_wait",
+                 "max_wait")
+
+    def __init__(self) -> None:
+        self.acquired = 0
+        self.timeouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def add_wait(self,
+                 elapsed: float) -> None:
+        """
+        Adds time of waiting for one connection.
+
+        Args:
+            elapsed: waiting time in seconds
+        """
+
+        self.acquired += 1
+        self.total_wait += elapsed
+        if elapsed > self.max_wait:
+            self.max_wait = elapsed
+
+    def as_dict(self) -> dict[str, Any]:
+        """
+        Gives out counters as dict.
+
+        Returns:
+            dict with quantity of checkouts, timeouts, connections in use
+            and waiting time in seconds
+        """
+
+        average = self.total_wait / self.acquired if self.acquired else 0.0
+        return {"acquired": self.acquired,
+                "timeouts": self.timeouts,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "total_wait": self.total_wait,
+                "average_wait": average,
+                "max_wait": self.max_wait}
+
+
+class ConnectionPool:
+    """
+    Limits quantity of database connections used at the same time.
+
+    Notes:
+        Pool replaces ``getConnection`` and ``releaseConnection`` of
+        SQLObject connection, so every query made by ORM goes through
+        pool. Raw connections are still created and cached by SQLObject.
+
+        If ``per_thread`` is True then nested checkouts in one thread
+        (like query made while iterating over other query) receive the
+        same connection and take one place in pool. Connection pinned
+        by ``checkout`` block is reused by all queries of thread made
+        in block regardless of ``per_thread``.
+
+    Args:
+        connection: SQLObject connection
+        min_size: quantity of connections opened on start
+        max_size: maximum quantity of connections used at the same time
+        timeout: time in seconds to wait for free connection
+        per_thread: reuse one connection for all checkouts in thread
+    """
+
+    def __init__(self,
+                 connection: DBAPI,
+                 min_size: int = 1,
+                 max_size: int = 10,
+                 timeout: float = 5.0,
+                 per_thread: bool = True) -> None:
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool size must be 0 <= min_size <= max_size"
+                             " and max_size >= 1")
+        if getattr(connection, "_connection_pool", None) is not None:
+            raise ValueError("Connection already has pool")
+
+        self.connection = connection
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.per_thread = per_thread
+        self.stats = PoolStats()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._get_connection = connection.getConnection
+        self._release_connection = connection.releaseConnection
+
+        connection.getConnection = self.acquire
+        connection.releaseConnection = self.release
+        connection._connection_pool = self
+        self._prepare()
+
+    @classmethod
+    def attach(cls,
+               connection: DBAPI,
+               **options) -> "ConnectionPool":
+        """
+        Gives out pool of connection, creates it if there is no pool.
+
+        Notes:
+            SQLObject caches connection for every URI, so all DBHandler
+            objects with the same URI share one pool created with
+            settings of first of them.
+
+        Args:
+            connection: SQLObject connection
+            **options: settings of pool, look at ``ConnectionPool``
+
+        Returns:
+            pool of connection
+        """
+
+        pool = getattr(connection, "_connection_pool", None)
+        if pool is None:
+            pool = cls(connection, **options)
+        return pool
+
+    def _prepare(self) -> None:
+        """
+        Opens ``min_size`` connections and returns them to pool.
+        """
+
+        opened = [self._get_connection() for _ in range(self.min_size)]
+        for conn in opened:
+            self._release_connection(conn)
+
+    def acquire(self,
+                pin: bool = False) -> Any:
+        """
+        Gives out connection from pool.
+
+        Notes:
+            Pinned connection is given out to every checkout of thread
+            until it is released, so queries made while it is held do
+            not take more places in pool.
+
+        Args:
+            pin: reuse connection for checkouts of thread until release
+
+        Returns:
+            raw connection of DB-API driver
+
+        Raises:
+            PoolTimeoutError: occurs when all connections are in use
+                              longer than acquire timeout
+        """
+
+        if getattr(self._local, "depth", 0):
+            self._local.depth += 1
+            return self._local.conn
+
+        if getattr(self._local, "dedicated", False):
+            conn = self._get_connection()
+            if self.per_thread or pin:
+                self._local.depth = 1
+                self._local.conn = conn
+            return conn
+
+        start = perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.stats.timeouts += 1
+            raise PoolTimeoutError("No free database connection in"
+                                   f" {self.timeout} seconds")
+
+        try:
+            conn = self._get_connection()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.stats.add_wait(perf_counter() - start)
+            self.stats.in_use += 1
+            if self.stats.in_use > self.stats.peak_in_use:
+                self.stats.peak_in_use = self.stats.in_use
+
+        if self.per_thread or pin:
+            self._local.depth = 1
+            self._local.conn = conn
+        return conn
+
+    def release(self,
+                conn: Any,
+                explicit: bool = False) -> None:
+        """
+        Returns connection in pool.
+
+        Args:
+            conn: raw connection received from ``acquire``
+            explicit: connection released by transaction
+        """
+
+        if getattr(self._local, "depth", 0):
+            if conn is self._local.conn:
+                self._local.depth -= 1
+                if self._local.depth:
+                    return
+                self._local.conn = None
+
+        if getattr(self._local, "dedicated", False):
+            self._release_connection(conn, explicit)
+            return
+
+        try:
+            self._release_connection(conn, explicit)
+        finally:
+            with self._lock:
+                self.stats.in_use -= 1
+            self._slots.release()
+
+    def dedicate(self) -> None:
+        """
+        Marks current thread as dedicated to background work.
+
+        Notes:
+            Connections of dedicated thread (like writer thread) are not
+            limited by pool size, so background work is not blocked by
+            requests which hold all connections and wait for it.
+        """
+
+        self._local.dedicated = True
+
+    @contextmanager
+    def checkout(self) -> Iterator[Any]:
+        """
+        Holds one connection while block is executed.
+
+        Notes:
+            All queries in block made from the same thread use this
+            connection.
+
+        Returns:
+            raw connection of DB-API driver
+        """
+
+        conn = self.acquire(pin=True)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
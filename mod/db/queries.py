@@ -0,0 +1,305 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from time import perf_counter
+from typing import Any
+from typing import Iterator
+
+from sqlobject import SQLObject
+from sqlobject.dbconnection import DBAPI
+from sqlobject.main import SQLObjectIntegrityError
+from sqlobject.main import SQLObjectNotFound
+
+# Placeholder of parameter for every paramstyle of DB-API driver
+PLACEHOLDERS = {"qmark": "?",
+                "format": "%s",
+                "pyformat": "%s"}
+# Operators allowed in conditions of prepared query
+OPERATORS = ("=", "<", "<=", ">", ">=")
+
+
+class PreparedQuery:
+    """
+    SELECT of rows of one table which SQL text is made once.
+
+    Notes:
+        SQL text with placeholders is the same for every call, so
+        driver reuses compiled statement (SQLite keeps cache of
+        statements for every connection). Rows are turned into objects
+        of model with ``get``, so cache of rows is used like in
+        ``select``.
+
+    Args:
+        connection: SQLObject connection
+        model: class of table
+        conditions: pairs of name of column and operator, conditions
+                    are joined by AND and take parameters in the same
+                    order
+        order_by: name of column to sort rows
+    """
+
+    def __init__(self,
+                 connection: DBAPI,
+                 model: type[SQLObject],
+                 conditions: tuple[tuple[str, str], ...],
+                 order_by: str = "id") -> None:
+        paramstyle = getattr(connection.module, "paramstyle", "qmark")
+        if paramstyle not in PLACEHOLDERS:
+            raise ValueError(f"Unsupported paramstyle: {paramstyle}")
+        for _, operator in conditions:
+            if operator not in OPERATORS:
+                raise ValueError(f"Unsupported operator: {operator}")
+        marker = PLACEHOLDERS[paramstyle]
+
+        self.connection = connection
+        self.model = model
+        table = model.sqlmeta.table
+        names = [model.sqlmeta.idName] + [column.dbName for column
+                                          in model.sqlmeta.columnList]
+        columns = ", ".join(f"{table}.{name}" for name in names)
+        where = " AND ".join(f"{self._column(name)} {operator} {marker}"
+                             for name, operator in conditions)
+        self.sql = (f"SELECT {columns} FROM {table}"
+                    f" WHERE {where} ORDER BY {self._column(order_by)}")
+        self.sql_page = f"{self.sql} LIMIT {marker} OFFSET {marker}"
+        self.sql_count = f"SELECT COUNT(*) FROM {table} WHERE {where}"
+
+    def _column(self,
+                name: str) -> str:
+        """
+        Gives out name of column in database.
+
+        Args:
+            name: name of attribute of model or ``id``
+
+        Returns:
+            name of column
+        """
+
+        if name == "id":
+            return self.model.sqlmeta.idName
+        return self.model.sqlmeta.columns[name].dbName
+
+    def _execute(self,
+                 sql: str,
+                 params: tuple[Any, ...]) -> list[tuple[Any, ...]]:
+        """
+        Executes query with parameters on connection taken from pool.
+
+        Args:
+            sql: SQL text with placeholders
+            params: values of parameters
+
+        Returns:
+            list of rows
+        """
+
+        metrics = getattr(self.connection, "_query_metrics", None)
+
+        def query(conn: Any) -> list[tuple[Any, ...]]:
+            cursor = conn.cursor()
+            start = perf_counter()
+            try:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+                if metrics is not None:
+                    metrics.add_query(sql, perf_counter() - start)
+
+        return self.connection._runWithConnection(query)
+
+    def _decode(self,
+                rows: list[tuple[Any, ...]]) -> list[SQLObject]:
+        """
+        Turns rows into objects of model.
+
+        Args:
+            rows: rows where first value is id
+
+        Returns:
+            list of objects
+        """
+
+        return [self.model.get(row[0],
+                               connection=self.connection,
+                               selectResults=row[1:])
+                for row in rows]
+
+    def fetch_all(self,
+                  *params: Any) -> list[SQLObject]:
+        """
+        Gives out all rows which match conditions.
+
+        Args:
+            *params: values of conditions
+
+        Returns:
+            list of objects
+        """
+
+        return self._decode(self._execute(self.sql, params))
+
+    def page(self,
+             *params: Any,
+             limit: int,
+             offset: int = 0) -> list[SQLObject]:
+        """
+        Gives out part of rows which match conditions.
+
+        Args:
+            *params: values of conditions
+            limit: maximum quantity of rows
+            offset: quantity of skipped rows
+
+        Returns:
+            list of objects
+        """
+
+        return self._decode(self._execute(self.sql_page,
+                                          params + (limit, offset)))
+
+    def one(self,
+            *params: Any) -> SQLObject:
+        """
+        Gives out the only row which matches conditions.
+
+        Args:
+            *params: values of conditions
+
+        Returns:
+            object of model
+
+        Raises:
+            SQLObjectNotFound: occurs when there is no such row
+            SQLObjectIntegrityError: occurs when there are many rows
+        """
+
+        rows = self._execute(self.sql_page, params + (2, 0))
+        if not rows:
+            raise SQLObjectNotFound(f"No results matched the query"
+                                    f" for {self.model.__name__}")
+        if len(rows) > 1:
+            raise SQLObjectIntegrityError(f"More than one result returned"
+                                          f" from query for"
+                                          f" {self.model.__name__}")
+        return self._decode(rows)[0]
+
+    def count(self,
+              *params: Any) -> int:
+        """
+        Gives out quantity of rows which match conditions.
+
+        Args:
+            *params: values of conditions
+
+        Returns:
+            quantity of rows
+        """
+
+        return self._execute(self.sql_count, params)[0][0]
+
+    def results(self,
+                *params: Any) -> "PreparedResults":
+        """
+        Binds values of conditions to query.
+
+        Args:
+            *params: values of conditions
+
+        Returns:
+            (PreparedResults): behaves like SelectResults
+        """
+
+        return PreparedResults(self, params)
+
+
+class PreparedResults:
+    """
+    Result of prepared query with bound parameters.
+
+    Notes:
+        Supports ``count``, iteration and slice like SelectResults,
+        every call executes query.
+
+    Args:
+        query: prepared query
+        params: values of conditions
+    """
+
+    def __init__(self,
+                 query: PreparedQuery,
+                 params: tuple[Any, ...]) -> None:
+        self.query = query
+        self.params = params
+
+    def count(self) -> int:
+        """
+        Gives out quantity of rows.
+
+        Returns:
+            quantity of rows
+        """
+
+        return self.query.count(*self.params)
+
+    def __iter__(self) -> Iterator[SQLObject]:
+        """
+        Iterates over all rows.
+        """
+
+        return iter(self.query.fetch_all(*self.params))
+
+    def __getitem__(self,
+                    key: int | slice) -> Any:
+        """
+        Gives out row by number or list of rows by slice.
+
+        Args:
+            key: number of row or slice without step
+
+        Returns:
+            object or list of objects
+
+        Raises:
+            IndexError: occurs when there is no row with number
+            ValueError: occurs when slice has step or negative index
+        """
+
+        if isinstance(key, int):
+            items = self[key:key + 1] if key >= 0 else []
+            if not items:
+                raise IndexError("Prepared results index out of range")
+            return items[0]
+
+        if key.step is not None:
+            raise ValueError("Step of slice is not supported")
+        start = 0 if key.start is None else key.start
+        if start < 0 or (key.stop is not None and key.stop < 0):
+            raise ValueError("Negative index is not supported")
+
+        if key.stop is None:
+            return self.query.fetch_all(*self.params)[start:]
+        if key.stop <= start:
+            return []
+        return self.query.page(*self.params,
+                               limit=key.stop - start,
+                               offset=start)
@@ -0,0 +1,378 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+from bisect import bisect_left
+from collections import OrderedDict
+import threading
+from typing import Any
+from typing import Optional
+
+from sqlobject.dbconnection import DBAPI
+
+# Estimated size in bytes of message without text and files
+ENTRY_OVERHEAD = 256
+
+
+def _entry_size(item: dict[str, Any]) -> int:
+    """
+    Estimates memory used by message.
+    """
+
+    return ENTRY_OVERHEAD + sum(len(value) for value in item.values()
+                                if isinstance(value, (str, bytes)))
+
+
+def _is_since(item: dict[str, Any],
+              time: int) -> bool:
+    """
+    Checks that message is created since time.
+    """
+
+    value = item.get("time")
+    return value is not None and value >= time
+
+
+class FlowBuffer:
+    """
+    Last messages of one flow sorted by id.
+
+    Notes:
+        ``floor`` is maximum time of messages of flow which are not
+        in buffer, None if buffer contains all messages of flow which
+        have time.
+    """
+
+    __slots__ = ("ids",
+                 "items",
+                 "floor",
+                 "size")
+
+    def __init__(self,
+                 rows: list[tuple[int, dict[str, Any]]],
+                 floor: Optional[int]) -> None:
+        self.ids = [id_ for id_, _ in rows]
+        self.items = [item for _, item in rows]
+        self.floor = floor
+        self.size = sum(_entry_size(item) for item in self.items)
+
+    def has_since(self,
+                  time: int) -> bool:
+        """
+        Checks that buffer has all messages of flow since time.
+        """
+
+        return self.floor is None or self.floor < time
+
+    def add(self,
+            id_: int,
+            item: dict[str, Any],
+            limit: int) -> None:
+        """
+        Puts message in buffer and removes the oldest messages.
+
+        Args:
+            id_: id of message
+            item: columns of message
+            limit: maximum quantity of messages in buffer
+        """
+
+        position = bisect_left(self.ids, id_)
+        if position < len(self.ids) and self.ids[position] == id_:
+            self.size -= _entry_size(self.items[position])
+            self.items[position] = item
+        else:
+            self.ids.insert(position, id_)
+            self.items.insert(position, item)
+        self.size += _entry_size(item)
+
+        while len(self.ids) > limit:
+            del self.ids[0]
+            removed = self.items.pop(0)
+            self.size -= _entry_size(removed)
+            time_ = removed.get("time")
+            if time_ is not None:
+                self.floor = time_ if self.floor is None else max(self.floor,
+                                                                  time_)
+
+    def replace(self,
+                uuid: str,
+                item: dict[str, Any]) -> bool:
+        """
+        Replaces message with the same uuid.
+
+        Returns:
+            True if message was found
+        """
+
+        for position, current in enumerate(self.items):
+            if current["uuid"] == uuid:
+                self.size += _entry_size(item) - _entry_size(current)
+                self.items[position] = item
+                return True
+        return False
+
+
+class RecentMessages:
+    """
+    LRU cache of last messages of recently active flows.
+
+    Notes:
+        Every flow keeps up to ``per_flow`` last messages as dict of
+        columns. Request of messages since time is served from buffer
+        only when buffer has all messages of flow since this time.
+
+        When estimated size of all buffers is more than ``max_bytes``,
+        buffers of flows which were not used for the longest time are
+        removed.
+
+        Buffer is read from database between ``begin_load`` and
+        ``end_load``, if flow is changed meanwhile then buffer is not
+        put in cache, because it can miss the change.
+
+    Args:
+        per_flow: maximum quantity of messages in buffer of one flow
+        max_bytes: maximum estimated size of all buffers
+    """
+
+    def __init__(self,
+                 per_flow: int = 100,
+                 max_bytes: int = 16777216) -> None:
+        if per_flow < 1:
+            raise ValueError("Size of buffer must be >= 1")
+        if max_bytes < 1:
+            raise ValueError("Size of cache must be >= 1")
+
+        self.per_flow = per_flow
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = 0
+        self._flows: OrderedDict[str, FlowBuffer] = OrderedDict()
+        # Flows which are read from database: quantity of readers
+        # and quantity of changes
+        self._loading: dict[str, tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def attach(cls,
+               connection: DBAPI,
+               per_flow: int = 100,
+               max_bytes: int = 16777216) -> "RecentMessages":
+        """
+        Gives out cache of connection, creates it if there is no cache.
+
+        Notes:
+            SQLObject caches connection for every URI, so all DBHandler
+            objects with the same URI share one cache.
+
+        Args:
+            connection: SQLObject connection
+            per_flow: maximum quantity of messages in buffer of one flow
+            max_bytes: maximum estimated size of all buffers
+
+        Returns:
+            cache of connection
+        """
+
+        cache = getattr(connection, "_recent_messages", None)
+        if cache is None:
+            cache = cls(per_flow, max_bytes)
+            connection._recent_messages = cache
+        return cache
+
+    def _evict(self) -> None:
+        """
+        Removes least recently used buffers while cache is too big.
+
+        Notes:
+            Must be called when lock is acquired.
+        """
+
+        while self._flows and self._size > self.max_bytes:
+            _, buffer = self._flows.popitem(last=False)
+            self._size -= buffer.size
+            self.evictions += 1
+
+    def get(self,
+            flow_uuid: str,
+            time: int) -> Optional[list[dict[str, Any]]]:
+        """
+        Gives out messages of flow since time.
+
+        Notes:
+            Returned dicts are shared with cache and must not be
+            changed.
+
+        Args:
+            flow_uuid: unique identify number from flow
+            time: Unix-like time
+
+        Returns:
+            list of messages sorted by id or None if buffer of flow is
+            absent or has not all messages since time
+        """
+
+        with self._lock:
+            buffer = self._flows.get(flow_uuid)
+            if buffer is None or not buffer.has_since(time):
+                self.misses += 1
+                return None
+            self._flows.move_to_end(flow_uuid)
+            self.hits += 1
+            return [item for item in buffer.items
+                    if _is_since(item, time)]
+
+    def _touch(self,
+               flow_uuid: Optional[str] = None) -> None:
+        """
+        Marks flow (or all flows) which is read from database as changed.
+
+        Notes:
+            Must be called when lock is acquired.
+        """
+
+        for name in ([flow_uuid] if flow_uuid is not None
+                     else list(self._loading)):
+            if name in self._loading:
+                readers, changes = self._loading[name]
+                self._loading[name] = (readers, changes + 1)
+
+    def begin_load(self,
+                   flow_uuid: str) -> int:
+        """
+        Registers reading of buffer of flow from database.
+
+        Args:
+            flow_uuid: unique identify number from flow
+
+        Returns:
+            version which is passed to ``end_load``
+        """
+
+        with self._lock:
+            readers, changes = self._loading.get(flow_uuid, (0, 0))
+            self._loading[flow_uuid] = (readers + 1, changes)
+            return changes
+
+    def end_load(self,
+                 flow_uuid: str,
+                 version: int,
+                 loaded: Optional[tuple[list[tuple[int, dict[str, Any]]],
+                                        Optional[int]]]) -> None:
+        """
+        Puts buffer of flow read from database.
+
+        Args:
+            flow_uuid: unique identify number from flow
+            version: value returned by ``begin_load``
+            loaded: pairs of id and columns of last messages sorted by
+                    id and maximum time of messages of flow which are
+                    not in them, None if reading failed
+        """
+
+        with self._lock:
+            readers, changes = self._loading.pop(flow_uuid)
+            if readers > 1:
+                self._loading[flow_uuid] = (readers - 1, changes)
+            if loaded is None or changes != version:
+                return
+            if flow_uuid in self._flows:
+                return
+            rows, floor = loaded
+            buffer = FlowBuffer(rows[-self.per_flow:], floor)
+            self._flows[flow_uuid] = buffer
+            self._size += buffer.size
+            self._evict()
+
+    def add(self,
+            flow_uuid: str,
+            id_: int,
+            item: dict[str, Any]) -> None:
+        """
+        Adds new message to buffer of flow if flow is in cache.
+
+        Args:
+            flow_uuid: unique identify number from flow
+            id_: id of message
+            item: columns of message
+        """
+
+        with self._lock:
+            self._touch(flow_uuid)
+            buffer = self._flows.get(flow_uuid)
+            if buffer is None:
+                return
+            self._size -= buffer.size
+            buffer.add(id_, item, self.per_flow)
+            self._size += buffer.size
+            self._flows.move_to_end(flow_uuid)
+            self._evict()
+
+    def update(self,
+               flow_uuid: str,
+               item: dict[str, Any]) -> None:
+        """
+        Replaces changed message in buffer of flow.
+
+        Args:
+            flow_uuid: unique identify number from flow
+            item: columns of message with its uuid
+        """
+
+        with self._lock:
+            self._touch(flow_uuid)
+            buffer = self._flows.get(flow_uuid)
+            if buffer is None:
+                return
+            self._size -= buffer.size
+            buffer.replace(item["uuid"], item)
+            self._size += buffer.size
+            self._evict()
+
+    def clear(self) -> None:
+        """
+        Removes all buffers.
+        """
+
+        with self._lock:
+            self._touch()
+            self._flows.clear()
+            self._size = 0
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Gives out counters of cache.
+
+        Returns:
+            dict with quantity of flows, messages, estimated size in
+            bytes, hits, misses and evictions
+        """
+
+        with self._lock:
+            return {"flows": len(self._flows),
+                    "messages": sum(len(item.ids) for item
+                                    in self._flows.values()),
+                    "bytes": self._size,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions}
@@ -0,0 +1,131 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+from typing import Any
+from typing import Union
+
+from sqlobject.dbconnection import DBAPI
+
+# PRAGMA statements which can be set in tuning profile. Order is
+# important: busy_timeout is set before changing of journal mode,
+# which needs exclusive lock of database file, auto_vacuum is set
+# before any table is created.
+SQLITE_PRAGMAS = ("busy_timeout",
+                  "auto_vacuum",
+                  "journal_mode",
+                  "synchronous",
+                  "cache_size",
+                  "mmap_size",
+                  "temp_store")
+
+
+def pragma_statements(pragmas: dict[str, Union[int, str]]) -> list[str]:
+    """
+    Makes PRAGMA statements from tuning profile.
+
+    Args:
+        pragmas: dict where key is name of PRAGMA and value is number
+                 or keyword like ``WAL``
+
+    Returns:
+        list of SQL statements
+
+    Raises:
+        ValueError: occurs when PRAGMA is not supported or value is
+                    not a number or keyword
+    """
+
+    unknown = set(pragmas) - set(SQLITE_PRAGMAS)
+    if unknown:
+        raise ValueError(f"Unsupported PRAGMA: {', '.join(sorted(unknown))}")
+
+    statements = []
+    for name in SQLITE_PRAGMAS:
+        value = pragmas.get(name)
+        if value is None:
+            continue
+        if isinstance(value, str) and not value.isalnum():
+            raise ValueError(f"Wrong value of PRAGMA {name}: {value}")
+        statements.append(f"PRAGMA {name} = {value}")
+    return statements
+
+
+def apply_pragmas(conn: Any,
+                  statements: list[str]) -> None:
+    """
+    Executes PRAGMA statements on raw SQLite connection.
+
+    Args:
+        conn: connection of sqlite3 module
+        statements: list of SQL statements
+    """
+
+    cursor = conn.cursor()
+    try:
+        for statement in statements:
+            cursor.execute(statement)
+    finally:
+        cursor.close()
+
+
+def tune_sqlite(connection: DBAPI,
+                pragmas: dict[str, Union[int, str]]) -> bool:
+    """
+    Applies tuning profile to every new connection to SQLite database.
+
+    Notes:
+        ``makeConnection`` of SQLObject connection is replaced, so
+        profile is applied to every connection opened later. Connection
+        to in-memory database is opened once and tuned at once.
+
+        Other databases are not changed.
+
+    Args:
+        connection: SQLObject connection
+        pragmas: dict where key is name of PRAGMA and value is number
+                 or keyword like ``WAL``
+
+    Returns:
+        True if profile is applied or False if database is not SQLite
+    """
+
+    if connection.dbName != "sqlite":
+        return False
+
+    statements = pragma_statements(pragmas)
+    wrapped = getattr(connection, "_pragma_statements", None) is not None
+    connection._pragma_statements = statements
+
+    if getattr(connection, "_memory", False):
+        apply_pragmas(connection._memoryConn, statements)
+        return True
+
+    if not wrapped:
+        make_connection = connection.makeConnection
+
+        def make_tuned_connection() -> Any:
+            conn = make_connection()
+            apply_pragmas(conn, connection._pragma_statements)
+            return conn
+
+        connection.makeConnection = make_tuned_connection
+    return True
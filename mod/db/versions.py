@@ -0,0 +1,109 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+from itertools import count
+import threading
+
+from sqlobject.dbconnection import DBAPI
+
+# Versions are unique in process, so version of one database never
+# matches version of another database
+_SEQUENCE = count(1)
+
+# Name of version changed by every change of flows or their members
+FLOWS = "flows"
+# Name of version changed by every change of users
+USERS = "users"
+# Name of version changed by every change of messages
+MESSAGES = "messages"
+# Groups whose time of last change is saved in database
+GROUPS = (FLOWS,
+          USERS,
+          MESSAGES)
+
+
+class DataVersions:
+    """
+    Versions of groups of data like list of flows.
+
+    Notes:
+        Version is changed by every change of data in group, so data
+        built from the same version is the same. Versions are not
+        saved in database, they are new after restart of server.
+    """
+
+    def __init__(self) -> None:
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def attach(cls,
+               connection: DBAPI) -> "DataVersions":
+        """
+        Gives out versions of connection, creates them if they are absent.
+
+        Notes:
+            SQLObject caches connection for every URI, so all DBHandler
+            objects with the same URI share versions.
+
+        Args:
+            connection: SQLObject connection
+
+        Returns:
+            versions of connection
+        """
+
+        versions = getattr(connection, "_data_versions", None)
+        if versions is None:
+            versions = cls()
+            connection._data_versions = versions
+        return versions
+
+    def get(self,
+            name: str) -> int:
+        """
+        Gives out current version of group.
+
+        Args:
+            name: name of group like ``flows``
+
+        Returns:
+            version
+        """
+
+        with self._lock:
+            if name not in self._versions:
+                self._versions[name] = next(_SEQUENCE)
+            return self._versions[name]
+
+    def bump(self,
+             *names: str) -> None:
+        """
+        Changes versions of groups, all groups if names are not given.
+
+        Args:
+            *names: names of groups
+        """
+
+        with self._lock:
+            for name in names or list(self._versions):
+                self._versions[name] = next(_SEQUENCE)
@@ -0,0 +1,259 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+from concurrent.futures import Future
+import queue
+import threading
+from time import monotonic
+from typing import Any
+from typing import Callable
+from typing import Optional
+
+from loguru import logger
+
+# Item which stops writer thread
+_STOP = object()
+
+
+class GroupWriter:
+    """
+    Dedicated thread which commits writes in groups.
+
+    Notes:
+        Writes which arrive within ``window`` milliseconds after first
+        of them (but no more than ``batch_size``) are passed to
+        ``commit`` together, so they are saved in one transaction.
+
+        ``commit`` receives list of items and returns list of results
+        in the same order, result is exception if item was not saved.
+        If ``commit`` raises exception, all items of group failed.
+
+        Future of every item is resolved after ``commit`` returned,
+        i.e. after transaction is committed. Commit is kept after
+        crash of operating system or power failure only when SQLite
+        syncs every commit (``synchronous = FULL``), with ``NORMAL``
+        in WAL mode the last commits can be lost.
+
+        Item is accepted only while writer is running, ``stop`` and
+        ``submit`` hold the same lock, so every accepted item is put
+        in queue before stop marker and is saved.
+
+    Args:
+        commit: function which saves group of items in one transaction
+        window: time in milliseconds to wait for more items
+        batch_size: maximum quantity of items in one group
+        name: name of writer thread
+        prepare: function called in writer thread before first commit
+    """
+
+    def __init__(self,
+                 commit: Callable[[list[Any]], list[Any]],
+                 window: float = 2,
+                 batch_size: int = 100,
+                 name: str = "group-writer",
+                 prepare: Optional[Callable[[], None]] = None) -> None:
+        if batch_size < 1:
+            raise ValueError("Batch size must be >= 1")
+
+        self.commit = commit
+        self.window = window / 1000
+        self.batch_size = batch_size
+        self.name = name
+        self.prepare = prepare
+        self.batches = 0
+        self.items = 0
+        self.max_batch = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        """
+        Shows is writer thread started.
+
+        Returns:
+            True or False
+        """
+
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """
+        Starts writer thread.
+        """
+
+        with self._lock:
+            if self.running:
+                return
+
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run,
+                                            name=self.name,
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self,
+             timeout: Optional[float] = None) -> None:
+        """
+        Saves items which are waiting in queue and stops writer thread.
+
+        Args:
+            timeout: time in seconds to wait for writer thread
+        """
+
+        with self._lock:
+            if not self.running or self._stopping:
+                return
+            self._stopping = True
+            self._queue.put(_STOP)
+            thread = self._thread
+
+        thread.join(timeout)
+        with self._lock:
+            if self._thread is thread:
+                self._thread = None
+
+    def submit(self,
+               item: Any) -> Future:
+        """
+        Puts item in queue of writer.
+
+        Args:
+            item: data passed to ``commit``
+
+        Returns:
+            future which resolves with result of ``commit`` for item
+
+        Raises:
+            RuntimeError: occurs when writer thread is not started or
+                          is stopped
+        """
+
+        with self._lock:
+            if not self.running or self._stopping:
+                raise RuntimeError("Writer is not started")
+
+            future: Future = Future()
+            self._queue.put((item, future))
+            return future
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Gives out quantity of groups and items saved by writer.
+
+        Returns:
+            dict with quantity of groups, items, maximum and average
+            size of group
+        """
+
+        average = self.items / self.batches if self.batches else 0.0
+        return {"batches": self.batches,
+                "items": self.items,
+                "max_batch": self.max_batch,
+                "average_batch": average}
+
+    def _collect(self,
+                 first: Any) -> tuple[list[Any], bool]:
+        """
+        Collects group of items arrived within window.
+
+        Args:
+            first: first item of group
+
+        Returns:
+            group of items and flag that writer must be stopped
+        """
+
+        batch = [first]
+        deadline = monotonic() + self.window
+
+        while len(batch) < self.batch_size:
+            timeout = deadline - monotonic()
+            try:
+                if timeout > 0:
+                    item = self._queue.get(timeout=timeout)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _write(self,
+               batch: list[Any]) -> None:
+        """
+        Commits group of items and resolves their futures.
+
+        Args:
+            batch: list of pairs item and future
+        """
+
+        items = [item for item, _ in batch]
+        try:
+            results = self.commit(items)
+        except Exception as ERROR:
+            logger.exception(f"Group of {len(items)} writes failed: {ERROR}")
+            results = [ERROR] * len(items)
+
+        self.batches += 1
+        self.items += len(items)
+        self.max_batch = max(self.max_batch, len(items))
+
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _run(self) -> None:
+        """
+        Loop of writer thread.
+        """
+
+        if self.prepare is not None:
+            self.prepare()
+
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch, stop = self._collect(first)
+            self._write(batch)
+
+        # Save items which were put in queue before stop
+        rest = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                rest.append(item)
+        for start in range(0, len(rest), self.batch_size):
+            self._write(rest[start:start + self.batch_size])
@@ -19,10 +19,30 @@ You should have received a copy of the GNU Lesser General Public License
 along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
 """
 
+from concurrent.futures import ProcessPoolExecutor
 from hashlib import blake2b
+from hashlib import scrypt
+from hashlib import sha256
+from heapq import heappop
+from heapq import heappush
+import hmac
 from hmac import compare_digest
+import multiprocessing
 from os import urandom
 import sys
+import threading
+from time import perf_counter
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import NamedTuple
+from typing import Optional
+
+# Functions which make password hash
+KDF_BLAKE2B = "blake2b"
+KDF_SCRYPT = "scrypt"
+# Memory in bytes allowed for scrypt above memory of its parameters
+SCRYPT_SPARE_MEMORY = 1048576
 
 
 class Hash:
@@ -41,6 +61,11 @@ class Hash:
         hash_password: password hash (previously calculated).
         size_password: size of output password in bytes, default 32.
         size_auth_id: size of output auth_id in bytes, default 16.
+        kdf: function which makes password hash, ``blake2b`` or
+             ``scrypt``
+        scrypt_n: CPU/memory cost of scrypt, power of 2
+        scrypt_r: block size of scrypt
+        scrypt_p: parallelization of scrypt
     """
 
     def __init__(self,
@@ -50,7 +75,13 @@ class Hash:
                  key: bytes = None,
                  hash_password: str = None,
                  size_password: int = 32,
-                 size_auth_id: int = 16) -> None:
+                 size_auth_id: int = 16,
+                 kdf: str = KDF_BLAKE2B,
+                 scrypt_n: int = 16384,
+                 scrypt_r: int = 8,
+                 scrypt_p: int = 1) -> None:
+        if kdf not in (KDF_BLAKE2B, KDF_SCRYPT):
+            raise ValueError(f"Unsupported KDF: {kdf}")
 
         if salt is None:
             self.salt = urandom(16)
@@ -71,6 +102,10 @@ class Hash:
         self.hash_password = hash_password
         self.size_password = size_password
         self.size_auth_id = size_auth_id
+        self.kdf = kdf
+        self.scrypt_n = scrypt_n
+        self.scrypt_r = scrypt_r
+        self.scrypt_p = scrypt_p
 
     @property
     def get_salt(self) -> bytes:
@@ -94,14 +129,54 @@ class Hash:
 
         return self.key
 
+    def _scrypt(self,
+                n: int,
+                r: int,
+                p: int,
+                size: int) -> str:
+        """
+        Generates scrypt hash of password.
+
+        Notes:
+            Salt and key of user both are used as salt.
+
+        Args:
+            n: CPU/memory cost
+            r: block size
+            p: parallelization
+            size: size of hash in bytes
+
+        Returns:
+            hash in format ``scrypt$n$r$p$hex``
+        """
+
+        result = scrypt(self.binary_password,
+                        salt=self.salt + self.key,
+                        n=n,
+                        r=r,
+                        p=p,
+                        maxmem=128 * r * (n + p + 2) + SCRYPT_SPARE_MEMORY,
+                        dklen=size)
+        return f"{KDF_SCRYPT}${n}${r}${p}${result.hex()}"
+
     def password_hash(self) -> str:
         """
         Generates a password hash.
 
+        Notes:
+            Hash made by scrypt contains its parameters, so it is
+            checked after parameters are changed.
+
         Returns:
-            hash password: returns blake2b hash
+            hash password: returns blake2b or scrypt hash
         """
 
+        if self.kdf == KDF_SCRYPT:
+            return self._scrypt(self.scrypt_n,
+                                self.scrypt_r,
+                                self.scrypt_p,
+                                self.size_password)
+
         hash_password = blake2b(self.binary_password,
                                 digest_size=self.size_password,
                                 key=self.key,
@@ -112,17 +187,59 @@ class Hash:
         """
         Comparison of calculated hash and original password.
 
+        Notes:
+            Function and parameters are taken from original hash.
+
         Returns:
             True or False
         """
 
         if self.hash_password is None:
             return False
+        elif str(self.hash_password).startswith(f"{KDF_SCRYPT}$"):
+            try:
+                _, n, r, p, digest = self.hash_password.split("$")
+                verified_hash_password = self._scrypt(int(n),
+                                                      int(r),
+                                                      int(p),
+                                                      len(digest) // 2)
+            except ValueError:
+                return False
+            return compare_digest(self.hash_password,
+                                  verified_hash_password)
         else:
-            verified_hash_password = self.password_hash()
+            verified_hash_password = blake2b(self.binary_password,
+                                             digest_size=self.size_password,
+                                             key=self.key,
+                                             salt=self.salt).hexdigest()
             return compare_digest(self.hash_password,
                                   verified_hash_password)
 
+    def needs_rehash(self) -> bool:
+        """
+        Checks that original hash is made with other function or size.
+
+        Notes:
+            Hash made by scrypt also needs rehash when it is made with
+            other parameters.
+
+        Returns:
+            True if password hash must be generated again
+        """
+
+        if self.hash_password is None:
+            return True
+        parts = self.hash_password.split("$")
+        if self.kdf == KDF_BLAKE2B:
+            return len(parts) != 1
+        params = [KDF_SCRYPT,
+                  str(self.scrypt_n),
+                  str(self.scrypt_r),
+                  str(self.scrypt_p)]
+        if parts[:-1] != params:
+            return True
+        return len(parts[-1]) != self.size_password * 2
+
     def auth_id(self) -> str:
         """
         Generating authenticator token for client session connection to server.
@@ -137,3 +254,390 @@ class Hash:
                          digest_size=self.size_auth_id,
                          salt=self.salt)
         return result.hexdigest()
+
+
+class TokenClaims(NamedTuple):
+    """
+    Content of signed authentication token.
+    """
+
+    uuid: str
+    issued: int
+    expires: int
+    signature: str
+
+
+class TokenSigner:
+    """
+    Issues and checks signed authentication tokens.
+
+    Notes:
+        Token is ``uuid.issued.expires.nonce.key_id.signature`` where
+        signature is HMAC-SHA256 of other parts, so token is checked
+        without reading of database. Random nonce makes every token
+        unique.
+
+        The first key signs new tokens, other keys only check tokens
+        signed before keys were rotated. If there are no keys, random
+        key is made and tokens become invalid after restart.
+
+    Args:
+        keys: secret keys
+        ttl: lifetime of token in seconds
+    """
+
+    def __init__(self,
+                 keys: Iterable[str | bytes] = (),
+                 ttl: int = 86400) -> None:
+        if ttl <= 0:
+            raise ValueError("Lifetime of token must be > 0")
+
+        secrets = [key.encode("utf-8") if isinstance(key, str) else key
+                   for key in keys] or [urandom(32)]
+        self._keys = {self.key_id(key): key for key in secrets}
+        self._active = self.key_id(secrets[0])
+        self.ttl = ttl
+
+    @staticmethod
+    def key_id(key: bytes) -> str:
+        """
+        Gives out short public name of key.
+
+        Args:
+            key: secret key
+
+        Returns:
+            first 8 hex digits of SHA-256 of key
+        """
+
+        return sha256(key).hexdigest()[:8]
+
+    @staticmethod
+    def is_signed(token: str) -> bool:
+        """
+        Checks that token has format of signed token.
+
+        Notes:
+            Tokens made by ``Hash.auth_id`` are not signed, they are
+            checked against database.
+
+        Args:
+            token: authentication token
+
+        Returns:
+            True or False
+        """
+
+        return token.count(".") == 5
+
+    def _sign(self,
+              key_id: str,
+              payload: str) -> str:
+        """
+        Makes signature of payload.
+
+        Args:
+            key_id: name of key
+            payload: signed part of token
+
+        Returns:
+            signature in hex format
+        """
+
+        return hmac.new(self._keys[key_id],
+                        payload.encode("utf-8"),
+                        sha256).hexdigest()
+
+    def issue(self,
+              uuid: str,
+              now: int) -> tuple[str, int]:
+        """
+        Makes new token for user.
+
+        Args:
+            uuid: unique user identity number
+            now: Unix-like time of issue
+
+        Returns:
+            token and Unix-like time when it expires
+        """
+
+        expires = now + self.ttl
+        payload = (f"{uuid}.{now:d}.{expires:d}.{urandom(8).hex()}"
+                   f".{self._active}")
+        return f"{payload}.{self._sign(self._active, payload)}", expires
+
+    def verify(self,
+               token: str) -> Optional[TokenClaims]:
+        """
+        Checks signature of token.
+
+        Notes:
+            Expiry and revocation are not checked.
+
+        Args:
+            token: authentication token
+
+        Returns:
+            content of token or None if token is not signed by
+            one of keys
+        """
+
+        parts = token.split(".")
+        if len(parts) != 6 or parts[4] not in self._keys:
+            return None
+        payload, _, signature = token.rpartition(".")
+        if not compare_digest(signature,
+                              self._sign(parts[4], payload)):
+            return None
+        try:
+            issued = int(parts[1])
+            expires = int(parts[2])
+        except ValueError:
+            return None
+        return TokenClaims(parts[0],
+                           issued,
+                           expires,
+                           signature)
+
+
+class RevocationList:
+    """
+    Revoked tokens held in memory.
+
+    Notes:
+        Token is revoked by its signature. All tokens of user are
+        revoked by time, tokens issued at this time or earlier are
+        rejected. Entry is removed when tokens revoked by it are
+        expired, so list does not grow endlessly. List is not saved,
+        it is empty after restart of server.
+    """
+
+    def __init__(self) -> None:
+        self._tokens: dict[str, int] = {}
+        self._users: dict[str, tuple[int, int]] = {}
+        # Heap of expiry time, kind of entry and its key
+        self._expiry: list[tuple[int, str, str]] = []
+        self._lock = threading.Lock()
+
+    def revoke(self,
+               claims: TokenClaims,
+               now: int) -> None:
+        """
+        Revokes one token.
+
+        Args:
+            claims: content of token
+            now: Unix-like time
+        """
+
+        with self._lock:
+            self._prune(now)
+            if claims.expires > now:
+                self._tokens[claims.signature] = claims.expires
+                heappush(self._expiry,
+                         (claims.expires, "token", claims.signature))
+
+    def revoke_user(self,
+                    uuid: str,
+                    before: int,
+                    expires: int) -> None:
+        """
+        Revokes all tokens of user issued before time.
+
+        Args:
+            uuid: unique user identity number
+            before: Unix-like time, tokens issued at it or earlier
+                    are revoked
+            expires: Unix-like time when all revoked tokens expire
+        """
+
+        with self._lock:
+            self._prune(before)
+            self._users[uuid] = (before, expires)
+            heappush(self._expiry,
+                     (expires, "user", uuid))
+
+    def is_revoked(self,
+                   claims: TokenClaims) -> bool:
+        """
+        Checks that token is revoked.
+
+        Args:
+            claims: content of token
+
+        Returns:
+            True or False
+        """
+
+        with self._lock:
+            if claims.signature in self._tokens:
+                return True
+            revoked = self._users.get(claims.uuid)
+            return revoked is not None and claims.issued <= revoked[0]
+
+    def _prune(self,
+               now: int) -> None:
+        """
+        Removes entries which revoke only expired tokens.
+
+        Args:
+            now: Unix-like time
+        """
+
+        while self._expiry and self._expiry[0][0] <= now:
+            expires, kind, key = heappop(self._expiry)
+            if kind == "token":
+                self._tokens.pop(key, None)
+            elif self._users.get(key, (0, None))[1] == expires:
+                del self._users[key]
+
+    def clear(self) -> None:
+        """
+        Removes all entries.
+        """
+
+        with self._lock:
+            self._tokens.clear()
+            self._users.clear()
+            self._expiry.clear()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Gives out size of list.
+
+        Returns:
+            dict with quantity of revoked tokens and users
+        """
+
+        with self._lock:
+            return {"tokens": len(self._tokens),
+                    "users": len(self._users)}
+
+
+class KdfPool:
+    """
+    Processes which generate and check password hashes.
+
+    Notes:
+        Hash is computed in thread which calls pool until ``start``
+        is called with quantity of processes > 0. Processes are
+        spawned, so they do not copy locks of threads of server.
+    """
+
+    def __init__(self) -> None:
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def start(self,
+              processes: int) -> None:
+        """
+        Starts processes, old processes are stopped.
+
+        Args:
+            processes: quantity of processes, 0 - compute hash in
+                       thread which calls pool
+        """
+
+        self.close()
+        if processes > 0:
+            context = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(processes,
+                                                 mp_context=context)
+
+    def close(self) -> None:
+        """
+        Stops processes after current work is finished.
+        """
+
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _run(self,
+             func: Callable[[], Any]) -> Any:
+        """
+        Calls method of Hash in process of pool.
+
+        Args:
+            func: bound method of Hash
+
+        Returns:
+            result of method
+        """
+
+        with self._lock:
+            self.calls += 1
+        executor = self._executor
+        if executor is None:
+            return func()
+        return executor.submit(func).result()
+
+    def password_hash(self,
+                      generator: Hash) -> str:
+        """
+        Generates a password hash.
+
+        Args:
+            generator: object with password and parameters of hash
+
+        Returns:
+            hash password
+        """
+
+        return self._run(generator.password_hash)
+
+    def check_password(self,
+                       generator: Hash) -> bool:
+        """
+        Comparison of calculated hash and original password.
+
+        Args:
+            generator: object with password and original hash
+
+        Returns:
+            True or False
+        """
+
+        return self._run(generator.check_password)
+
+
+def calibrate_scrypt(target: float,
+                     scrypt_r: int = 8,
+                     scrypt_p: int = 1,
+                     max_n: int = 1048576) -> list[tuple[int, float]]:
+    """
+    Measures time of scrypt hash for growing cost.
+
+    Notes:
+        Cost is doubled from 1024 until hash takes ``target`` seconds
+        or ``max_n`` is reached.
+
+    Args:
+        target: wanted time of one hash in seconds
+        scrypt_r: block size of scrypt
+        scrypt_p: parallelization of scrypt
+        max_n: maximum CPU/memory cost
+
+    Returns:
+        list of cost and time of one hash in seconds, the last item
+        is the first cost which reaches target
+    """
+
+    results = []
+    n = 1024
+    while n <= max_n:
+        generator = Hash("calibration",
+                         1,
+                         kdf=KDF_SCRYPT,
+                         scrypt_n=n,
+                         scrypt_r=scrypt_r,
+                         scrypt_p=scrypt_p)
+        start = perf_counter()
+        generator.password_hash()
+        results.append((n, perf_counter() - start))
+        if results[-1][1] >= target:
+            break
+        n *= 2
+    return results
@@ -25,6 +25,7 @@ from typing import Optional
 
 from pydantic import BaseModel
 from pydantic import EmailStr
+from pydantic import validator
 
 # Version of MoreliaTalk Protocol
 VERSION = '1.0'
@@ -168,6 +169,48 @@ class MessageRequest(BaseMessage):
     client_id: int
 
 
+class FieldsRequest(BaseModel):
+    """
+    Validation settings for the Fields object.
+    """
+
+    class Config:
+        """
+        Additional configuration for Request.
+        """
+
+        title = 'Names of fields in lists of user and message'
+
+    user: Optional[List[str]] = None
+    message: Optional[List[str]] = None
+
+    @validator("user")
+    def check_user_fields(cls, value):
+        """
+        Checks that names of fields exists in User object.
+        """
+
+        if value is None:
+            return value
+
+        if not set(value) <= BaseUser.__fields__.keys():
+            raise ValueError("unknown field of User object")
+        return value
+
+    @validator("message")
+    def check_message_fields(cls, value):
+        """
+        Checks that names of fields exists in Message object.
+        """
+
+        if value is None:
+            return value
+
+        if not set(value) <= BaseMessage.__fields__.keys():
+            raise ValueError("unknown field of Message object")
+        return value
+
+
 class DataRequest(BaseData):
     """
     Validation settings for the Data object.
@@ -182,6 +225,7 @@ class DataRequest(BaseData):
 
     flow: Optional[List[FlowRequest]] = None
     message: Optional[List[MessageRequest]] = None
+    fields: Optional[FieldsRequest] = None
 
 
 class ErrorsRequest(BaseErrors):
@@ -226,10 +270,27 @@ class Request(BaseValidator):
 
         title = 'MoreliaTalk protocol (for request)'
 
+    jsonapi: Optional[VersionRequest] = None
     data: Optional[DataRequest] = None
     errors: Optional[ErrorsRequest] = None
 
 
+class HelloMetaRequest(BaseModel):
+    """
+    Validation settings for the Meta object of "hello" request.
+    """
+
+    class Config:
+        """
+        Additional configuration for Request.
+        """
+
+        title = 'Codec and optional features requested by client'
+
+    codec: str = "json"
+    features: Optional[List[str]] = None
+
+
 # Description of the response validation scheme
 
 
@@ -337,3 +398,20 @@ class Response(BaseValidator):
 
     data: Optional[DataResponse] = None
     errors: Optional[ErrorsResponse] = None
+
+
+class HelloMetaResponse(BaseModel):
+    """
+    Validation settings for the Meta object of "hello" response.
+    """
+
+    class Config:
+        """
+        Additional configuration for Response.
+        """
+
+        title = 'Negotiated protocol version, codec and features'
+
+    version: str
+    codec: str
+    features: List[str]
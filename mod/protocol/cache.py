@@ -0,0 +1,276 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import Future
+import threading
+from typing import Any
+from typing import Callable
+from typing import Hashable
+from typing import Optional
+
+from mod.protocol import api
+
+# Value of "time" of Data and Errors objects replaced by current time
+# after encoding
+TIME_MARKER = -4611686018427387904
+
+
+class CachedResponse:
+    """
+    Response built once and its encoded forms.
+
+    Notes:
+        Encoded form is split around values of ``time`` of Data and
+        Errors objects, so response with current time is made by
+        joining of strings.
+
+    Args:
+        response: validated response
+    """
+
+    __slots__ = ("response",
+                 "_encoded")
+
+    def __init__(self,
+                 response: api.Response) -> None:
+        self.response = response
+        self._encoded: dict[bool, Optional[tuple[str, ...]]] = {}
+
+    def stamp(self,
+              time: int) -> api.Response:
+        """
+        Gives out copy of response with new time.
+
+        Notes:
+            Lists of response are shared with cache and must not be
+            changed.
+
+        Args:
+            time: Unix-like time of response
+
+        Returns:
+            validated response
+        """
+
+        update = {}
+        for name in ("data", "errors"):
+            value = getattr(self.response, name)
+            if value is not None:
+                update[name] = value.copy(update={"time": time})
+        return self.response.copy(update=update)
+
+    def encode(self,
+               time: int,
+               columnar: bool,
+               encoder: Callable[[api.Response, bool], str]) -> str:
+        """
+        Gives out encoded response with new time.
+
+        Args:
+            time: Unix-like time of response
+            columnar: encode lists in columns
+            encoder: function which encodes response
+
+        Returns:
+            json-object which contains response
+        """
+
+        if columnar not in self._encoded:
+            marked = self.stamp(TIME_MARKER)
+            parts = encoder(marked, columnar).split(str(TIME_MARKER))
+            stamped = (marked.data is not None) + (marked.errors is not None)
+            self._encoded[columnar] = (tuple(parts)
+                                       if len(parts) == stamped + 1
+                                       else None)
+
+        parts = self._encoded[columnar]
+        if parts is None:
+            return encoder(self.stamp(time), columnar)
+        return str(time).join(parts)
+
+
+class SingleFlight:
+    """
+    Shares one call of function among identical concurrent calls.
+
+    Notes:
+        First caller with key (leader) calls function, callers with the
+        same key which come before its end wait and get the same result
+        or exception. Result is not kept after call is finished.
+    """
+
+    def __init__(self) -> None:
+        self.leaders = 0
+        self.shared = 0
+        self._calls: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self,
+           key: Hashable,
+           func: Callable[[], Any]) -> tuple[Any, bool]:
+        """
+        Calls function or waits for the same call in other thread.
+
+        Args:
+            key: identity of call
+            func: function without arguments
+
+        Returns:
+            result of function and True if it was shared with other call
+        """
+
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future = Future()
+                self._calls[key] = future
+                self.leaders += 1
+                leader = True
+            else:
+                self.shared += 1
+                leader = False
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = func()
+        except BaseException as ERROR:
+            self._finish(key)
+            future.set_exception(ERROR)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result, False
+
+    def _finish(self,
+                key: Hashable) -> None:
+        """
+        Removes finished call, so next caller calls function again.
+        """
+
+        with self._lock:
+            del self._calls[key]
+
+    def stats(self) -> dict[str, int]:
+        """
+        Gives out counters of calls.
+
+        Returns:
+            dict with quantity of calls in progress, calls made by
+            leaders and calls which got shared result
+        """
+
+        with self._lock:
+            return {"in_progress": len(self._calls),
+                    "leaders": self.leaders,
+                    "shared": self.shared}
+
+
+class ResponseCache:
+    """
+    LRU cache of responses which depend only on version of data.
+
+    Notes:
+        Key must contain version of data (look at
+        ``DBHandler.data_version``), so changed data gives new key and
+        old response is evicted later as least recently used.
+
+    Args:
+        max_entries: maximum quantity of responses in cache
+    """
+
+    def __init__(self,
+                 max_entries: int = 64) -> None:
+        if max_entries < 1:
+            raise ValueError("Size of cache must be >= 1")
+
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self,
+            key: Hashable) -> Optional[CachedResponse]:
+        """
+        Gives out cached response.
+
+        Args:
+            key: name of request and version of data
+
+        Returns:
+            cached response or None if it is absent
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self,
+            key: Hashable,
+            response: api.Response) -> CachedResponse:
+        """
+        Puts response in cache.
+
+        Args:
+            key: name of request and version of data
+            response: validated response
+
+        Returns:
+            cached response
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = CachedResponse(response)
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return entry
+
+    def clear(self) -> None:
+        """
+        Removes all responses.
+        """
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Gives out counters of cache.
+
+        Returns:
+            dict with quantity of responses, hits and misses
+        """
+
+        with self._lock:
+            return {"size": len(self._entries),
+                    "hits": self.hits,
+                    "misses": self.misses}
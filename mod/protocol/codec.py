@@ -0,0 +1,164 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+from typing import Any
+from typing import Optional
+
+from pydantic.json import pydantic_encoder
+
+from mod.protocol import api
+
+# Name of feature negotiated by "hello" which enabled columnar encoding
+COLUMNAR = "columnar"
+# Lists in Data object which encoded in columns
+COLUMNAR_LISTS = ("flow", "message", "user")
+
+
+def to_columns(items: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Converts list of objects into parallel arrays per field.
+
+    Notes:
+        Every column is a list of runs ``[start, [value, ...]]`` where
+        ``start`` is index of first object in run. Runs of null values
+        are omitted, column which contains only null values is omitted
+        completely.
+
+    Examples:
+        ``[{"uuid": "1", "text": None}, {"uuid": "2", "text": "Hi"}]``
+        is converted to
+
+        ``{"count": 2, "columns": {"uuid": [[0, ["1", "2"]]],
+        "text": [[1, ["Hi"]]]}}``
+
+    Args:
+        items: list of objects converted to dict
+
+    Returns:
+        dict with quantity of objects and columns
+    """
+
+    columns: dict[str, list] = {}
+
+    for index, item in enumerate(items):
+        for key, value in item.items():
+            if value is None:
+                continue
+
+            runs = columns.get(key)
+            if runs is None:
+                columns[key] = [[index, [value]]]
+                continue
+
+            start, values = runs[-1]
+            if start + len(values) == index:
+                values.append(value)
+            else:
+                runs.append([index, [value]])
+
+    return {"count": len(items),
+            "columns": columns}
+
+
+def from_columns(data: dict[str, Any]) -> list[dict[str, Any]]:
+    """
+    Restores list of objects from parallel arrays per field.
+
+    Notes:
+        Omitted values restored as null (None).
+
+    Args:
+        data: dict with quantity of objects and columns
+              made by ``to_columns``
+
+    Returns:
+        list of objects
+    """
+
+    items: list[dict[str, Any]] = [{} for _ in range(data["count"])]
+
+    for key, runs in data["columns"].items():
+        for item in items:
+            item[key] = None
+
+        for start, values in runs:
+            for offset, value in enumerate(values):
+                items[start + offset][key] = value
+
+    return items
+
+
+def projection_exclude(projections: Optional[dict[str, tuple[str, ...]]]
+                       ) -> Optional[dict[str, Any]]:
+    """
+    Converts fields requested by client into ``exclude`` of pydantic.
+
+    Args:
+        projections: names of fields for every list in Data object
+
+    Returns:
+        dict for ``exclude`` argument or None if nothing is excluded
+    """
+
+    if not projections:
+        return None
+
+    models = {"user": api.UserResponse,
+              "message": api.MessageResponse}
+    exclude = {}
+    for name, fields in projections.items():
+        unused = models[name].__fields__.keys() - set(fields)
+        exclude[name] = {"__all__": unused}
+    return {"data": exclude}
+
+
+def encode(response: api.Response,
+           columnar: bool = False,
+           projections: Optional[dict[str, tuple[str, ...]]] = None) -> str:
+    """
+    Encodes response in JSON-object.
+
+    Args:
+        response: validated response
+        columnar: if True then lists of flow, message and user
+                  in Data object are encoded in columns
+        projections: names of fields for lists of user and message,
+                     other fields are not encoded
+
+    Returns:
+        json-object which contains response
+    """
+
+    exclude = projection_exclude(projections)
+
+    if not columnar or response.data is None:
+        return response.json(exclude=exclude)
+
+    result = response.dict(exclude=exclude)
+    data = result["data"]
+
+    for name in COLUMNAR_LISTS:
+        if data.get(name):
+            data[name] = to_columns(data[name])
+
+    return json.dumps(result,
+                      default=pydantic_encoder)
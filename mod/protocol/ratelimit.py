@@ -0,0 +1,148 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import threading
+from time import monotonic
+from typing import Callable
+
+
+class RateLimiter:
+    """
+    Token buckets of many keys like client address or login.
+
+    Notes:
+        Bucket holds up to ``burst`` tokens, every attempt takes one
+        token and tokens are restored at ``per_minute`` rate. Bucket
+        is stored as one number, time when it becomes full again, so
+        full bucket is the same as missing one. Full buckets are
+        removed by sweep made every ``sweep_interval`` seconds. When
+        there are more than ``max_keys`` buckets, buckets not used for
+        the longest time are removed.
+
+        Limiter with ``burst`` or ``per_minute`` equal to 0 allows
+        every attempt.
+
+    Args:
+        burst: maximum quantity of tokens
+        per_minute: tokens restored in one minute
+        max_keys: maximum quantity of buckets
+        sweep_interval: time between sweeps in seconds
+        clock: function which gives out time in seconds
+    """
+
+    def __init__(self,
+                 burst: int,
+                 per_minute: float,
+                 max_keys: int = 100000,
+                 sweep_interval: float = 60,
+                 clock: Callable[[], float] = monotonic) -> None:
+        self.enabled = burst > 0 and per_minute > 0
+        self.interval = 60 / per_minute if self.enabled else 0.0
+        self.capacity = burst * self.interval
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self.rejected = 0
+        # Time when bucket becomes full, ordered from least recently
+        # used bucket
+        self._full_at: dict[str, float] = {}
+        self._next_sweep = clock() + sweep_interval
+        self._lock = threading.Lock()
+
+    def allow(self,
+              key: str) -> bool:
+        """
+        Takes token from bucket of key.
+
+        Args:
+            key: key of bucket
+
+        Returns:
+            True if there was token or False if attempt is rejected
+        """
+
+        if not self.enabled:
+            return True
+
+        with self._lock:
+            now = self.clock()
+            if now >= self._next_sweep:
+                self._sweep(now)
+            full_at = max(self._full_at.pop(key, now), now) + self.interval
+            if full_at - now > self.capacity:
+                self._full_at[key] = full_at - self.interval
+                self.rejected += 1
+                return False
+            self._full_at[key] = full_at
+            while len(self._full_at) > self.max_keys:
+                del self._full_at[next(iter(self._full_at))]
+            return True
+
+    def _sweep(self,
+               now: float) -> int:
+        """
+        Removes full buckets.
+
+        Args:
+            now: time in seconds
+
+        Returns:
+            quantity of removed buckets
+        """
+
+        full = [key for key, full_at in self._full_at.items()
+                if full_at <= now]
+        for key in full:
+            del self._full_at[key]
+        self._next_sweep = now + self.sweep_interval
+        return len(full)
+
+    def sweep(self) -> int:
+        """
+        Removes full buckets now.
+
+        Returns:
+            quantity of removed buckets
+        """
+
+        with self._lock:
+            return self._sweep(self.clock())
+
+    def clear(self) -> None:
+        """
+        Removes all buckets.
+        """
+
+        with self._lock:
+            self._full_at.clear()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Gives out size of limiter.
+
+        Returns:
+            dict with quantity of buckets and rejected attempts
+        """
+
+        with self._lock:
+            return {"keys": len(self._full_at),
+                    "rejected": self.rejected}
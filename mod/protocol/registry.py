@@ -0,0 +1,208 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from functools import wraps
+import threading
+from time import perf_counter
+from time import time
+from typing import Any
+from typing import Callable
+from typing import NamedTuple
+from typing import Optional
+
+from mod.config.models import ConfigModel
+from mod.db.dbhandler import DBHandler
+from mod.protocol import api
+from mod.protocol.session import Session
+
+
+class RequestContext:
+    """
+    State of one request passed to handler.
+
+    Args:
+        database: object - database connection point
+        config_option: server settings
+        session: state of websocket connection
+        request: validated request
+    """
+
+    __slots__ = ("database",
+                 "config",
+                 "session",
+                 "request",
+                 "current_time",
+                 "projections",
+                 "cached")
+
+    def __init__(self,
+                 database: DBHandler,
+                 config_option: ConfigModel,
+                 session: Session,
+                 request: Optional[api.Request] = None) -> None:
+        self.database = database
+        self.config = config_option
+        self.session = session
+        self.request = request
+        self.current_time = int(time())
+        self.projections: dict[str, tuple[str, ...]] = {}
+        # Cached response returned by handler and its cache entry
+        self.cached: Optional[tuple[Any, api.Response]] = None
+
+
+class HandlerStats:
+    """
+    Quantity of calls and execution time of handler.
+    """
+
+    __slots__ = ("count",
+                 "total_time",
+                 "max_time",
+                 "_lock")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self._lock = threading.Lock()
+
+    def add(self,
+            elapsed: float) -> None:
+        """
+        Adds execution time of one call.
+
+        Args:
+            elapsed: execution time in seconds
+        """
+
+        with self._lock:
+            self.count += 1
+            self.total_time += elapsed
+            if elapsed > self.max_time:
+                self.max_time = elapsed
+
+    def as_dict(self) -> dict[str, Any]:
+        """
+        Gives out statistics as dict.
+
+        Returns:
+            dict with count, total, average and maximum time in seconds
+        """
+
+        with self._lock:
+            average = self.total_time / self.count if self.count else 0.0
+            return {"count": self.count,
+                    "total_time": self.total_time,
+                    "average_time": average,
+                    "max_time": self.max_time}
+
+
+class Handler(NamedTuple):
+    """
+    Registered handler of request type.
+
+    Notes:
+        ``auth`` sets who can call handler:
+
+            ``True`` - only authenticated users
+
+            ``False`` - only not authenticated users
+
+            ``None`` - anyone, handler called before checking of
+            authentication and protocol version
+
+        ``limited`` handler is called only while client address and
+        login have attempts left in rate limiters.
+    """
+
+    func: Callable[[RequestContext], api.Response]
+    auth: Optional[bool]
+    stats: HandlerStats
+    limited: bool = False
+
+
+HANDLERS: dict[str, Handler] = {}
+
+
+def handler(request_type: str,
+            auth: Optional[bool] = True,
+            limited: bool = False) -> Callable:
+    """
+    Registers function as handler of request type.
+
+    Notes:
+        Execution time of every call is added in handler statistics.
+
+    Examples:
+        ``@handler("ping_pong")``
+
+        ``def ping_pong(ctx: RequestContext) -> api.Response:``
+
+    Args:
+        request_type: name of request type like ``send_message``
+        auth: who can call handler, look at ``Handler``
+        limited: limit rate of calls, look at ``Handler``
+
+    Returns:
+        decorator
+    """
+
+    def decorator(func: Callable[[RequestContext], api.Response]):
+        stats = HandlerStats()
+
+        @wraps(func)
+        def wrapper(ctx: RequestContext) -> api.Response:
+            start = perf_counter()
+            try:
+                return func(ctx)
+            finally:
+                stats.add(perf_counter() - start)
+
+        HANDLERS[request_type] = Handler(wrapper, auth, stats, limited)
+        return wrapper
+
+    return decorator
+
+
+def get_handler(request_type: str) -> Optional[Handler]:
+    """
+    Gives out handler registered for request type.
+
+    Args:
+        request_type: name of request type
+
+    Returns:
+        handler or None if request type is not registered
+    """
+
+    return HANDLERS.get(request_type)
+
+
+def get_stats() -> dict[str, dict[str, Any]]:
+    """
+    Gives out execution statistics of all registered handlers.
+
+    Returns:
+        dict where key is request type
+    """
+
+    return {name: item.stats.as_dict()
+            for name, item in HANDLERS.items()}
@@ -0,0 +1,129 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from functools import lru_cache
+from typing import Optional
+
+# Codecs which server can use for encoding responses
+SUPPORTED_CODECS = frozenset(("json",))
+# Optional protocol features which client can request in "hello"
+SUPPORTED_FEATURES = frozenset(("columnar",))
+
+
+@lru_cache(maxsize=128)
+def parse_version(version: str) -> tuple[int, ...]:
+    """
+    Converts protocol version string into tuple of numbers.
+
+    Notes:
+        Versions compared numerically, "1.10" is greater than "1.9".
+
+    Args:
+        version: protocol version like "1.0"
+
+    Returns:
+        tuple of numbers like (1, 0)
+
+    Raises:
+        ValueError: raised when version contains not a number
+    """
+
+    return tuple(int(part) for part in version.split("."))
+
+
+def is_version_supported(version: str,
+                         min_version: str,
+                         max_version: str) -> bool:
+    """
+    Checks that version between minimum and maximum supported by server.
+
+    Args:
+        version: version of protocol requested by client
+        min_version: minimum supported by server version
+        max_version: maximum supported by server version
+
+    Returns:
+        True if version is supported or False if not supported or
+        can't be parsed.
+    """
+
+    try:
+        minimum = parse_version(min_version)
+        maximum = parse_version(max_version)
+        return minimum <= parse_version(version) <= maximum
+    except ValueError:
+        return False
+
+
+class Session:
+    """
+    Connection-level state negotiated with client by "hello" request.
+
+    Created once for every websocket connection, after successful "hello"
+    client can omit "jsonapi" in request and server skip checking
+    protocol version for every request.
+
+    Args:
+        host: client host
+    """
+
+    __slots__ = ("host",
+                 "version",
+                 "codec",
+                 "features")
+
+    def __init__(self,
+                 host: Optional[str] = None) -> None:
+        self.host = host
+        self.version: Optional[str] = None
+        self.codec = "json"
+        self.features: frozenset[str] = frozenset()
+
+    @property
+    def negotiated(self) -> bool:
+        """
+        Shows is "hello" exchange was successful.
+
+        Returns:
+            True or False
+        """
+
+        return self.version is not None
+
+    def negotiate(self,
+                  version: str,
+                  codec: str = "json",
+                  features: Optional[list[str]] = None) -> None:
+        """
+        Saves result of "hello" exchange.
+
+        Notes:
+            Features which not supported by server are dropped.
+
+        Args:
+            version: protocol version checked by server
+            codec: codec for responses
+            features: optional features requested by client
+        """
+
+        self.version = version
+        self.codec = codec
+        self.features = SUPPORTED_FEATURES.intersection(features or ())
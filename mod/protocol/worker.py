@@ -19,9 +19,12 @@ You should have received a copy of the GNU Lesser General Public License
 along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
 """
 
-from collections import namedtuple
+from concurrent import futures
 from time import time
-from typing import Optional, Any
+from typing import Any
+from typing import Callable
+from typing import NamedTuple
+from typing import Optional
 from typing import Union
 from uuid import uuid4
 
@@ -32,11 +35,69 @@ from sqlobject.sresults import SelectResults
 from mod import error
 from mod import lib
 from mod.config.models import ConfigModel
+from mod.db.archive import MessageHistory
 from mod.db.dbhandler import DatabaseAccessError
+from mod.db.dbhandler import DatabasePoolError
 from mod.db.dbhandler import DatabaseReadError
 from mod.db.dbhandler import DatabaseWriteError
 from mod.db.dbhandler import DBHandler
 from mod.protocol import api
+from mod.protocol import codec
+from mod.protocol.cache import CachedResponse
+from mod.protocol.cache import ResponseCache
+from mod.protocol.cache import SingleFlight
+from mod.protocol.ratelimit import RateLimiter
+from mod.protocol.registry import get_handler
+from mod.protocol.registry import handler
+from mod.protocol.registry import RequestContext
+from mod.protocol.session import is_version_supported
+from mod.protocol.session import Session
+from mod.protocol.session import SUPPORTED_CODECS
+
+# Fields of User object which can be requested in "user_info"
+USER_INFO_FIELDS = ("uuid",
+                    "login",
+                    "username",
+                    "avatar",
+                    "bio",
+                    "is_bot")
+# Fields of User object which can be requested in "get_update"
+USER_UPDATE_FIELDS = ("uuid",
+                      "username",
+                      "is_bot",
+                      "avatar",
+                      "bio")
+# Fields of Message object which can be requested
+MESSAGE_FIELDS = ("uuid",
+                  "text",
+                  "from_user",
+                  "time",
+                  "from_flow",
+                  "file_picture",
+                  "file_video",
+                  "file_audio",
+                  "file_document",
+                  "emoji",
+                  "edited_time",
+                  "edited_status")
+# Names of columns in Message table which differ from Message object
+MESSAGE_COLUMNS = {"from_user": "user",
+                   "from_flow": "flow"}
+# Version of protocol which added in every response
+JSONAPI = api.VersionResponse(version=api.VERSION,
+                              revision=api.REVISION)
+# Responses which depend only on version of data in database
+RESPONSES = ResponseCache()
+# Reads of the same data made by concurrent requests
+FLIGHTS = SingleFlight()
+# Signed tokens revoked before they expire
+REVOKED = lib.RevocationList()
+# Processes which generate and check password hashes
+PASSWORDS = lib.KdfPool()
+# Signers of tokens made for keys and lifetime of token
+SIGNERS: dict[tuple[tuple[str, ...], int], lib.TokenSigner] = {}
+# Limiters of authentication attempts made for name and rate
+LIMITERS: dict[tuple[str, int, int], RateLimiter] = {}
 
 
 class MTPErrorResponse:
@@ -96,752 +157,1475 @@ class MTPErrorResponse:
                                   detail=detail)
 
 
-class MTProtocol:
+# Answer to get_update when data was not changed since time of request
+NOT_MODIFIED = CachedResponse(api.Response(
+    type="get_update",
+    data=api.DataResponse(time=0),
+    errors=MTPErrorResponse("NOT_MODIFIED").result(),
+    jsonapi=JSONAPI))
+
+
+class AuthResult(NamedTuple):
+    """
+    Result of checking user authentication.
     """
-    Processing requests and forming response according to "MTP" protocol.
 
-    See Also:
-        Read actual description of protocol:
+    result: bool
+    error_message: str
 
-        https://github.com/MoreliaTalk/morelia_protocol/blob/master/README.md
+
+def error_response(status: str = None,
+                   add_info: Union[Exception, str, None] = None,
+                   request: api.Request = None) -> api.Response:
+    """
+    Handles cases when a request to server is not recognized by it.
+    Get a standard answer type: error, which contains an object
+    with a description of error.
 
     Args:
-        request: JSON request from websocket client
-        database: object - database connection point
-        
+        status: error status name in UPPERCASE
+        add_info: additional information which added to error message
+        request: request from client in dict format
+    """
+
+    if request is not None:
+        response = request.type
+    else:
+        response = "error"
+
+    if status is None:
+        status = "METHOD_NOT_ALLOWED"
+
+    errors = MTPErrorResponse(status,
+                              add_info)
+    logger.success("\'error_response\' executed successfully")
+
+    return api.Response(type=response,
+                        data=None,
+                        errors=errors.result(),
+                        jsonapi=JSONAPI)
+
+
+def check_limits(request: api.Request,
+                 config_option: ConfigModel) -> Optional[str]:
+    """
+    Checks request content against size limits set in config.
+
+    Notes:
+        Checked length of message text, size of every attachment
+        and number of users in new flow.
+
+    Args:
+        request: validated request
+        config_option: server settings
+
     Returns:
-        returns class api.Response
+        text description of exceeded limit or None if request
+        is within limits
     """
 
-    def __init__(self, request: str, database: DBHandler, config_option: ConfigModel):
-        self.jsonapi = api.VersionResponse(version=api.VERSION,
-                                           revision=api.REVISION)
-        self._current_time = int(time())
-        self._db = database
-        self._config_option = config_option
+    limits = config_option.limits
+    data = request.data
 
-        try:
-            self.request = api.Request.parse_obj(request)
-            logger.success("Validation was successful")
-        except ValidationError as ERROR:
-            self.response = self._errors("UNSUPPORTED_MEDIA_TYPE",
-                                         str(ERROR))
-            logger.debug(f"Validation failed: {ERROR}")
-        else:
-            self._select_method_and_set_response()
-
-    def _select_method_and_set_response(self):
-        auth = self._check_auth(self.request.data.user[0].uuid,
-                                self.request.data.user[0].auth_id)
-        version = self._check_protocol_version(self.request)
-
-        if version and auth.result:
-            match self.request.type:
-                case "get_update":
-                    self.response = self._get_update(self.request)
-                case "send_message":
-                    self.response = self._send_message(self.request)
-                case "all_messages":
-                    self.response = self._all_messages(self.request)
-                case "add_flow":
-                    self.response = self._add_flow(self.request)
-                case "all_flow":
-                    self.response = self._all_flow(self.request)
-                case "user_info":
-                    self.response = self._user_info(self.request)
-                case "delete_user":
-                    self.response = self._delete_user(self.request)
-                case "delete_message":
-                    self.response = self._delete_message(self.request)
-                case "edited_message":
-                    self.response = self._edited_message(self.request)
-                case "ping_pong":
-                    self.response = self._ping_pong(self.request)
-                case _:
-                    self.response = self._errors("METHOD_NOT_ALLOWED")
-        elif version and auth.result is False:
-            match self.request.type:
-                case 'register_user':
-                    self.response = self._register_user(self.request)
-                case 'authentication':
-                    self.response = self._authentication(self.request)
-                case _:
-                    self.response = self._errors("UNAUTHORIZED",
-                                                 auth.error_message)
-        else:
-            self.response = self._errors("VERSION_NOT_SUPPORTED")
+    if data is None:
+        return None
 
-    def _check_auth(self,
-                    uuid: str,
-                    auth_id: str) -> Any:
-        """
-        Checking user authentication every each request.
+    for message in data.message or []:
+        if message.text and len(message.text) > limits.text_length:
+            return ("Message text longer than server limit"
+                    f" ({limits.text_length})")
 
-        Args:
-            uuid: user identification number which granted moreliatalk
+        for attachment in (message.file_picture,
+                           message.file_video,
+                           message.file_audio,
+                           message.file_document,
+                           message.emoji):
+            if attachment and len(attachment) > limits.attachment_size:
+                return ("Attachment larger than server limit"
+                        f" ({limits.attachment_size})")
+
+    if request.type == "add_flow":
+        for flow in data.flow or []:
+            if flow.users and len(flow.users) > limits.flow_users:
+                return ("Requested more users in flow than server"
+                        f" limit ({limits.flow_users})")
+
+    return None
+
+
+def get_signer(config_option: ConfigModel) -> lib.TokenSigner:
+    """
+    Gives out signer of tokens for server settings.
+
+    Notes:
+        Signer is made once for every set of keys, so random key made
+        when keys are not set is the same for all requests.
+
+    Args:
+        config_option: server settings
+
+    Returns:
+        signer of tokens
+    """
+
+    key = (tuple(config_option.auth.secret_keys),
+           config_option.auth.token_ttl)
+    signer = SIGNERS.get(key)
+    if signer is None:
+        signer = SIGNERS.setdefault(key, lib.TokenSigner(*key))
+    return signer
+
+
+def get_limiter(name: str,
+                burst: int,
+                per_minute: int) -> RateLimiter:
+    """
+    Gives out limiter of authentication attempts.
+
+    Notes:
+        Limiter is made once for every name and rate, so attempts
+        of all requests are counted together.
+
+    Args:
+        name: name of limiter like ``host``
+        burst: attempts allowed at once
+        per_minute: attempts restored in one minute
+
+    Returns:
+        limiter
+    """
+
+    key = (name, burst, per_minute)
+    limiter = LIMITERS.get(key)
+    if limiter is None:
+        limiter = LIMITERS.setdefault(key, RateLimiter(burst, per_minute))
+    return limiter
+
+
+def check_rate(ctx: RequestContext) -> Optional[str]:
+    """
+    Takes attempt of authentication for client address and login.
+
+    Notes:
+        Called before database is read and password hash is made, so
+        burst of attempts does not load server.
+
+    Args:
+        ctx: state of request
+
+    Returns:
+        description of error or None if attempt is allowed
+    """
+
+    limits = ctx.config.limits
+    host = ctx.session.host
+    if host is not None and not get_limiter(
+            "host",
+            limits.auth_host_burst,
+            limits.auth_host_per_minute).allow(host):
+        return "Too many attempts from client address"
+
+    request = ctx.request
+    if request.data is None or not request.data.user:
+        return None
+    login = request.data.user[0].login
+    if login is not None and not get_limiter(
+            "login",
+            limits.auth_login_burst,
+            limits.auth_login_per_minute).allow(login):
+        return "Too many attempts for login"
+    return None
+
+
+def check_auth(database: DBHandler,
+               uuid: str,
+               auth_id: str,
+               signer: Optional[lib.TokenSigner] = None) -> AuthResult:
+    """
+    Checking user authentication every each request.
+
+    Notes:
+        Signed token is checked in memory, its signature, expiry and
+        revocation are checked. Then user is taken from cache of
+        identity, token of deleted user is rejected even when list of
+        revoked tokens is lost by restart. Other tokens are compared
+        with token saved in database.
+
+    Args:
+        database: object - database connection point
+        uuid: user identification number which granted moreliatalk
+                    server
+        auth_id: authentication token which granted moreliatalk
                         server
-            auth_id: authentication token which granted moreliatalk
-                            server
+        signer: signer of tokens, signed tokens are not accepted
+                if it is None
 
-        Returns:
-                object: object with two parameters, which contain:
+    Returns:
+            object: object with two parameters, which contain:
 
-                        ``result``: True or False
+                    ``result``: True or False
 
-                        ``error_message``: text description of the error
-        """
+                    ``error_message``: text description of the error
+    """
 
-        Result = namedtuple('Result', ['result',
-                                       'error_message'])
-        try:
-            dbquery = self._db.get_user_by_uuid(uuid)
-            logger.success("User was found in the database")
-        except DatabaseReadError:
-            message = "User was not authenticated"
+    signed = False
+    if signer is not None and auth_id:
+        signed = signer.is_signed(auth_id)
+    if signed:
+        claims = signer.verify(auth_id)
+        if claims is None or claims.uuid != uuid:
+            message = "Authentication User failed"
+        elif claims.expires <= time():
+            message = "Token has expired"
+        elif REVOKED.is_revoked(claims):
+            message = "Token was revoked"
+        else:
+            message = None
+        if message is not None:
             logger.debug(message)
-            return Result(False,
+            return AuthResult(False,
+                              message)
+
+    try:
+        identity = database.get_user_identity(uuid)
+        logger.success("User was found in the database")
+    except DatabaseReadError:
+        message = "User was not authenticated"
+        logger.debug(message)
+        return AuthResult(False,
                           message)
-        else:
-            if auth_id == dbquery.auth_id:
-                message = "Authentication User has been verified"
-                logger.success(message)
-                return Result(True,
+    else:
+        if identity.deleted_time is not None:
+            message = "User was deleted"
+            logger.debug(message)
+            return AuthResult(False,
                               message)
-            else:
-                message = "Authentication User failed"
-                logger.debug(message)
-                return Result(False,
+        elif signed:
+            message = "Authentication User has been verified"
+            logger.success(message)
+            return AuthResult(True,
+                              message)
+        elif auth_id == identity.auth_id:
+            message = "Authentication User has been verified"
+            logger.success(message)
+            return AuthResult(True,
+                              message)
+        else:
+            message = "Authentication User failed"
+            logger.debug(message)
+            return AuthResult(False,
                               message)
 
-    def get_response(self,
-                     response: api.Response = None) -> str:
-        """
-        Generates a JSON-object containing result of an instance json.
 
-        Returns:
-            json-object which contains validated response
-        """
+def check_login(database: DBHandler,
+                login: str) -> bool:
+    """
+    Checks database for a user with the same login.
 
-        if response is None:
-            result = self.response.json()
-            return result
-        else:
-            result = response.json()
-            return result
+    Args:
+        database: object - database connection point
+        login: user login
 
-    def _check_login(self,
-                     login: str) -> bool:
-        """
-        Checks database for a user with the same login.
+    Returns:
+        True if there is such a user or False if no such user exists.
+    """
 
-        Args:
-            login: user login
+    try:
+        database.get_user_identity_by_login(login)
+    except DatabaseReadError:
+        logger.debug("There is no user in the database")
+        return False
+    else:
+        logger.success("User was found in the database")
+        return True
 
-        Returns:
-            True if there is such a user or False if no such user exists.
-        """
 
-        try:
-            self._db.get_user_by_login(login)
-        except DatabaseReadError:
-            logger.debug("There is no user in the database")
-            return False
+def check_protocol_version(ctx: RequestContext) -> bool:
+    """
+    Checks the version of the protocol in the client request.
+
+    Notes:
+        Check is skipped if protocol version negotiated by "hello".
+
+    Returns:
+        True if client protocol version > minimum and < maximum
+        of supported by server.
+    """
+
+    if ctx.session.negotiated:
+        return True
+
+    if ctx.request.jsonapi is None:
+        return False
+
+    return is_version_supported(ctx.request.jsonapi.version,
+                                ctx.config.api.min_version,
+                                ctx.config.api.max_version)
+
+
+def projection(ctx: RequestContext,
+               name: str,
+               allowed: tuple[str, ...]) -> Optional[tuple[str, ...]]:
+    """
+    Gives out fields requested by client for list of user or message.
+
+    Notes:
+        Field ``uuid`` is always returned. Fields which not allowed
+        for this type of request are dropped.
+
+    Args:
+        ctx: state of request
+        name: name of list, ``user`` or ``message``
+        allowed: fields which returned by default
+
+    Returns:
+        names of fields or None if client not requested projection
+    """
+
+    request = ctx.request
+    if request.data is None or request.data.fields is None:
+        return None
+
+    requested = getattr(request.data.fields, name)
+    if requested is None:
+        return None
+
+    fields = ("uuid",) + tuple(field for field in allowed
+                               if field in requested and field != "uuid")
+    ctx.projections[name] = fields
+    return fields
+
+
+def get_message_fields(ctx: RequestContext,
+                       fields: tuple[str, ...],
+                       time_: int,
+                       flow_uuid: str = None,
+                       start: int = None,
+                       end: int = None) -> list[api.MessageResponse]:
+    """
+    Reads only requested fields of messages from database.
+
+    Args:
+        ctx: state of request
+        fields: names of fields in Message object
+        time_: Unix-like time, messages created since this time
+        flow_uuid: unique identify number from flow
+        start: number of first message
+        end: number of message after last message
+
+    Returns:
+        list contains of validated object
+    """
+
+    columns = [MESSAGE_COLUMNS.get(field, field) for field in fields]
+    dbquery = ctx.database.get_message_fields(columns,
+                                              time_,
+                                              flow_uuid,
+                                              start,
+                                              end)
+    return [api.MessageResponse(**dict(zip(fields, item.values())))
+            for item in dbquery]
+
+
+def dispatch(ctx: RequestContext) -> api.Response:
+    """
+    Selects handler registered for type of request and calls it.
+
+    Notes:
+        Before calling handler checks request size limits,
+        user authentication and protocol version.
+
+    Args:
+        ctx: state of request with validated request
+
+    Returns:
+        validated response
+    """
+
+    request = ctx.request
+
+    oversize = check_limits(request, ctx.config)
+    if oversize is not None:
+        return error_response("REQUEST_ENTITY_TOO_LARGE",
+                              oversize)
+
+    registered = get_handler(request.type)
+    if registered is not None and registered.limited:
+        limited = check_rate(ctx)
+        if limited is not None:
+            return error_response("TOO_MANY_REQUESTS",
+                                  limited,
+                                  request)
+
+    if registered is not None and registered.auth is None:
+        return registered.func(ctx)
+
+    if request.data is None or not request.data.user:
+        return error_response("UNAUTHORIZED",
+                              "User was not authenticated")
+
+    auth = check_auth(ctx.database,
+                      request.data.user[0].uuid,
+                      request.data.user[0].auth_id,
+                      get_signer(ctx.config))
+    version = check_protocol_version(ctx)
+
+    if not version:
+        return error_response("VERSION_NOT_SUPPORTED")
+    elif registered is not None and registered.auth is auth.result:
+        return registered.func(ctx)
+    elif auth.result:
+        return error_response("METHOD_NOT_ALLOWED")
+    else:
+        return error_response("UNAUTHORIZED",
+                              auth.error_message)
+
+
+def process(request: Any,
+            ctx: RequestContext) -> api.Response:
+    """
+    Validates request from client and forms response.
+
+    Notes:
+        Request is processed as one unit of work, connection to
+        database is taken from pool once for whole request.
+
+    Args:
+        request: JSON request from websocket client
+        ctx: state of request
+
+    Returns:
+        validated response
+    """
+
+    try:
+        ctx.request = api.Request.parse_obj(request)
+        logger.success("Validation was successful")
+    except ValidationError as ERROR:
+        logger.debug(f"Validation failed: {ERROR}")
+        return error_response("UNSUPPORTED_MEDIA_TYPE",
+                              str(ERROR))
+
+    # All queries of one request use one connection from pool
+    try:
+        with ctx.database.unit_of_work():
+            return dispatch(ctx)
+    except DatabasePoolError as ERROR:
+        logger.warning(f"Request was not processed: {ERROR}")
+        return error_response("SERVICE_UNAVAILABLE",
+                              str(ERROR))
+
+
+def encode_response(ctx: RequestContext,
+                    response: api.Response) -> str:
+    """
+    Generates a JSON-object containing response.
+
+    Notes:
+        If client negotiated "columnar" feature, then lists of flow,
+        message and user are encoded in columns.
+
+    Args:
+        ctx: state of request
+        response: validated response
+
+    Returns:
+        json-object which contains validated response
+    """
+
+    columnar = codec.COLUMNAR in ctx.session.features
+    if ctx.cached is not None and ctx.cached[1] is response:
+        time_ = ctx.current_time if response.data is None \
+            else response.data.time
+        return ctx.cached[0].encode(
+            time_,
+            columnar,
+            lambda item, columns: codec.encode(item,
+                                               columns,
+                                               ctx.projections))
+
+    return codec.encode(response,
+                        columnar,
+                        ctx.projections)
+
+
+def cached_response(ctx: RequestContext,
+                    build: Callable[[RequestContext], api.Response]
+                    ) -> api.Response:
+    """
+    Gives out response which depends only on version of flows.
+
+    Notes:
+        Response is built once for every version of flows, its encoded
+        form is cached too. Response must not depend on user, time or
+        projection requested by client.
+
+    Args:
+        ctx: state of request
+        build: function which builds response
+
+    Returns:
+        validated response with current time
+    """
+
+    key = (ctx.request.type, ctx.database.data_version())
+    entry = RESPONSES.get(key)
+    if entry is None:
+        # Concurrent requests build response only once
+        entry, _ = FLIGHTS.do(key,
+                              lambda: RESPONSES.put(key, build(ctx)))
+    response = entry.stamp(ctx.current_time)
+    ctx.cached = (entry, response)
+    return response
+
+
+def coalesced_response(ctx: RequestContext,
+                       build: Callable[[RequestContext], api.Response]
+                       ) -> api.Response:
+    """
+    Gives out one response to identical concurrent requests.
+
+    Notes:
+        Requests are identical when they have the same type and data
+        except of user, so response must not depend on user. Only the
+        first request builds response, other requests which come
+        before it is built wait and get the same response and its
+        encoded form.
+
+    Args:
+        ctx: state of request
+        build: function which builds response
+
+    Returns:
+        validated response with current time
+    """
+
+    request = ctx.request
+    key = (id(ctx.database.connection),
+           request.type,
+           None if request.data is None
+           else request.data.json(exclude={"user"}))
+
+    def run() -> tuple[CachedResponse, dict[str, tuple[str, ...]]]:
+        return CachedResponse(build(ctx)), dict(ctx.projections)
+
+    (entry, projections), shared = FLIGHTS.do(key, run)
+    if shared:
+        ctx.projections.update(projections)
+    response = entry.stamp(ctx.current_time)
+    ctx.cached = (entry, response)
+    return response
+
+
+@handler("hello",
+         auth=None)
+def hello(ctx: RequestContext) -> api.Response:
+    """
+    Negotiates protocol version, codec and features of connection.
+
+    Notes:
+        After successful "hello" client can omit "jsonapi" in
+        subsequent requests.
+    """
+
+    request = ctx.request
+
+    meta = None
+
+    try:
+        options = api.HelloMetaRequest.parse_obj(request.meta or {})
+    except ValidationError as ERROR:
+        errors = MTPErrorResponse("BAD_REQUEST",
+                                  str(ERROR))
+    else:
+        version = request.jsonapi.version if request.jsonapi else None
+        supported = version is not None and is_version_supported(
+            version,
+            ctx.config.api.min_version,
+            ctx.config.api.max_version)
+        if not supported:
+            errors = MTPErrorResponse("VERSION_NOT_SUPPORTED")
+        elif options.codec not in SUPPORTED_CODECS:
+            errors = MTPErrorResponse("UNSUPPORTED_MEDIA_TYPE",
+                                      f"Codec {options.codec} is not"
+                                      " supported")
         else:
-            logger.success("User was found in the database")
-            return True
+            ctx.session.negotiate(request.jsonapi.version,
+                                  options.codec,
+                                  options.features)
+            meta = api.HelloMetaResponse(
+                version=ctx.session.version,
+                codec=ctx.session.codec,
+                features=sorted(ctx.session.features))
+            errors = MTPErrorResponse("OK")
+            logger.success("\'hello\' executed successfully")
 
-    def _register_user(self,
-                       request: api.Request) -> api.Response:
-        """
-        Registers user who is not in the database.
+    return api.Response(type=request.type,
+                        data=None,
+                        errors=errors.result(),
+                        jsonapi=JSONAPI,
+                        meta=meta)
 
-        Note:
-            This version also authentication user, that exist in database
 
-        Returns:
-            validated response
-        """
+@handler("register_user",
+         auth=False,
+         limited=True)
+def register_user(ctx: RequestContext) -> api.Response:
+    """
+    Registers user who is not in the database.
 
-        uuid = str(uuid4().int)
-        password = request.data.user[0].password
-        login = request.data.user[0].login
-        username = request.data.user[0].username
-        email = request.data.user[0].email
-        user = []
-        data = None
+    Note:
+        This version also authentication user, that exist in database
 
-        if login is None or password is None:
-            errors = MTPErrorResponse("UNAUTHORIZED")
+    Returns:
+        validated response
+    """
+
+    request = ctx.request
+
+    uuid = str(uuid4().int)
+    password = request.data.user[0].password
+    login = request.data.user[0].login
+    username = request.data.user[0].username
+    email = request.data.user[0].email
+    user = []
+    data = None
+
+    if login is None or password is None:
+        errors = MTPErrorResponse("UNAUTHORIZED")
+    else:
+        if check_login(ctx.database, login):
+            errors = MTPErrorResponse("CONFLICT")
         else:
-            if self._check_login(login):
-                errors = MTPErrorResponse("CONFLICT")
-            else:
-                generated = lib.Hash(password,
-                                     uuid)
-                auth_id = generated.auth_id()
-                self._db.add_user(uuid,
+            generated = lib.Hash(password,
+                                 uuid,
+                                 **ctx.config.hash_size.hash_options())
+            hash_password = PASSWORDS.password_hash(generated)
+            auth_id, token_ttl = get_signer(ctx.config).issue(
+                uuid, ctx.current_time)
+            ctx.database.add_user(uuid,
                                   login,
                                   password,
-                                  hash_password=generated.password_hash(),
+                                  hash_password=hash_password,
                                   username=username,
                                   is_bot=False,
                                   auth_id=auth_id,
-                                  token_ttl=self._current_time,
+                                  token_ttl=token_ttl,
                                   email=email,
                                   avatar=None,
                                   bio=None,
                                   salt=generated.get_salt,
                                   key=generated.get_key)
-                user.append(api.UserResponse(uuid=uuid,
-                                             auth_id=auth_id,
-                                             token_ttl=self._current_time))
-                data = api.DataResponse(time=self._current_time,
-                                        user=user)
-                errors = MTPErrorResponse("CREATED")
-                logger.success("User is register")
-
-        return api.Response(type=request.type,
-                            data=data,
-                            errors=errors.result(),
-                            jsonapi=self.jsonapi)
-
-    def _get_update(self,
-                    request: api.Request) -> api.Response:
-        """
-        Provides updates of flows, messages and users in them from time.
+            user.append(api.UserResponse(uuid=uuid,
+                                         auth_id=auth_id,
+                                         token_ttl=token_ttl))
+            data = api.DataResponse(time=ctx.current_time,
+                                    user=user)
+            errors = MTPErrorResponse("CREATED")
+            logger.success("User is register")
+
+    return api.Response(type=request.type,
+                        data=data,
+                        errors=errors.result(),
+                        jsonapi=JSONAPI)
+
+
+@handler("get_update")
+def get_update(ctx: RequestContext) -> api.Response:
+    """
+    Provides updates of flows, messages and users in them from time.
 
-        Returns:
-            validated response
-        """
+    Notes:
+        When nothing was changed since time of request, answer with
+        status "Not Modified" and without data is given out without
+        reading of database.
 
-        # select all fields of the user table
-        # TODO внести изменения в протокол:
-        #   добавить фильтр по дате создания пользователя
-        message = []
-        flow = []
-        user = []
-
-        dbquery_user = self._db.get_all_user()
-        dbquery_flow = self._db.get_flow_by_more_time(request.data.time)
-        dbquery_message = self._db.get_message_by_more_time(request.data.time)
-
-        if dbquery_message.count() >= 1:
-            for element in dbquery_message:
-                message.append(api.MessageResponse(
-                    uuid=element.uuid,
-                    client_id=None,
-                    text=element.text,
-                    from_user=element.user.uuid,
-                    time=element.time,
-                    from_flow=element.flow.uuid,
-                    file_picture=element.file_picture,
-                    file_video=element.file_video,
-                    file_audio=element.file_audio,
-                    file_document=element.file_document,
-                    emoji=element.emoji,
-                    edited_time=element.edited_time,
-                    edited_status=element.edited_status))
-
-        if dbquery_flow.count() >= 1:
-            for element in dbquery_flow:
-                flow.append(api.FlowResponse(
-                    uuid=element.uuid,
-                    time=element.time_created,
-                    type=element.flow_type,
-                    title=element.title,
-                    info=element.info,
-                    owner=element.owner,
-                    users=[item.uuid for item in element.users]))
-
-        if dbquery_user.count() >= 1:
-            for element in dbquery_user:
-                user.append(api.UserResponse(
-                    uuid=element.uuid,
-                    username=element.username,
-                    is_bot=element.is_bot,
-                    avatar=element.avatar,
-                    bio=element.bio))
+    Returns:
+        validated response
+    """
+
+    request = ctx.request
+
+    since = request.data.time
+    if since is not None and not ctx.database.changed_since(since):
+        response = NOT_MODIFIED.stamp(ctx.current_time)
+        ctx.cached = (NOT_MODIFIED, response)
+        logger.success("\'get_update\' executed successfully")
+        return response
+
+    # select all fields of the user table
+    # TODO внести изменения в протокол:
+    #   добавить фильтр по дате создания пользователя
+    message = []
+    flow = []
+    user = []
+
+    user_fields = projection(ctx,
+                             "user",
+                             USER_UPDATE_FIELDS)
+    message_fields = projection(ctx,
+                                "message",
+                                MESSAGE_FIELDS)
+
+    dbquery_user = ctx.database.get_all_user()
+    dbquery_flow = ctx.database.get_flow_by_more_time(request.data.time)
+    dbquery_message = ctx.database.get_message_by_more_time(request.data.time)
+
+    if message_fields is not None:
+        message = get_message_fields(ctx, message_fields,
+                                     request.data.time)
+    elif dbquery_message.count() >= 1:
+        for element in dbquery_message:
+            message.append(api.MessageResponse(
+                uuid=element.uuid,
+                client_id=None,
+                text=element.text,
+                from_user=element.user.uuid,
+                time=element.time,
+                from_flow=element.flow.uuid,
+                file_picture=element.file_picture,
+                file_video=element.file_video,
+                file_audio=element.file_audio,
+                file_document=element.file_document,
+                emoji=element.emoji,
+                edited_time=element.edited_time,
+                edited_status=element.edited_status))
+
+    if dbquery_flow.count() >= 1:
+        for element in dbquery_flow:
+            flow.append(api.FlowResponse(
+                uuid=element.uuid,
+                time=element.time_created,
+                type=element.flow_type,
+                title=element.title,
+                info=element.info,
+                owner=element.owner,
+                users=ctx.database.get_flow_member_uuids(element.uuid)))
+
+    if user_fields is not None:
+        user = [api.UserResponse(**item) for item
+                in ctx.database.get_user_fields(user_fields)]
+    elif dbquery_user.count() >= 1:
+        for element in dbquery_user:
+            user.append(api.UserResponse(
+                uuid=element.uuid,
+                username=element.username,
+                is_bot=element.is_bot,
+                avatar=element.avatar,
+                bio=element.bio))
+
+    errors = MTPErrorResponse("OK")
+    data = api.DataResponse(time=ctx.current_time,
+                            flow=flow,
+                            message=message,
+                            user=user)
+    logger.success("\'get_update\' executed successfully")
+
+    return api.Response(type=request.type,
+                        data=data,
+                        errors=errors.result(),
+                        jsonapi=JSONAPI)
+
+
+@handler("send_message")
+def send_message(ctx: RequestContext) -> api.Response:
+    """
+    Saves user message in database.
+    """
 
+    request = ctx.request
+
+    message_uuid = str(uuid4().int)
+    flow_uuid = request.data.flow[0].uuid
+    text = request.data.message[0].text
+    picture = request.data.message[0].file_picture
+    video = request.data.message[0].file_video
+    audio = request.data.message[0].file_audio
+    document = request.data.message[0].file_document
+    emoji = request.data.message[0].emoji
+    user_uuid = request.data.user[0].uuid
+    client_id = request.data.message[0].client_id
+    message = []
+    data = None
+
+    try:
+        # Message is committed by group writer together with messages
+        # from other connections
+        ctx.database.submit_message(flow_uuid,
+                                    user_uuid,
+                                    message_uuid,
+                                    ctx.current_time,
+                                    text,
+                                    picture,
+                                    video,
+                                    audio,
+                                    document,
+                                    emoji).result(
+            ctx.config.database.write_timeout)
+    except (DatabaseWriteError,
+            DatabaseReadError) as ERROR:
+        errors = MTPErrorResponse("NOT_FOUND",
+                                  str(ERROR))
+    except futures.TimeoutError:
+        errors = MTPErrorResponse("SERVICE_UNAVAILABLE",
+                                  "Message was not saved in time")
+    else:
+        message.append(api.MessageResponse(uuid=message_uuid,
+                                           client_id=client_id,
+                                           from_user=user_uuid,
+                                           from_flow=flow_uuid))
+        data = api.DataResponse(time=ctx.current_time,
+                                message=message)
+        logger.success("\'send_message\' executed successfully")
         errors = MTPErrorResponse("OK")
-        data = api.DataResponse(time=self._current_time,
-                                flow=flow,
-                                message=message,
-                                user=user)
-        logger.success("\'_get_update\' executed successfully")
-
-        return api.Response(type=request.type,
-                            data=data,
-                            errors=errors.result(),
-                            jsonapi=self.jsonapi)
-
-    def _send_message(self,
-                      request: api.Request) -> api.Response:
-        """
-        Saves user message in database.
-        """
 
-        message_uuid = str(uuid4().int)
-        flow_uuid = request.data.flow[0].uuid
-        text = request.data.message[0].text
-        picture = request.data.message[0].file_picture
-        video = request.data.message[0].file_video
-        audio = request.data.message[0].file_audio
-        document = request.data.message[0].file_document
-        emoji = request.data.message[0].emoji
-        user_uuid = request.data.user[0].uuid
-        client_id = request.data.message[0].client_id
-        message = []
-        data = None
+    return api.Response(type=request.type,
+                        data=data,
+                        errors=errors.result(),
+                        jsonapi=JSONAPI)
 
-        try:
-            self._db.add_message(flow_uuid,
-                                 user_uuid,
-                                 message_uuid,
-                                 self._current_time,
-                                 text,
-                                 picture,
-                                 video,
-                                 audio,
-                                 document,
-                                 emoji)
-        except (DatabaseWriteError,
-                DatabaseReadError) as ERROR:
-            errors = MTPErrorResponse("NOT_FOUND",
-                                      str(ERROR))
-        else:
-            message.append(api.MessageResponse(uuid=message_uuid,
-                                               client_id=client_id,
-                                               from_user=user_uuid,
-                                               from_flow=flow_uuid))
-            data = api.DataResponse(time=self._current_time,
-                                    message=message)
-            logger.success("\'_send_message\' executed successfully")
-            errors = MTPErrorResponse("OK")
 
-        return api.Response(type=request.type,
-                            data=data,
-                            errors=errors.result(),
-                            jsonapi=self.jsonapi)
+@handler("all_messages")
+def all_messages(ctx: RequestContext) -> api.Response:
+    """
+    Displays all messages of a specific flow.
+    Retrieves from database and issues them as an array consisting of JSON.
 
-    def _all_messages(self,
-                      request: api.Request) -> api.Response:
-        """
-        Displays all messages of a specific flow.
-        Retrieves from database and issues them as an array consisting of JSON.
+    Notes:
+        Identical concurrent requests share one reading of messages.
+    """
+
+    return coalesced_response(ctx, build_all_messages)
+
+
+def build_all_messages(ctx: RequestContext) -> api.Response:
+    """
+    Reads messages of flow from database for "all_messages".
+    """
+
+    request = ctx.request
+
+    flow_uuid = request.data.flow[0].uuid
+    flow = []
+    message = []
+    LIMIT_MESSAGES = ctx.config.limits.messages
+
+    if request.data.flow[0].message_start is None:
+        message_start = 0
+    else:
+        message_start = request.data.flow[0].message_start
+
+    if request.data.flow[0].message_end is None:
+        message_end = 100
+    else:
+        message_end = request.data.flow[0].message_end
+
+    message_volume = message_end - message_start
+    message_fields = projection(ctx,
+                                "message",
+                                MESSAGE_FIELDS)
+
+    def get_messages(db: SelectResults | MessageHistory | list[dict],
+                     end: int,
+                     start: int = 0) -> list[api.MessageResponse]:
         """
+        Converts the database object into a list.
+        List contains validation Message object.
 
-        flow_uuid = request.data.flow[0].uuid
-        flow = []
-        message = []
-        LIMIT_MESSAGES = self._config_option.limits.messages
+        Args:
+            db: database query result or recent messages from cache
+            end: last message number
+            start: first message number
 
-        if request.data.flow[0].message_start is None:
-            message_start = 0
-        else:
-            message_start = request.data.flow[0].message_start
+        Returns:
+            list contains of validated object
+        """
 
-        if request.data.flow[0].message_end is None:
-            message_end = 100
+        if isinstance(db, list):
+            fields = MESSAGE_FIELDS if message_fields is None \
+                else message_fields
+            extra = {"client_id": None} if message_fields is None else {}
+            return [api.MessageResponse(
+                **extra,
+                **{field: item[MESSAGE_COLUMNS.get(field, field)]
+                   for field in fields})
+                for item in db[start:end]]
+
+        if message_fields is not None:
+            return get_message_fields(ctx, message_fields,
+                                      request.data.time,
+                                      flow_uuid,
+                                      start,
+                                      end)
+
+        _list = []
+
+        for element in db[start:end]:
+            _list.append(api.MessageResponse(
+                uuid=element.uuid,
+                client_id=None,
+                text=element.text,
+                from_user=element.user.uuid,
+                time=element.time,
+                from_flow=element.flow.uuid,
+                file_picture=element.file_picture,
+                file_video=element.file_video,
+                file_audio=element.file_audio,
+                file_document=element.file_document,
+                emoji=element.emoji,
+                edited_time=element.edited_time,
+                edited_status=element.edited_status))
+        return _list
+
+    try:
+        # Last messages of active flow are served from memory
+        dbquery = ctx.database.get_recent_messages(flow_uuid,
+                                                   request.data.time)
+        if dbquery:
+            MESSAGE_COUNT = len(dbquery)
         else:
-            message_end = request.data.flow[0].message_end
-
-        message_volume = message_end - message_start
-
-        def get_messages(db: SelectResults,
-                         end: int,
-                         start: int = 0) -> list[api.MessageResponse]:
-            """
-            Converts the database object into a list.
-            List contains validation Message object.
-
-            Args:
-                db: database query result
-                end: last message number
-                start: first message number
-
-            Returns:
-                list contains of validated object
-            """
-
-            _list = []
-
-            for element in db[start:end]:
-                _list.append(api.MessageResponse(
-                    uuid=element.uuid,
-                    client_id=None,
-                    text=element.text,
-                    from_user=element.user.uuid,
-                    time=element.time,
-                    from_flow=element.flow.uuid,
-                    file_picture=element.file_picture,
-                    file_video=element.file_video,
-                    file_audio=element.file_audio,
-                    file_document=element.file_document,
-                    emoji=element.emoji,
-                    edited_time=element.edited_time,
-                    edited_status=element.edited_status))
-            return _list
-
-        try:
-            dbquery = self._db.get_message_by_more_time_and_flow(flow_uuid,
-                                                                 request.data.time)  # noqa
-            MESSAGE_COUNT = dbquery.count()
+            dbquery = ctx.database.get_message_history(flow_uuid,
+                                                       request.data.time)
+            # Counter of flow is upper bound of quantity of selected
+            # messages, so COUNT query is needed only for big flows
+            MESSAGE_COUNT = ctx.database.get_flow_by_uuid(
+                flow_uuid).message_count
+            if MESSAGE_COUNT > LIMIT_MESSAGES:
+                MESSAGE_COUNT = dbquery.count()
             dbquery[0]
-        except DatabaseReadError as flow_error:
-            errors = MTPErrorResponse("NOT_FOUND",
-                                      str(flow_error))
+    except DatabaseReadError as flow_error:
+        errors = MTPErrorResponse("NOT_FOUND",
+                                  str(flow_error))
+    else:
+        if MESSAGE_COUNT <= LIMIT_MESSAGES:
+            flow.append(api.FlowResponse(uuid=flow_uuid))
+            message = get_messages(dbquery,
+                                   LIMIT_MESSAGES)
+            errors = MTPErrorResponse("OK")
+            logger.success("\'all_messages\' executed successfully")
         else:
-            if MESSAGE_COUNT <= LIMIT_MESSAGES:
-                flow.append(api.FlowResponse(uuid=flow_uuid))
+            flow.append(api.FlowResponse(uuid=flow_uuid,
+                                         message_start=message_start,
+                                         message_end=MESSAGE_COUNT))
+            if message_volume <= LIMIT_MESSAGES:
                 message = get_messages(dbquery,
-                                       LIMIT_MESSAGES)
-                errors = MTPErrorResponse("OK")
-                logger.success("\'_all_messages\' executed successfully")
+                                       request.data.flow[0].message_end,
+                                       request.data.flow[0].message_start)
+                logger.success("\'all_messages\' executed successfully")
+                errors = MTPErrorResponse("PARTIAL_CONTENT")
             else:
-                flow.append(api.FlowResponse(uuid=flow_uuid,
-                                             message_start=message_start,
-                                             message_end=MESSAGE_COUNT))
-                if message_volume <= LIMIT_MESSAGES:
-                    message = get_messages(dbquery,
-                                           request.data.flow[0].message_end,
-                                           request.data.flow[0].message_start)
-                    logger.success("\'_all_messages\' executed successfully")
-                    errors = MTPErrorResponse("PARTIAL_CONTENT")
-                else:
-                    errors = MTPErrorResponse("FORBIDDEN",
-                                              "Requested more messages"
-                                              f" than server limit"
-                                              f" ({LIMIT_MESSAGES})")
-
-        data = api.DataResponse(time=self._current_time,
-                                flow=flow,
-                                message=message)
+                errors = MTPErrorResponse("FORBIDDEN",
+                                          "Requested more messages"
+                                          f" than server limit"
+                                          f" ({LIMIT_MESSAGES})")
 
-        return api.Response(type=request.type,
-                            data=data,
-                            errors=errors.result(),
-                            jsonapi=self.jsonapi)
+    data = api.DataResponse(time=ctx.current_time,
+                            flow=flow,
+                            message=message)
 
-    def _add_flow(self,
-                  request: api.Request) -> api.Response:
-        """
-        Allows to add a new flow to database.
-        """
+    return api.Response(type=request.type,
+                        data=data,
+                        errors=errors.result(),
+                        jsonapi=JSONAPI)
 
-        flow_uuid = str(uuid4().int)
-        owner = request.data.flow[0].owner
-        users = request.data.flow[0].users
-        flow_type = request.data.flow[0].type
-        flow = []
-
-        if flow_type not in ["chat",
-                             "group",
-                             "channel"]:
-            errors = MTPErrorResponse("BAD_REQUEST",
-                                      "Wrong flow type")
-        elif flow_type == 'chat' and len(users) != 2:
-            errors = MTPErrorResponse("BAD_REQUEST",
-                                      "Must be two users only")
-        else:
-            try:
-                self._db.add_flow(flow_uuid,
+
+@handler("add_flow")
+def add_flow(ctx: RequestContext) -> api.Response:
+    """
+    Allows to add a new flow to database.
+    """
+
+    request = ctx.request
+
+    flow_uuid = str(uuid4().int)
+    owner = request.data.flow[0].owner
+    users = request.data.flow[0].users
+    flow_type = request.data.flow[0].type
+    flow = []
+
+    if flow_type not in ["chat",
+                         "group",
+                         "channel"]:
+        errors = MTPErrorResponse("BAD_REQUEST",
+                                  "Wrong flow type")
+    elif flow_type == 'chat' and len(users) != 2:
+        errors = MTPErrorResponse("BAD_REQUEST",
+                                  "Must be two users only")
+    else:
+        try:
+            ctx.database.add_flow(flow_uuid,
                                   users,
-                                  self._current_time,
+                                  ctx.current_time,
                                   flow_type,
                                   request.data.flow[0].title,
                                   request.data.flow[0].info,
                                   owner)
-            except DatabaseWriteError as flow_error:
-                errors = MTPErrorResponse("NOT_FOUND",
-                                          str(flow_error))
-            else:
-                flow.append(api.FlowResponse(uuid=flow_uuid,
-                                             time=self._current_time,
-                                             type=request.data.flow[0].type,
-                                             title=request.data.flow[0].title,
-                                             info=request.data.flow[0].info,
-                                             owner=owner,
-                                             users=users))
-                errors = MTPErrorResponse("OK")
-                logger.success("\'_add_flow\' executed successfully")
+        except (DatabaseWriteError,
+                DatabaseReadError) as flow_error:
+            errors = MTPErrorResponse("NOT_FOUND",
+                                      str(flow_error))
+        else:
+            flow.append(api.FlowResponse(uuid=flow_uuid,
+                                         time=ctx.current_time,
+                                         type=request.data.flow[0].type,
+                                         title=request.data.flow[0].title,
+                                         info=request.data.flow[0].info,
+                                         owner=owner,
+                                         users=users))
+            errors = MTPErrorResponse("OK")
+            logger.success("\'add_flow\' executed successfully")
 
-        data = api.DataResponse(time=self._current_time,
-                                flow=flow)
+    data = api.DataResponse(time=ctx.current_time,
+                            flow=flow)
 
-        return api.Response(type=request.type,
-                            data=data,
-                            errors=errors.result(),
-                            jsonapi=self.jsonapi)
+    return api.Response(type=request.type,
+                        data=data,
+                        errors=errors.result(),
+                        jsonapi=JSONAPI)
 
-    def _all_flow(self,
-                  request: api.Request) -> api.Response:
-        """
-        Get a list of all flows and information about them.
-        """
 
-        flow = []
-        dbquery = self._db.get_all_flow()
-
-        if dbquery.count():
-            for element in dbquery:
-                flow.append(api.FlowResponse(
-                    uuid=element.uuid,
-                    time=element.time_created,
-                    type=element.flow_type,
-                    title=element.title,
-                    info=element.info,
-                    owner=element.owner,
-                    users=[item.uuid for item in element.users]))
-            errors = MTPErrorResponse("OK")
-            logger.success("\'_all_flow\' executed successfully")
-        else:
-            errors = MTPErrorResponse("NOT_FOUND")
+@handler("all_flow")
+def all_flow(ctx: RequestContext) -> api.Response:
+    """
+    Get a list of all flows and information about them.
 
-        data = api.DataResponse(time=self._current_time,
-                                flow=flow)
+    Notes:
+        Response is cached until flows or their members are changed.
+    """
 
-        return api.Response(type=request.type,
-                            data=data,
-                            errors=errors.result(),
-                            jsonapi=self.jsonapi)
+    return cached_response(ctx, build_all_flow)
 
-    def _user_info(self,
-                   request: api.Request) -> api.Response:
-        """
-        Provides information about all personal settings of user.
-        """
 
-        users_volume = len(request.data.user)
-        user = []
-        LIMIT_USERS = self._config_option.limits.users
+def build_all_flow(ctx: RequestContext) -> api.Response:
+    """
+    Reads list of all flows from database for "all_flow".
+    """
+
+    request = ctx.request
+
+    flow = []
+    dbquery = ctx.database.get_all_flow()
+
+    if dbquery.count():
+        for element in dbquery:
+            flow.append(api.FlowResponse(
+                uuid=element.uuid,
+                time=element.time_created,
+                type=element.flow_type,
+                title=element.title,
+                info=element.info,
+                owner=element.owner,
+                users=ctx.database.get_flow_member_uuids(element.uuid)))
+        errors = MTPErrorResponse("OK")
+        logger.success("\'all_flow\' executed successfully")
+    else:
+        errors = MTPErrorResponse("NOT_FOUND")
+
+    data = api.DataResponse(time=ctx.current_time,
+                            flow=flow)
+
+    return api.Response(type=request.type,
+                        data=data,
+                        errors=errors.result(),
+                        jsonapi=JSONAPI)
+
+
+@handler("user_info")
+def user_info(ctx: RequestContext) -> api.Response:
+    """
+    Provides information about all personal settings of user.
+    """
+
+    request = ctx.request
 
-        if users_volume <= LIMIT_USERS:
+    users_volume = len(request.data.user)
+    user = []
+    LIMIT_USERS = ctx.config.limits.users
+
+    user_fields = projection(ctx,
+                             "user",
+                             USER_INFO_FIELDS)
+
+    if users_volume <= LIMIT_USERS and user_fields is not None:
+        uuids = [element.uuid for element in request.data.user[1:]]
+        try:
+            found = ctx.database.get_user_fields(user_fields, uuids)
+        except DatabaseAccessError as user_info_error:
+            errors = MTPErrorResponse("UNKNOWN_ERROR",
+                                      str(user_info_error))
+        else:
+            user = [api.UserResponse(**item) for item in found]
+            if len(found) < len(set(uuids)):
+                errors = MTPErrorResponse("UNKNOWN_ERROR",
+                                          "User was not found")
+            else:
+                errors = MTPErrorResponse("OK")
+                logger.success("\'user_info\' executed successfully")
+    elif users_volume <= LIMIT_USERS:
+        uuids = [element.uuid for element in request.data.user[1:]]
+        try:
+            found = ctx.database.get_users_by_uuids(uuids)
+        except DatabaseAccessError as user_info_error:
+            errors = MTPErrorResponse("UNKNOWN_ERROR",
+                                      str(user_info_error))
+        else:
             errors = MTPErrorResponse("OK")
-            for element in request.data.user[1:]:
-                try:
-                    dbquery = self._db.get_user_by_uuid(element.uuid)
-                except (DatabaseReadError,
-                        DatabaseAccessError) as user_info_error:
+            for uuid in uuids:
+                dbquery = found.get(uuid)
+                if dbquery is None:
                     errors = MTPErrorResponse("UNKNOWN_ERROR",
-                                              str(user_info_error))
-                else:
-                    user.append(api.UserResponse(uuid=dbquery.uuid,
-                                                 login=dbquery.login,
-                                                 username=dbquery.username,
-                                                 avatar=dbquery.avatar,
-                                                 bio=dbquery.bio,
-                                                 is_bot=dbquery.is_bot))
-            logger.success("\'_user_info\' executed successfully")
+                                              f"User {uuid} was not found")
+                    continue
+                user.append(api.UserResponse(uuid=dbquery.uuid,
+                                             login=dbquery.login,
+                                             username=dbquery.username,
+                                             avatar=dbquery.avatar,
+                                             bio=dbquery.bio,
+                                             is_bot=dbquery.is_bot))
+            logger.success("\'user_info\' executed successfully")
+    else:
+        errors = MTPErrorResponse("TOO_MANY_REQUESTS",
+                                  f"Requested more {LIMIT_USERS}"
+                                  " users than server limit")
+
+    data = api.DataResponse(time=ctx.current_time,
+                            user=user)
+
+    return api.Response(type=request.type,
+                        data=data,
+                        errors=errors.result(),
+                        jsonapi=JSONAPI)
+
+
+@handler("authentication",
+         auth=False,
+         limited=True)
+def authentication(ctx: RequestContext) -> api.Response:
+    """
+    Performs authentication of registered client.
+    With issuance of a unique hash number of connection session.
+    During authentication password transmitted by client
+    and password contained in server database are verified.
+    """
+
+    request = ctx.request
+
+    login = request.data.user[0].login
+    password = request.data.user[0].password
+    user = []
+
+    if check_login(ctx.database, login):
+        dbquery = ctx.database.get_user_by_login(login)
+        # to check password, we use same module as for its
+        # hash generation. Specify password entered by user
+        # and hash of old password as parameters.
+        # After that, hashes are compared using "check_password" method.
+        generator = lib.Hash(password,
+                             dbquery.uuid,
+                             dbquery.salt,
+                             dbquery.key,
+                             dbquery.hash_password,
+                             **ctx.config.hash_size.hash_options())
+        if PASSWORDS.check_password(generator):
+            auth_id, token_ttl = get_signer(ctx.config).issue(
+                dbquery.uuid, ctx.current_time)
+            dbquery.set(auth_id=auth_id,
+                        token_ttl=token_ttl)
+            # Hash made by old function or with old cost is replaced
+            if generator.needs_rehash():
+                dbquery.hash_password = PASSWORDS.password_hash(generator)
+            ctx.database.invalidate_user(dbquery.uuid)
+            user.append(api.UserResponse(uuid=dbquery.uuid,
+                                         auth_id=auth_id,
+                                         token_ttl=token_ttl))
+            errors = MTPErrorResponse("OK")
+            logger.success("\'authentication\' executed successfully")
         else:
-            errors = MTPErrorResponse("TOO_MANY_REQUESTS",
-                                      f"Requested more {LIMIT_USERS}"
-                                      " users than server limit")
+            errors = MTPErrorResponse("UNAUTHORIZED")
+    else:
+        errors = MTPErrorResponse("NOT_FOUND")
 
-        data = api.DataResponse(time=self._current_time,
-                                user=user)
+    data = api.DataResponse(time=ctx.current_time,
+                            user=user)
 
-        return api.Response(type=request.type,
-                            data=data,
-                            errors=errors.result(),
-                            jsonapi=self.jsonapi)
+    return api.Response(type=request.type,
+                        data=data,
+                        errors=errors.result(),
+                        jsonapi=JSONAPI)
 
-    def _authentication(self,
-                        request: api.Request) -> api.Response:
-        """
-        Performs authentication of registered client.
-        With issuance of a unique hash number of connection session.
-        During authentication password transmitted by client
-        and password contained in server database are verified.
-        """
 
-        login = request.data.user[0].login
-        password = request.data.user[0].password
-        user = []
-
-        if self._check_login(login):
-            dbquery = self._db.get_user_by_login(login)
-            # to check password, we use same module as for its
-            # hash generation. Specify password entered by user
-            # and hash of old password as parameters.
-            # After that, hashes are compared using "check_password" method.
-            generator = lib.Hash(password,
-                                 dbquery.uuid,
-                                 dbquery.salt,
-                                 dbquery.key,
-                                 dbquery.hash_password)
-            if generator.check_password():
-                dbquery.auth_id = generator.auth_id()
-                user.append(api.UserResponse(uuid=dbquery.uuid,
-                                             auth_id=dbquery.auth_id))
-                errors = MTPErrorResponse("OK")
-                logger.success("\'_authentication\' executed successfully")
-            else:
-                errors = MTPErrorResponse("UNAUTHORIZED")
-        else:
-            errors = MTPErrorResponse("NOT_FOUND")
+@handler("refresh_token")
+def refresh_token(ctx: RequestContext) -> api.Response:
+    """
+    Gives out new signed token instead of token from request.
 
-        data = api.DataResponse(time=self._current_time,
-                                user=user)
+    Notes:
+        Token from request is revoked if it is signed. New token is
+        not saved in database.
+    """
 
-        return api.Response(type=request.type,
-                            data=data,
-                            errors=errors.result(),
-                            jsonapi=self.jsonapi)
+    request = ctx.request
+
+    uuid = request.data.user[0].uuid
+    signer = get_signer(ctx.config)
+    claims = signer.verify(request.data.user[0].auth_id)
+    if claims is not None:
+        REVOKED.revoke(claims,
+                       ctx.current_time)
+    auth_id, token_ttl = signer.issue(uuid,
+                                      ctx.current_time)
+    data = api.DataResponse(time=ctx.current_time,
+                            user=[api.UserResponse(uuid=uuid,
+                                                   auth_id=auth_id,
+                                                   token_ttl=token_ttl)])
+    errors = MTPErrorResponse("OK")
+    logger.success("\'refresh_token\' executed successfully")
+
+    return api.Response(type=request.type,
+                        data=data,
+                        errors=errors.result(),
+                        jsonapi=JSONAPI)
+
+
+@handler("revoke_token")
+def revoke_token(ctx: RequestContext) -> api.Response:
+    """
+    Revokes signed token from request before it expires.
 
-    def _delete_user(self,
-                     request: api.Request) -> api.Response:
-        """
-        Irretrievably deletes the user from database.
-        """
+    Notes:
+        Token which is not signed is kept in database and can't be
+        revoked, it is changed by next authentication.
+    """
 
-        uuid = str(uuid4().int)
-        login = request.data.user[0].login
-        password = request.data.user[0].password
+    request = ctx.request
 
-        try:
-            dbquery = self._db.get_user_by_login_and_password(login,
-                                                              password)
-        except (DatabaseReadError,
-                DatabaseAccessError) as not_found:
-            errors = MTPErrorResponse("NOT_FOUND",
-                                      str(not_found))
-        else:
-            dbquery.login = "User deleted"
-            dbquery.password = uuid
-            dbquery.hash_password = uuid
-            dbquery.username = "User deleted"
-            dbquery.auth_id = uuid
-            dbquery.email = ""
-            dbquery.avatar = b""
-            dbquery.bio = "deleted"
-            dbquery.salt = b"deleted"
-            dbquery.key = b"deleted"
-            errors = MTPErrorResponse("OK")
-            logger.success("\'_delete_user\' executed successfully")
+    claims = get_signer(ctx.config).verify(request.data.user[0].auth_id)
+    if claims is None:
+        errors = MTPErrorResponse("BAD_REQUEST",
+                                  "Only signed token can be revoked")
+    else:
+        REVOKED.revoke(claims,
+                       ctx.current_time)
+        errors = MTPErrorResponse("OK")
+        logger.success("\'revoke_token\' executed successfully")
 
-        return api.Response(type=request.type,
-                            data=None,
-                            errors=errors.result(),
-                            jsonapi=self.jsonapi)
+    return api.Response(type=request.type,
+                        data=None,
+                        errors=errors.result(),
+                        jsonapi=JSONAPI)
 
-    def _delete_message(self,
-                        request: api.Request) -> api.Response:
-        """
-        Deletes the message from database Message table by its ID.
-        """
 
-        message_uuid = request.data.message[0].uuid
+@handler("delete_user")
+def delete_user(ctx: RequestContext) -> api.Response:
+    """
+    Irretrievably deletes the user from database.
+    """
+
+    request = ctx.request
 
-        try:
-            dbquery = self._db.get_message_by_uuid(message_uuid)
-        except (DatabaseReadError,
-                DatabaseAccessError) as not_found:
-            errors = MTPErrorResponse("NOT_FOUND",
-                                      str(not_found))
-        else:
-            dbquery.text = "Message deleted"
-            dbquery.file_picture = b''
-            dbquery.file_video = b''
-            dbquery.file_audio = b''
-            dbquery.file_document = b''
-            dbquery.emoji = b''
-            dbquery.edited_time = self._current_time
-            dbquery.edited_status = True
-            errors = MTPErrorResponse("OK")
-            logger.success("\'_delete_message\' executed successfully")
+    uuid = str(uuid4().int)
+    login = request.data.user[0].login
+    password = request.data.user[0].password
 
-        return api.Response(type=request.type,
-                            data=None,
-                            errors=errors.result(),
-                            jsonapi=self.jsonapi)
+    try:
+        dbquery = ctx.database.get_user_by_login_and_password(login,
+                                                              password)
+    except (DatabaseReadError,
+            DatabaseAccessError) as not_found:
+        errors = MTPErrorResponse("NOT_FOUND",
+                                  str(not_found))
+    else:
+        old_login = dbquery.login
+        dbquery.login = "User deleted"
+        dbquery.password = uuid
+        dbquery.hash_password = uuid
+        dbquery.username = "User deleted"
+        dbquery.auth_id = uuid
+        dbquery.email = ""
+        dbquery.avatar = b""
+        dbquery.bio = "deleted"
+        dbquery.salt = b"deleted"
+        dbquery.key = b"deleted"
+        dbquery.deleted_time = ctx.current_time
+        ctx.database.invalidate_user(dbquery.uuid,
+                                     old_login,
+                                     changed=True)
+        REVOKED.revoke_user(dbquery.uuid,
+                            ctx.current_time,
+                            ctx.current_time + ctx.config.auth.token_ttl)
+        errors = MTPErrorResponse("OK")
+        logger.success("\'delete_user\' executed successfully")
 
-    def _edited_message(self,
-                        request: api.Request) -> api.Response:
-        """
-        Changes text and time in database Message table.
-        Value of edited_status column changes from None to True.
-        """
+    return api.Response(type=request.type,
+                        data=None,
+                        errors=errors.result(),
+                        jsonapi=JSONAPI)
 
-        message_uuid = request.data.message[0].uuid
 
-        try:
-            dbquery = self._db.get_message_by_uuid(message_uuid)
-        except (DatabaseReadError,
-                DatabaseAccessError) as not_found:
-            errors = MTPErrorResponse("NOT_FOUND",
-                                      str(not_found))
-        else:
-            dbquery.text = request.data.message[0].text
-            dbquery.edited_time = self._current_time
-            dbquery.edited_status = True
-            errors = MTPErrorResponse("OK")
-            logger.success("\'_edited_message\' executed successfully")
+@handler("delete_message")
+def delete_message(ctx: RequestContext) -> api.Response:
+    """
+    Deletes the message from database Message table by its ID.
+    """
 
-        return api.Response(type=request.type,
-                            data=None,
-                            errors=errors.result(),
-                            jsonapi=self.jsonapi)
+    request = ctx.request
+
+    message_uuid = request.data.message[0].uuid
+
+    try:
+        dbquery = ctx.database.get_message_by_uuid(message_uuid)
+    except (DatabaseReadError,
+            DatabaseAccessError) as not_found:
+        errors = MTPErrorResponse("NOT_FOUND",
+                                  str(not_found))
+    else:
+        dbquery.text = "Message deleted"
+        dbquery.file_picture = b''
+        dbquery.file_video = b''
+        dbquery.file_audio = b''
+        dbquery.file_document = b''
+        dbquery.emoji = b''
+        dbquery.edited_time = ctx.current_time
+        dbquery.edited_status = True
+        dbquery.deleted_time = ctx.current_time
+        ctx.database.update_recent_message(dbquery)
+        errors = MTPErrorResponse("OK")
+        logger.success("\'delete_message\' executed successfully")
 
-    def _ping_pong(self,
-                   request: api.Request) -> api.Response:
-        """
-        Simple response/request communication between server and client.
-        """
+    return api.Response(type=request.type,
+                        data=None,
+                        errors=errors.result(),
+                        jsonapi=JSONAPI)
 
+
+@handler("edited_message")
+def edited_message(ctx: RequestContext) -> api.Response:
+    """
+    Changes text and time in database Message table.
+    Value of edited_status column changes from None to True.
+    """
+
+    request = ctx.request
+
+    message_uuid = request.data.message[0].uuid
+
+    try:
+        dbquery = ctx.database.get_message_by_uuid(message_uuid)
+    except (DatabaseReadError,
+            DatabaseAccessError) as not_found:
+        errors = MTPErrorResponse("NOT_FOUND",
+                                  str(not_found))
+    else:
+        dbquery.text = request.data.message[0].text
+        dbquery.edited_time = ctx.current_time
+        dbquery.edited_status = True
+        ctx.database.update_recent_message(dbquery)
         errors = MTPErrorResponse("OK")
-        logger.success("\'_ping_pong\' executed successfully")
+        logger.success("\'edited_message\' executed successfully")
+
+    return api.Response(type=request.type,
+                        data=None,
+                        errors=errors.result(),
+                        jsonapi=JSONAPI)
+
 
-        return api.Response(type=request.type,
-                            data=None,
-                            errors=errors.result(),
-                            jsonapi=self.jsonapi)
+@handler("ping_pong")
+def ping_pong(ctx: RequestContext) -> api.Response:
+    """
+    Simple response/request communication between server and client.
+    """
+
+    request = ctx.request
+
+    errors = MTPErrorResponse("OK")
+    logger.success("\'ping_pong\' executed successfully")
+
+    return api.Response(type=request.type,
+                        data=None,
+                        errors=errors.result(),
+                        jsonapi=JSONAPI)
+
+
+class MTProtocol:
+    """
+    Processing requests and forming response according to "MTP" protocol.
+
+    Notes:
+        Requests are processed by handlers registered in
+        ``mod.protocol.registry``, class is a wrapper which holds
+        state of one request.
+
+    See Also:
+        Read actual description of protocol:
+
+        https://github.com/MoreliaTalk/morelia_protocol/blob/master/README.md
+
+    Args:
+        request: JSON request from websocket client
+        database: object - database connection point
+        config_option: server settings
+        session: state of websocket connection negotiated by "hello",
+                 if None then used new session
+
+    Returns:
+        returns class api.Response
+    """
 
-    def _errors(self,
-                status: str = None,
-                add_info: Union[Exception, str, None] = None,
-                request: api.Request = None) -> api.Response:
+    def __init__(self,
+                 request: Any,
+                 database: DBHandler,
+                 config_option: ConfigModel,
+                 session: Optional[Session] = None):
+        self._context = RequestContext(database,
+                                       config_option,
+                                       Session() if session is None
+                                       else session)
+        self.response = process(request, self._context)
+
+    def get_response(self,
+                     response: api.Response = None) -> str:
         """
-        Handles cases when a request to server is not recognized by it.
-        Get a standard answer type: error, which contains an object
-        with a description of error.
+        Generates a JSON-object containing result of an instance json.
 
-        Args:
-            status: error status name in UPPERCASE
-            add_info: additional information which added to error message
-            request: request from client in dict format
+        Returns:
+            json-object which contains validated response
         """
 
-        if request is not None:
-            response = request.type
+        if response is None:
+            return encode_response(self._context, self.response)
         else:
-            response = "error"
+            return encode_response(self._context, response)
+
+    def _check_auth(self,
+                    uuid: str,
+                    auth_id: str) -> AuthResult:
+        """
+        Checking user authentication.
 
-        if status is None:
-            status = "METHOD_NOT_ALLOWED"
+        Args:
+            uuid: user identification number
+            auth_id: authentication token
 
-        errors = MTPErrorResponse(status,
-                                  add_info)
-        logger.success("\'_errors\' executed successfully")
+        Returns:
+            result of checking
+        """
 
-        return api.Response(type=response,
-                            data=None,
-                            errors=errors.result(),
-                            jsonapi=self.jsonapi)
+        return check_auth(self._context.database,
+                          uuid,
+                          auth_id,
+                          get_signer(self._context.config))
 
-    def _check_protocol_version(self,
-                                request: api.Request) -> bool:
+    def _check_login(self,
+                     login: str) -> bool:
         """
-        Checks the version of the protocol in the client request.
+        Checks database for a user with the same login.
+
+        Args:
+            login: user login
 
         Returns:
-            True if client protocol version > minimum and < maximum
-            of supported by server.
+            True if there is such a user or False if no such user exists.
         """
 
-        MIN = self._config_option.api.min_version
-        MAX = self._config_option.api.max_version
-        version = request.jsonapi.version
-        if MIN <= version <= MAX:
-            return True
-        else:
-            return False
+        return check_login(self._context.database,
+                           login)
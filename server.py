@@ -1,16 +1,20 @@
+import json
 import sys
 from datetime import datetime
 from json import JSONDecodeError
 
 from loguru import logger
 from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
 from starlette.websockets import WebSocket
 from starlette.websockets import WebSocketDisconnect
 from mod.config.handler import read_config
 from mod.config.models import ConfigModel
 from mod.db.dbhandler import DBHandler
 from mod.log_handler import add_logging
-from mod.protocol.worker import MTProtocol
+from mod.protocol import worker
+from mod.protocol.registry import RequestContext
+from mod.protocol.session import Session
 
 
 class MoreliaServer:
@@ -22,22 +26,64 @@ class MoreliaServer:
         self._config_options = read_config()
 
         add_logging(self._config_options)
-
-        self._database = DBHandler(uri=self._config_options.database.url)
+        if not self._config_options.auth.secret_keys:
+            logger.warning("Secret keys of tokens are not set, tokens"
+                           " become invalid after restart")
+
+        db = self._config_options.database
+        sqlite = self._config_options.sqlite
+        self._database = DBHandler(uri=db.url,
+                                   pool_min_size=db.pool_min_size,
+                                   pool_max_size=db.pool_max_size,
+                                   pool_timeout=db.pool_timeout,
+                                   pool_per_thread=db.pool_per_thread,
+                                   sqlite_pragmas=sqlite.pragmas(),
+                                   cache_enabled=db.cache_enabled,
+                                   cache_max_entries=db.cache_max_entries,
+                                   cache_ttl=db.cache_ttl,
+                                   metrics_enabled=db.metrics_enabled,
+                                   slow_query=db.slow_query,
+                                   identity_cache_size=db.identity_cache_size,
+                                   membership_index=db.membership_index,
+                                   recent_messages=db.recent_messages,
+                                   recent_cache_bytes=db.recent_cache_bytes)
         self._database.create_table()
+        self._database.load_membership()
 
         self._starlette_app = Starlette()
 
         self._starlette_app.add_websocket_route("/ws", self._ws_endpoint)
         self._starlette_app.add_event_handler("startup", self._on_start)
+        self._starlette_app.add_event_handler("shutdown", self._on_stop)
 
     def get_starlette_app(self):
         return self._starlette_app
 
     def _on_start(self):
+        worker.PASSWORDS.start(self._config_options.hash_size.kdf_processes)
+        database = self._config_options.database
+        if database.write_window > 0:
+            self._database.start_writer(database.write_window,
+                                        database.write_batch_size)
+        if database.archive_after > 0:
+            self._database.start_archiver(database.archive_after,
+                                          database.archive_interval,
+                                          database.archive_batch_size)
+        if database.compact_interval > 0:
+            self._database.start_compactor(database.compact_after,
+                                           database.compact_interval,
+                                           database.compact_batch_size,
+                                           database.vacuum_pages)
         logger.info("Server started")
         logger.info(f"Started time {datetime.now()}")
 
+    def _on_stop(self):
+        self._database.stop_writer()
+        self._database.stop_archiver()
+        self._database.stop_compactor()
+        worker.PASSWORDS.close()
+        logger.info("Server stopped")
+
     async def _ws_endpoint(self, websocket: WebSocket):
         """
         Responsible for establishing a websocket connection.
@@ -45,15 +91,18 @@ class MoreliaServer:
         Notes:
             Waiting for client to connect via websockets, after which receive a
             request from client as a JSON-object create request object and pass
-            to class MainHandler.
+            to handler registered for type of request.
 
-            After MTProtocol or MatrixProtocol processing request, "get_response"
-            method generates response in JSON-object format.
+            After handler processing request, "encode_response" function
+            generates response in JSON-object format.
 
             After disconnecting the client (by decision of client or error)
             must interrupt cycle otherwise the next clients will not be able
             to connect.
 
+            Frames larger than `limits.frame_size` are rejected before
+            decoding JSON, client receive error with status code 413.
+
             `code = 1000` - normal session termination
 
         Args:
@@ -65,24 +114,42 @@ class MoreliaServer:
 
         # Waiting for the client to connect via websockets
         await websocket.accept()
+        session = Session()
         if websocket.client is not None:
+            session.host = websocket.client.host
             logger.info("".join(("Clients information: ",
                                  "host: ", str(websocket.client.host),
                                  " port: ", str(websocket.client.port))))
         logger.debug(f"Websocket scope: {str(websocket.scope)}")
+        frame_size = self._config_options.limits.frame_size
         while True:
             try:
-                # Receive a request from the client as a JSON object
-                data = await websocket.receive_json()
+                # Receive a request from the client and check it size
+                # before decode JSON object. Uvicorn drops larger
+                # frames when it is started with "--ws-max-size"
+                raw_data = await websocket.receive_text()
+                size = self._frame_size(raw_data, frame_size)
+                if size > frame_size:
+                    logger.info(f"Request size {size} more than "
+                                f"server limit ({frame_size})")
+                    await websocket.send_text(self._oversize_response())
+                    continue
+                data = json.loads(raw_data)
                 logger.success("Receive a request from client")
                 logger.debug(f"Request: {str(data)}")
-                # create a "client" object and pass the request body to
-                # it as a parameter. The "get_response" method generates
-                # a response in JSON-object format.
-                request = MTProtocol(request=data,
-                                     database=self._database,
-                                     config_option=self._config_options)
-                await websocket.send_text(request.get_response())
+                # create a request context and pass the request body to
+                # registered handler. The "encode_response" function
+                # generates a response in JSON-object format.
+                context = RequestContext(self._database,
+                                         self._config_options,
+                                         session)
+                # Request is processed in thread, so requests from
+                # different clients wait for database at the same time
+                response = await run_in_threadpool(worker.process,
+                                                   data,
+                                                   context)
+                await websocket.send_text(worker.encode_response(context,
+                                                                 response))
                 logger.info("Response sent to client")
             # After disconnecting the client (by the decision of the client,
             # the error) must interrupt the cycle otherwise the next clients
@@ -102,10 +169,51 @@ class MoreliaServer:
                     await websocket.close(CODE)
                     logger.info(f"Close with code: {CODE}")
 
+    @staticmethod
+    def _frame_size(raw_data: str,
+                    limit: int) -> int:
+        """
+        Gives out size of frame in bytes.
+
+        Notes:
+            UTF-8 takes from 1 to 4 bytes for character, so frame is
+            encoded only when its size can't be known from length.
+
+        Args:
+            raw_data: text of frame
+            limit: maximum size of frame in bytes
+
+        Returns:
+            length of text if it is enough to compare frame with
+            limit, otherwise size of frame in bytes
+        """
+
+        if len(raw_data) > limit or len(raw_data) * 4 <= limit:
+            return len(raw_data)
+        return len(raw_data.encode("utf-8"))
+
+    def _oversize_response(self) -> str:
+        """
+        Generates an error response for request that exceeds frame size.
+
+        Returns:
+            json-object which contains validated response
+        """
+
+        detail = ("Request larger than server limit "
+                  f"({self._config_options.limits.frame_size})")
+        response = worker.error_response("REQUEST_ENTITY_TOO_LARGE",
+                                         detail)
+        return response.json()
+
+
 if __name__ == "__main__":
+    # Websocket frames are limited by uvicorn with size from config
+    frame_size = read_config().limits.frame_size
     print("to start the server, write the following command in the console:")
     print("uvicorn server:app --host 0.0.0.0 --port 8000 --reload "
-          "--use-colors --http h11 --ws websockets &")
+          "--use-colors --http h11 --ws websockets "
+          f"--ws-max-size {frame_size} &")
 
 else:
     module_that_imported_use_uvicorn = bool(sys.modules.get("uvicorn"))
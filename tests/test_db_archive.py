@@ -0,0 +1,189 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import threading
+import unittest
+
+from loguru import logger
+
+from mod.db.archive import MessageHistory
+from mod.db.dbhandler import DatabaseReadError
+from mod.db.dbhandler import DBHandler
+from mod.db import models
+from mod.db.periodic import PeriodicTask
+
+
+class Part(list):
+    def count(self):
+        self.counted = True
+        return len(self)
+
+
+class TestMessageHistory(unittest.TestCase):
+    def setUp(self):
+        self.archive = Part([1, 2, 3])
+        self.hot = Part([4, 5])
+        self.history = MessageHistory(self.archive, self.hot)
+
+    def test_count(self):
+        self.assertEqual(self.history.count(), 5)
+
+    def test_iter(self):
+        self.assertEqual(list(self.history), [1, 2, 3, 4, 5])
+
+    def test_slice(self):
+        self.assertEqual(self.history[0:5], [1, 2, 3, 4, 5])
+        self.assertEqual(self.history[2:4], [3, 4])
+        self.assertEqual(self.history[3:], [4, 5])
+        self.assertEqual(self.history[:2], [1, 2])
+        self.assertEqual(self.history[10:20], [])
+
+    def test_last_part_not_counted(self):
+        self.history[1:4]
+        self.assertFalse(hasattr(self.hot, "counted"))
+
+    def test_index(self):
+        self.assertEqual(self.history[0], 1)
+        self.assertEqual(self.history[4], 5)
+        self.assertRaises(IndexError, self.history.__getitem__, 5)
+
+    def test_wrong_slice(self):
+        self.assertRaises(ValueError, self.history.__getitem__,
+                          slice(0, 5, 2))
+        self.assertRaises(ValueError, self.history.__getitem__,
+                          slice(-1, None))
+
+
+class TestPeriodicTask(unittest.TestCase):
+    def test_wrong_interval(self):
+        self.assertRaises(ValueError, PeriodicTask, lambda: None, 0)
+
+    def test_call(self):
+        called = threading.Event()
+        task = PeriodicTask(called.set, 0.01)
+        task.start()
+        self.assertTrue(called.wait(5))
+        self.assertTrue(task.running)
+        task.stop()
+        self.assertFalse(task.running)
+        self.assertGreaterEqual(task.calls, 1)
+
+    def test_error_does_not_stop_task(self):
+        called = threading.Event()
+
+        def action():
+            if task.calls == 1:
+                raise RuntimeError("action failed")
+            called.set()
+
+        logger.remove()
+        task = PeriodicTask(action, 0.01)
+        task.start()
+        self.assertTrue(called.wait(5))
+        task.stop()
+        self.assertEqual(task.failures, 1)
+
+
+class TestDBHandlerArchive(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = DBHandler(uri="sqlite:/:memory:")
+
+    def setUp(self):
+        self.db.create_table()
+        self.db.add_user(uuid="123456",
+                         login="login",
+                         password="password")
+        self.db.add_flow(uuid="07d949",
+                         users=["123456"])
+        self.db.add_messages([{"flow_uuid": "07d949",
+                               "user_uuid": "123456",
+                               "message_uuid": str(number),
+                               "text": f"text {number}",
+                               "time": number}
+                              for number in range(10)])
+
+    def tearDown(self):
+        self.db.stop_archiver()
+        self.db.delete_table()
+
+    def test_archive_messages(self):
+        self.assertEqual(self.db.archive_messages(6, batch_size=4), 4)
+        self.assertEqual(self.db.archive_messages(6, batch_size=4), 2)
+        self.assertEqual(self.db.archive_messages(6, batch_size=4), 0)
+        self.assertEqual(models.Message.select(
+            connection=self.db.connection).count(), 4)
+        self.assertEqual(models.ArchivedMessage.select(
+            connection=self.db.connection).count(), 6)
+
+    def test_counters_not_changed(self):
+        self.db.archive_messages(6)
+        self.assertEqual(self.db.get_table_count().message_count, 10)
+        flow = self.db.get_flow_by_uuid("07d949")
+        self.assertEqual(flow.message_count, 10)
+
+    def test_get_message_by_uuid(self):
+        self.db.get_message_by_uuid("1")
+        self.db.archive_messages(6)
+        dbquery = self.db.get_message_by_uuid("1")
+        self.assertIsInstance(dbquery, models.ArchivedMessage)
+        self.assertEqual(dbquery.text, "text 1")
+        self.assertEqual(dbquery.user.uuid, "123456")
+        self.assertRaises(DatabaseReadError,
+                          self.db.get_message_by_uuid,
+                          "wrong")
+
+    def test_update_archived_message(self):
+        self.db.archive_messages(6)
+        self.db.update_message("1",
+                               text="edited")
+        self.assertEqual(self.db.get_message_by_uuid("1").text, "edited")
+
+    def test_get_message_history(self):
+        self.db.archive_messages(6)
+        dbquery = self.db.get_message_history("07d949", 2)
+        self.assertEqual(dbquery.count(), 8)
+        self.assertEqual([item.uuid for item in dbquery[3:6]],
+                         ["5", "6", "7"])
+
+    def test_get_message_fields(self):
+        self.db.archive_messages(6)
+        dbquery = self.db.get_message_fields(["uuid"], 0, "07d949", 4, 8)
+        self.assertEqual([item["uuid"] for item in dbquery],
+                         ["4", "5", "6", "7"])
+        dbquery = self.db.get_message_fields(["uuid"], 0, "07d949", 7)
+        self.assertEqual([item["uuid"] for item in dbquery],
+                         ["7", "8", "9"])
+        dbquery = self.db.get_message_fields(["uuid"], 0, "07d949", 0, 2)
+        self.assertEqual([item["uuid"] for item in dbquery],
+                         ["0", "1"])
+
+    def test_archive_old_messages(self):
+        self.assertEqual(self.db.archive_old_messages(1, batch_size=3), 10)
+        self.assertEqual(models.Message.select(
+            connection=self.db.connection).count(), 0)
+
+    def test_start_archiver(self):
+        self.db.start_archiver(1, interval=0.01)
+        self.assertTrue(self.db.archiver.running)
+        self.db.stop_archiver()
+        self.assertIsNone(self.db.archiver)
@@ -0,0 +1,116 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import time
+import unittest
+
+import sqlobject as orm
+
+from mod.db import models
+from mod.db.cache import BoundedCache
+from mod.db.cache import BoundedCacheSet
+
+
+class Row:
+    def __init__(self):
+        self.expired = False
+
+    def expire(self):
+        self.expired = True
+
+
+class TestBoundedCache(unittest.TestCase):
+    def put(self, cache, id_, obj):
+        self.assertIsNone(cache.get(id_))
+        cache.put(id_, obj)
+        cache.finishPut()
+
+    def test_hit_and_miss(self):
+        cache = BoundedCache(max_entries=2)
+        row = Row()
+        self.put(cache, 1, row)
+        self.assertIs(cache.get(1), row)
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_lru_eviction(self):
+        cache = BoundedCache(max_entries=2)
+        rows = [Row() for _ in range(3)]
+        self.put(cache, 1, rows[0])
+        self.put(cache, 2, rows[1])
+        cache.get(1)
+        self.put(cache, 3, rows[2])
+        self.assertEqual(list(cache.cache), [1, 3])
+        self.assertEqual(cache.stats()["evictions"], 1)
+        # Evicted row is still returned while it is used
+        self.assertIs(cache.get(2), rows[1])
+
+    def test_evicted_row_collected(self):
+        cache = BoundedCache(max_entries=1)
+        self.put(cache, 1, Row())
+        self.put(cache, 2, Row())
+        self.assertIsNone(cache.get(1))
+        cache.finishPut()
+
+    def test_ttl(self):
+        cache = BoundedCache(ttl=0.01)
+        row = Row()
+        self.put(cache, 1, row)
+        time.sleep(0.02)
+        self.assertIs(cache.get(1), row)
+        self.assertTrue(row.expired)
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_disabled(self):
+        cache = BoundedCache(cache=False)
+        row = Row()
+        self.put(cache, 1, row)
+        self.assertIs(cache.get(1), row)
+        self.assertEqual(cache.stats()["size"], 0)
+
+
+class TestBoundedCacheSet(unittest.TestCase):
+    def setUp(self):
+        self.connection = orm.connectionForURI("sqlite:/:memory:",
+                                               cache=False)
+        self.connection.cache = BoundedCacheSet(max_entries=2)
+        models.Flow.createTable(connection=self.connection)
+
+    def tearDown(self):
+        models.Flow.dropTable(connection=self.connection)
+        self.connection.close()
+
+    def test_rows_of_table(self):
+        ids = [models.Flow(uuid=str(number),
+                           connection=self.connection).id
+               for number in range(3)]
+        flow = models.Flow.get(ids[2], connection=self.connection)
+        self.assertEqual(flow.uuid, "2")
+        stats = self.connection.cache.stats()["Flow"]
+        self.assertEqual(stats["size"], 2)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import unittest
+
+from mod.db.dbhandler import DatabaseReadError
+from mod.db.dbhandler import DBHandler
+from mod.db.identity import IdentityCache
+from mod.db.identity import UserIdentity
+
+
+class TestIdentityCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = IdentityCache(max_entries=2)
+        self.first = UserIdentity("1", "first", "auth_1")
+        self.second = UserIdentity("2", "second", "auth_2")
+
+    def test_wrong_size(self):
+        self.assertRaises(ValueError, IdentityCache, 0)
+
+    def test_get(self):
+        self.cache.put(self.first, self.cache.version)
+        self.assertEqual(self.cache.get("1"), self.first)
+        self.assertIsNone(self.cache.get("2"))
+        self.assertIsNone(self.cache.get_by_login("first"))
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+        self.assertAlmostEqual(stats["hit_rate"], 1 / 3)
+
+    def test_get_by_login(self):
+        self.cache.put(self.first, self.cache.version, by_login=True)
+        self.assertEqual(self.cache.get_by_login("first"), self.first)
+
+    def test_lru_eviction(self):
+        third = UserIdentity("3", "third", None)
+        self.cache.put(self.first, self.cache.version, by_login=True)
+        self.cache.put(self.second, self.cache.version)
+        self.cache.get("1")
+        self.cache.put(third, self.cache.version)
+        self.assertIsNone(self.cache.get("2"))
+        self.assertEqual(self.cache.get_by_login("first"), self.first)
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_invalidate(self):
+        self.cache.put(self.first, self.cache.version, by_login=True)
+        self.cache.put(self.second, self.cache.version, by_login=True)
+        self.cache.invalidate("1")
+        self.cache.invalidate(login="second")
+        self.assertIsNone(self.cache.get("1"))
+        self.assertIsNone(self.cache.get_by_login("first"))
+        self.assertIsNone(self.cache.get("2"))
+        self.assertEqual(self.cache.stats()["invalidations"], 2)
+
+    def test_put_after_invalidation_is_ignored(self):
+        version = self.cache.version
+        self.cache.invalidate("1")
+        self.cache.put(self.first, version)
+        self.assertIsNone(self.cache.get("1"))
+
+    def test_clear(self):
+        self.cache.put(self.first, self.cache.version, by_login=True)
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()["size"], 0)
+        self.assertIsNone(self.cache.get_by_login("first"))
+
+
+class TestDBHandlerIdentity(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = DBHandler(uri="sqlite:/:memory:")
+
+    def setUp(self):
+        self.db.create_table()
+        self.db.add_user(uuid="123456",
+                         login="login",
+                         password="password",
+                         auth_id="auth_id")
+
+    def tearDown(self):
+        self.db.delete_table()
+
+    def test_cached(self):
+        self.db.get_user_identity("123456")
+        misses = self.db.identity_stats()["misses"]
+        identity = self.db.get_user_identity("123456")
+        self.assertEqual(identity, UserIdentity("123456",
+                                                "login",
+                                                "auth_id"))
+        self.assertEqual(self.db.identity_stats()["misses"], misses)
+
+    def test_not_found(self):
+        self.assertRaises(DatabaseReadError,
+                          self.db.get_user_identity,
+                          "wrong")
+        self.assertRaises(DatabaseReadError,
+                          self.db.get_user_identity_by_login,
+                          "wrong")
+
+    def test_update_user(self):
+        self.db.get_user_identity("123456")
+        self.db.get_user_identity_by_login("login")
+        self.db.update_user("123456",
+                            login="new_login",
+                            auth_id="new_auth_id")
+        self.assertEqual(self.db.get_user_identity("123456").auth_id,
+                         "new_auth_id")
+        self.assertRaises(DatabaseReadError,
+                          self.db.get_user_identity_by_login,
+                          "login")
+        self.assertEqual(
+            self.db.get_user_identity_by_login("new_login").uuid,
+            "123456")
+
+    def test_add_user_with_same_login(self):
+        self.db.get_user_identity_by_login("login")
+        self.db.add_user(uuid="654321",
+                         login="login",
+                         password="password")
+        self.assertRaises(DatabaseReadError,
+                          self.db.get_user_identity_by_login,
+                          "login")
+
+    def test_delete_table(self):
+        self.db.get_user_identity("123456")
+        self.db.delete_table()
+        self.db.create_table()
+        self.assertRaises(DatabaseReadError,
+                          self.db.get_user_identity,
+                          "123456")
+
+    def test_disabled(self):
+        db = DBHandler(uri="sqlite:/:memory:",
+                       identity_cache_size=0)
+        self.assertIsNone(db.identities)
+        self.assertEqual(db.identity_stats(), {})
+        self.assertEqual(db.get_user_identity("123456").login, "login")
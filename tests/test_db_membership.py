@@ -0,0 +1,182 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import unittest
+
+from mod.db import models
+from mod.db.dbhandler import DatabaseReadError
+from mod.db.dbhandler import DBHandler
+from mod.db.membership import MembershipIndex
+
+
+def loader():
+    flows = [(1, "flow_1"), (2, "flow_2")]
+    users = [(10, "user_10"), (11, "user_11"), (12, "user_12")]
+    members = [(1, 11), (1, 10), (2, 10), (1, 10), (3, 10)]
+    return flows, users, members
+
+
+class TestMembershipIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = MembershipIndex(loader)
+
+    def test_loaded_on_first_use(self):
+        self.assertFalse(self.index.loaded)
+        self.assertEqual(self.index.users_of("flow_1"),
+                         ["user_10", "user_11"])
+        self.assertTrue(self.index.loaded)
+        self.assertEqual(self.index.flows_of("user_10"),
+                         ["flow_1", "flow_2"])
+        self.assertEqual(self.index.flows_of("user_12"), [])
+
+    def test_unknown(self):
+        self.assertIsNone(self.index.users_of("flow_3"))
+        self.assertIsNone(self.index.flows_of("user_13"))
+        self.assertIsNone(self.index.is_member("flow_3", "user_10"))
+
+    def test_is_member(self):
+        self.assertTrue(self.index.is_member("flow_1", "user_11"))
+        self.assertFalse(self.index.is_member("flow_2", "user_11"))
+        self.assertFalse(self.index.is_member("flow_2", "user_13"))
+
+    def test_changes_before_load_are_skipped(self):
+        self.index.add_flow(3, "flow_3", [(10, "user_10")])
+        self.assertIsNone(self.index.users_of("flow_3"))
+
+    def test_add_flow_and_members(self):
+        self.index.load()
+        self.index.add_user(13, "user_13")
+        self.index.add_flow(3, "flow_3", [(13, "user_13")])
+        self.index.add_members(3, [(10, "user_10"), (13, "user_13")])
+        self.assertEqual(self.index.users_of("flow_3"),
+                         ["user_10", "user_13"])
+        self.assertEqual(self.index.flows_of("user_13"), ["flow_3"])
+
+    def test_remove_members(self):
+        self.index.load()
+        self.index.remove_members(1, [10, 12])
+        self.assertEqual(self.index.users_of("flow_1"), ["user_11"])
+        self.assertEqual(self.index.flows_of("user_10"), ["flow_2"])
+
+    def test_leave_flows_and_remove_users(self):
+        self.index.load()
+        self.index.leave_flows([11])
+        self.assertEqual(self.index.flows_of("user_11"), [])
+        self.index.remove_users([10])
+        self.assertIsNone(self.index.flows_of("user_10"))
+        self.assertEqual(self.index.users_of("flow_1"), [])
+
+    def test_clear(self):
+        self.index.load()
+        self.index.clear()
+        self.assertFalse(self.index.loaded)
+        self.assertEqual(self.index.users_of("flow_2"), ["user_10"])
+
+    def test_stats(self):
+        self.index.load()
+        stats = self.index.stats()
+        self.assertEqual((stats["flows"], stats["users"],
+                          stats["memberships"]), (2, 3, 3))
+        self.assertGreaterEqual(stats["bytes"], 6 * 8)
+
+
+class TestDBHandlerMembership(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = DBHandler(uri="sqlite:/:memory:")
+
+    def setUp(self):
+        self.db.create_table()
+        for number in range(3):
+            self.db.add_user(uuid=f"user_{number}",
+                             login=f"login_{number}",
+                             password="password")
+        self.db.add_flow(uuid="flow",
+                         users=["user_0", "user_1"])
+        self.db.load_membership()
+
+    def tearDown(self):
+        self.db.delete_table()
+
+    def test_add_flow(self):
+        self.db.add_flow(uuid="new_flow",
+                         users=["user_2", "user_0"])
+        self.assertEqual(self.db.get_flow_member_uuids("new_flow"),
+                         ["user_0", "user_2"])
+        self.assertEqual(self.db.get_user_flow_uuids("user_0"),
+                         ["flow", "new_flow"])
+        self.assertEqual(self.db.membership_stats()["memberships"], 4)
+
+    def test_added_user_without_flows(self):
+        self.db.add_user(uuid="user_3",
+                         login="login_3",
+                         password="password")
+        self.assertEqual(self.db.get_user_flow_uuids("user_3"), [])
+
+    def test_add_flow_members(self):
+        added = self.db.add_flow_members("flow", ["user_1", "user_2"])
+        self.assertEqual(added, 1)
+        self.assertTrue(self.db.is_flow_member("flow", "user_2"))
+        flow = self.db.get_flow_by_uuid("flow")
+        self.assertEqual(sorted(item.uuid for item in flow.users),
+                         ["user_0", "user_1", "user_2"])
+        self.assertRaises(DatabaseReadError,
+                          self.db.add_flow_members,
+                          "flow",
+                          ["wrong"])
+        self.assertRaises(DatabaseReadError,
+                          self.db.add_flow_members,
+                          "wrong",
+                          ["user_2"])
+
+    def test_remove_flow_members(self):
+        removed = self.db.remove_flow_members("flow", ["user_1", "user_2"])
+        self.assertEqual(removed, 1)
+        self.assertFalse(self.db.is_flow_member("flow", "user_1"))
+        self.assertEqual(self.db.get_flow_member_uuids("flow"), ["user_0"])
+        flow = self.db.get_flow_by_uuid("flow")
+        self.assertEqual([item.uuid for item in flow.users], ["user_0"])
+
+    def test_flow_added_without_dbhandler(self):
+        models.Flow(uuid="other_flow")
+        self.assertEqual(self.db.get_flow_member_uuids("other_flow"), [])
+        self.assertFalse(self.db.is_flow_member("other_flow", "user_0"))
+        self.assertFalse(self.db.is_flow_member("wrong", "user_0"))
+        self.assertRaises(DatabaseReadError,
+                          self.db.get_flow_member_uuids,
+                          "wrong")
+
+    def test_purge_deleted_users(self):
+        self.db.get_user_by_uuid("user_1").deleted_time = 1
+        self.db.purge_deleted_users(before=2)
+        self.assertEqual(self.db.get_flow_member_uuids("flow"), ["user_0"])
+        self.assertIsNone(self.db.membership.flows_of("user_1"))
+
+    def test_disabled(self):
+        db = DBHandler(uri="sqlite:/:memory:",
+                       membership_index=False)
+        self.assertIsNone(db.membership)
+        self.assertEqual(db.membership_stats(), {})
+        self.assertEqual(db.get_flow_member_uuids("flow"),
+                         ["user_0", "user_1"])
+        self.assertTrue(db.is_flow_member("flow", "user_1"))
+        self.assertEqual(db.get_user_flow_uuids("user_1"), ["flow"])
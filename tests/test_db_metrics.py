@@ -0,0 +1,174 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import unittest
+
+from loguru import logger
+from sqlobject import connectionForURI
+
+from mod.db.dbhandler import DBHandler
+from mod.db.metrics import COUNT_BUCKETS
+from mod.db.metrics import Histogram
+from mod.db.metrics import instrument_methods
+from mod.db.metrics import mask_literals
+from mod.db.metrics import QueryMetrics
+
+
+class TestHistogram(unittest.TestCase):
+    def test_empty(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.percentile(0.5), 0.0)
+        self.assertEqual(histogram.as_dict()["average"], 0.0)
+
+    def test_add(self):
+        histogram = Histogram((1, 10))
+        for value in (0.5, 0.7, 5, 20):
+            histogram.add(value)
+        result = histogram.as_dict()
+        self.assertEqual(result["count"], 4)
+        self.assertEqual(result["max"], 20)
+        self.assertEqual(result["buckets"], {"le_1": 2,
+                                             "le_10": 1,
+                                             "inf": 1})
+        self.assertEqual(histogram.percentile(0.5), 1)
+        self.assertEqual(histogram.percentile(0.75), 10)
+        self.assertEqual(histogram.percentile(1), 20)
+
+    def test_percentile_not_more_than_max(self):
+        histogram = Histogram((1, 10))
+        histogram.add(2)
+        self.assertEqual(histogram.percentile(0.5), 2)
+
+
+class TestQueryMetrics(unittest.TestCase):
+    def setUp(self):
+        self.connection = connectionForURI("sqlite:/:memory:?cache=")
+        self.connection.query("CREATE TABLE IF NOT EXISTS t (a INT)")
+
+    def test_attach_once(self):
+        metrics = QueryMetrics.attach(self.connection)
+        self.assertIs(QueryMetrics.attach(self.connection, 5), metrics)
+        self.assertEqual(metrics.slow_query, 5)
+
+    def test_count_queries_of_request(self):
+        metrics = QueryMetrics.attach(self.connection)
+        metrics.reset()
+        metrics.begin_request()
+        self.connection.query("INSERT INTO t VALUES (1)")
+        self.connection.queryAll("SELECT a FROM t")
+        self.assertEqual(metrics.request_queries(), 2)
+        self.assertEqual(metrics.end_request(), 2)
+        stats = metrics.stats()
+        self.assertEqual(stats["queries"]["count"], 2)
+        self.assertEqual(stats["requests"]["count"], 1)
+        self.assertEqual(len(stats["requests"]["buckets"]),
+                         len(COUNT_BUCKETS) + 1)
+
+    def test_slow_query_log(self):
+        messages = []
+        logger.remove()
+        sink = logger.add(messages.append, level="WARNING")
+        metrics = QueryMetrics(slow_query=1)
+        metrics.add_query("SELECT 1", 0.0001)
+        metrics.add_query("SELECT * FROM flow", 0.002)
+        logger.remove(sink)
+        self.assertEqual(metrics.slow_queries, 1)
+        self.assertEqual(len(messages), 1)
+        self.assertIn("SELECT * FROM flow", messages[0])
+
+    def test_slow_query_log_without_values(self):
+        messages = []
+        logger.remove()
+        sink = logger.add(messages.append, level="WARNING")
+        metrics = QueryMetrics(slow_query=1)
+        metrics.add_query("INSERT INTO user_config (login, password) "
+                          "VALUES ('login', 'secret''s'), (x, 42)", 0.002)
+        logger.remove(sink)
+        self.assertNotIn("secret", messages[0])
+        self.assertNotIn("42", messages[0])
+        self.assertIn("INSERT INTO user_config (login, password)",
+                      messages[0])
+
+    def test_mask_literals(self):
+        self.assertEqual(mask_literals("SELECT t1.id FROM t1 WHERE "
+                                       "t1.hash = X'0a' AND time > -1.5"),
+                         "SELECT t1.id FROM t1 WHERE "
+                         "t1.hash = ? AND time > ?")
+
+    def test_slow_query_log_disabled(self):
+        metrics = QueryMetrics()
+        metrics.add_query("SELECT 1", 10)
+        self.assertEqual(metrics.slow_queries, 0)
+
+
+class TestInstrumentMethods(unittest.TestCase):
+    def test_methods(self):
+        @instrument_methods
+        class Handler:
+            _not_measured = ("skipped",)
+
+            def __init__(self, metrics):
+                self.metrics = metrics
+
+            def measured(self, value):
+                return value * 2
+
+            def skipped(self):
+                return None
+
+            @staticmethod
+            def static():
+                return 1
+
+        metrics = QueryMetrics()
+        handler = Handler(metrics)
+        self.assertEqual(handler.measured(2), 4)
+        handler.skipped()
+        self.assertEqual(Handler.static(), 1)
+        self.assertEqual(list(metrics.stats()["methods"]), ["measured"])
+        self.assertEqual(Handler(None).measured(3), 6)
+
+
+class TestDBHandlerMetrics(unittest.TestCase):
+    def test_query_stats(self):
+        db = DBHandler(uri="sqlite:/:memory:")
+        db.metrics.reset()
+        with db.unit_of_work():
+            db.create_table()
+            db.get_all_user().count()
+            db.get_message_by_more_time(0).count()
+            db.get_flow_by_more_time(0).count()
+        stats = db.query_stats()
+        self.assertEqual(stats["methods"]["create_table"]["count"], 1)
+        self.assertEqual(
+            stats["methods"]["get_message_by_more_time"]["count"], 1)
+        self.assertEqual(
+            stats["methods"]["get_flow_by_more_time"]["count"], 1)
+        self.assertGreater(stats["queries"]["count"], 0)
+        self.assertEqual(stats["requests"]["count"], 1)
+        db.delete_table()
+
+    def test_disabled(self):
+        db = DBHandler(uri="sqlite:/:memory:",
+                       metrics_enabled=False)
+        self.assertIsNone(db.metrics)
+        self.assertEqual(db.query_stats(), {})
@@ -0,0 +1,119 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import os
+import tempfile
+import threading
+import unittest
+
+import sqlobject as orm
+
+from mod.db.pool import ConnectionPool
+from mod.db.pool import PoolTimeoutError
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, "pool.db")
+        self.connection = orm.connectionForURI(f"sqlite://{path}",
+                                               cache=False)
+
+    def tearDown(self):
+        self.connection.close()
+        self.directory.cleanup()
+
+    def test_wrong_size(self):
+        self.assertRaises(ValueError, ConnectionPool, self.connection,
+                          min_size=5, max_size=2)
+
+    def test_attach_once(self):
+        pool = ConnectionPool.attach(self.connection)
+        self.assertIs(ConnectionPool.attach(self.connection), pool)
+        self.assertRaises(ValueError, ConnectionPool, self.connection)
+
+    def test_query_through_pool(self):
+        pool = ConnectionPool(self.connection)
+        self.connection.queryAll("SELECT 1")
+        stats = pool.stats.as_dict()
+        self.assertEqual(stats["acquired"], 1)
+        self.assertEqual(stats["in_use"], 0)
+
+    def test_per_thread_checkout(self):
+        pool = ConnectionPool(self.connection,
+                              max_size=1,
+                              timeout=0.01)
+        with pool.checkout() as conn:
+            self.assertIs(self.connection.getConnection(), conn)
+            self.connection.releaseConnection(conn)
+            self.connection.queryAll("SELECT 1")
+            self.assertEqual(pool.stats.in_use, 1)
+        self.assertEqual(pool.stats.acquired, 1)
+        self.assertEqual(pool.stats.in_use, 0)
+
+    def test_timeout(self):
+        pool = ConnectionPool(self.connection,
+                              max_size=1,
+                              timeout=0.01)
+        errors = []
+
+        def query():
+            try:
+                self.connection.queryAll("SELECT 1")
+            except PoolTimeoutError as error:
+                errors.append(error)
+
+        with pool.checkout():
+            thread = threading.Thread(target=query)
+            thread.start()
+            thread.join()
+
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(pool.stats.timeouts, 1)
+        self.connection.queryAll("SELECT 1")
+        self.assertEqual(pool.stats.as_dict()["peak_in_use"], 1)
+
+    def test_not_per_thread(self):
+        pool = ConnectionPool(self.connection,
+                              max_size=1,
+                              timeout=0.01,
+                              per_thread=False)
+        conn = pool.acquire()
+        self.assertRaises(PoolTimeoutError, pool.acquire)
+        pool.release(conn)
+
+    def test_not_per_thread_checkout(self):
+        pool = ConnectionPool(self.connection,
+                              max_size=1,
+                              timeout=0.01,
+                              per_thread=False)
+        with pool.checkout() as conn:
+            self.assertIs(pool.acquire(), conn)
+            pool.release(conn)
+            self.connection.queryAll("SELECT 1")
+            self.assertEqual(pool.stats.in_use, 1)
+        self.assertEqual(pool.stats.acquired, 1)
+        self.assertEqual(pool.stats.in_use, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import unittest
+
+from sqlobject.main import SQLObjectIntegrityError
+from sqlobject.main import SQLObjectNotFound
+
+from mod.db.dbhandler import DatabaseReadError
+from mod.db.dbhandler import DBHandler
+from mod.db import models
+from mod.db.queries import PreparedQuery
+
+
+class TestPreparedQuery(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = DBHandler(uri="sqlite:/:memory:")
+
+    def setUp(self):
+        self.db.create_table()
+        self.db.add_user(uuid="1",
+                         login="login",
+                         password="password")
+        self.db.add_user(uuid="2",
+                         login="login",
+                         password="password",
+                         avatar=b"avatar")
+        self.db.add_flow(uuid="07d949",
+                         users=["1"])
+        self.db.add_messages([{"flow_uuid": "07d949",
+                               "user_uuid": "1",
+                               "message_uuid": str(number),
+                               "time": number}
+                              for number in range(10)])
+        self.flow_id = self.db.get_flow_by_uuid("07d949").id
+        self.messages = PreparedQuery(self.db.connection,
+                                      models.Message,
+                                      (("flowID", "="),
+                                       ("time", ">=")))
+
+    def tearDown(self):
+        self.db.delete_table()
+
+    def test_sql(self):
+        self.assertEqual(self.messages.sql_count,
+                         "SELECT COUNT(*) FROM message"
+                         " WHERE flow_id = ? AND time >= ?")
+        self.assertTrue(self.messages.sql.endswith("ORDER BY id"))
+
+    def test_wrong_operator(self):
+        self.assertRaises(ValueError, PreparedQuery, self.db.connection,
+                          models.Message, (("time", "LIKE"),))
+
+    def test_one(self):
+        query = PreparedQuery(self.db.connection,
+                              models.UserConfig,
+                              (("uuid", "="),))
+        user = query.one("2")
+        self.assertEqual(user.avatar, b"avatar")
+        self.assertIs(user, models.UserConfig.selectBy(
+            self.db.connection, uuid="2").getOne())
+        self.assertRaises(SQLObjectNotFound, query.one, "3")
+
+    def test_one_many_rows(self):
+        query = PreparedQuery(self.db.connection,
+                              models.UserConfig,
+                              (("login", "="),))
+        self.assertRaises(SQLObjectIntegrityError, query.one, "login")
+
+    def test_fetch_all_and_count(self):
+        self.assertEqual([item.uuid for item
+                          in self.messages.fetch_all(self.flow_id, 7)],
+                         ["7", "8", "9"])
+        self.assertEqual(self.messages.count(self.flow_id, 7), 3)
+
+    def test_results(self):
+        results = self.messages.results(self.flow_id, 2)
+        self.assertEqual(results.count(), 8)
+        self.assertEqual([item.uuid for item in results[1:3]], ["3", "4"])
+        self.assertEqual([item.uuid for item in results[6:]], ["8", "9"])
+        self.assertEqual(results[0].uuid, "2")
+        self.assertEqual(len(list(results)), 8)
+        self.assertRaises(IndexError, results.__getitem__, 8)
+
+    def test_dbhandler_lookups(self):
+        self.assertEqual(self.db.get_user_by_uuid("1").login, "login")
+        self.assertEqual(self.db.get_message_by_uuid("3").time, 3)
+        self.assertRaises(DatabaseReadError,
+                          self.db.get_flow_by_uuid,
+                          "wrong")
+        self.assertRaises(DatabaseReadError,
+                          self.db.get_user_by_login,
+                          "login")
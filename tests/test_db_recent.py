@@ -0,0 +1,175 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import unittest
+
+from mod.db.dbhandler import DatabaseReadError
+from mod.db.dbhandler import DBHandler
+from mod.db.recent import ENTRY_OVERHEAD
+from mod.db.recent import RecentMessages
+
+
+def message(uuid, time):
+    return {"uuid": uuid, "text": None, "time": time}
+
+
+class TestRecentMessages(unittest.TestCase):
+    def setUp(self):
+        self.cache = RecentMessages(per_flow=2,
+                                    max_bytes=ENTRY_OVERHEAD * 5)
+
+    def load(self, flow_uuid, rows, floor=None):
+        version = self.cache.begin_load(flow_uuid)
+        self.cache.end_load(flow_uuid, version, (rows, floor))
+
+    def test_wrong_size(self):
+        self.assertRaises(ValueError, RecentMessages, 0)
+        self.assertRaises(ValueError, RecentMessages, 1, 0)
+
+    def test_get(self):
+        self.assertIsNone(self.cache.get("flow", 0))
+        self.load("flow", [(1, message("1", 10)), (2, message("2", 20))])
+        self.assertEqual(self.cache.get("flow", 15), [message("2", 20)])
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["messages"], 2)
+
+    def test_floor(self):
+        self.load("flow", [(5, message("5", 50))], floor=40)
+        self.assertIsNone(self.cache.get("flow", 40))
+        self.assertEqual(len(self.cache.get("flow", 41)), 1)
+
+    def test_add_removes_oldest(self):
+        self.load("flow", [(1, message("1", 10)), (2, message("2", 20))])
+        self.cache.add("flow", 3, message("3", 30))
+        self.assertIsNone(self.cache.get("flow", 10))
+        self.assertEqual([item["uuid"] for item
+                          in self.cache.get("flow", 11)], ["2", "3"])
+
+    def test_add_to_absent_flow(self):
+        self.cache.add("flow", 1, message("1", 10))
+        self.assertIsNone(self.cache.get("flow", 0))
+
+    def test_update(self):
+        self.load("flow", [(1, message("1", 10))])
+        self.cache.update("flow", {"uuid": "1", "text": "new", "time": 10})
+        self.assertEqual(self.cache.get("flow", 0)[0]["text"], "new")
+
+    def test_change_during_load(self):
+        version = self.cache.begin_load("flow")
+        self.cache.add("flow", 2, message("2", 20))
+        self.cache.end_load("flow", version, ([(1, message("1", 10))], None))
+        self.assertIsNone(self.cache.get("flow", 0))
+
+        version = self.cache.begin_load("flow")
+        self.cache.clear()
+        self.cache.end_load("flow", version, ([(1, message("1", 10))], None))
+        self.assertIsNone(self.cache.get("flow", 0))
+
+    def test_failed_load(self):
+        version = self.cache.begin_load("flow")
+        self.cache.end_load("flow", version, None)
+        self.load("flow", [(1, message("1", 10))])
+        self.assertIsNotNone(self.cache.get("flow", 0))
+
+    def test_lru_eviction(self):
+        for flow in ("first", "second"):
+            self.load(flow, [(1, message("1", 10)), (2, message("2", 20))])
+        self.cache.get("first", 0)
+        self.load("third", [(1, message("1", 10))])
+        self.assertIsNone(self.cache.get("second", 0))
+        self.assertIsNotNone(self.cache.get("first", 0))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+        self.assertLessEqual(self.cache.stats()["bytes"],
+                             self.cache.max_bytes)
+
+
+class TestDBHandlerRecent(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = DBHandler(uri="sqlite:/:memory:")
+        # Cache of connection is shared with other tests
+        cls.db.recent = RecentMessages(per_flow=5)
+
+    def setUp(self):
+        self.db.create_table()
+        self.db.add_user(uuid="123456",
+                         login="login",
+                         password="password")
+        self.db.add_flow(uuid="07d949",
+                         users=["123456"])
+        for item in range(8):
+            self.db.add_message(flow_uuid="07d949",
+                                user_uuid="123456",
+                                message_uuid=str(item),
+                                text=f"Hello{item}",
+                                time=item)
+
+    def tearDown(self):
+        self.db.delete_table()
+
+    def test_loaded(self):
+        messages = self.db.get_recent_messages("07d949", 3)
+        self.assertEqual([item["uuid"] for item in messages],
+                         ["3", "4", "5", "6", "7"])
+        self.assertEqual(messages[0]["user"], "123456")
+        self.assertEqual(messages[0]["flow"], "07d949")
+        self.assertEqual(self.db.recent_stats()["messages"], 5)
+
+    def test_older_messages_are_not_served(self):
+        self.assertIsNone(self.db.get_recent_messages("07d949", 2))
+        self.assertIsNone(self.db.get_recent_messages("07d949", 0))
+
+    def test_flow_not_found(self):
+        self.assertRaises(DatabaseReadError,
+                          self.db.get_recent_messages,
+                          "wrong",
+                          0)
+
+    def test_add_and_update(self):
+        self.db.get_recent_messages("07d949", 3)
+        self.db.add_message(flow_uuid="07d949",
+                            user_uuid="123456",
+                            message_uuid="8",
+                            text="Hello8",
+                            time=8)
+        self.db.update_message("7", text="Changed")
+        messages = self.db.get_recent_messages("07d949", 4)
+        self.assertEqual([item["uuid"] for item in messages],
+                         ["4", "5", "6", "7", "8"])
+        self.assertEqual(messages[3]["text"], "Changed")
+        self.assertIsNone(self.db.get_recent_messages("07d949", 3))
+
+    def test_archive_clears_cache(self):
+        self.db.get_recent_messages("07d949", 3)
+        self.db.archive_messages(4)
+        self.assertEqual(self.db.recent_stats()["flows"], 0)
+        messages = self.db.get_recent_messages("07d949", 3)
+        self.assertEqual([item["uuid"] for item in messages],
+                         ["3", "4", "5", "6", "7"])
+
+    def test_disabled(self):
+        db = DBHandler(uri="sqlite:/:memory:",
+                       recent_messages=0)
+        self.assertIsNone(db.recent)
+        self.assertEqual(db.recent_stats(), {})
+        self.assertIsNone(db.get_recent_messages("07d949", 0))
@@ -0,0 +1,84 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import os
+import tempfile
+import unittest
+
+import sqlobject as orm
+
+from mod.config.models import SqliteModel
+from mod.db.tuning import pragma_statements
+from mod.db.tuning import tune_sqlite
+
+
+class TestPragmaStatements(unittest.TestCase):
+    def test_order(self):
+        statements = pragma_statements({"journal_mode": "WAL",
+                                        "busy_timeout": 5000})
+        self.assertEqual(statements, ["PRAGMA busy_timeout = 5000",
+                                      "PRAGMA journal_mode = WAL"])
+
+    def test_unknown_pragma(self):
+        self.assertRaises(ValueError, pragma_statements,
+                          {"writable_schema": 1})
+
+    def test_wrong_value(self):
+        self.assertRaises(ValueError, pragma_statements,
+                          {"journal_mode": "WAL; DROP TABLE flow"})
+
+    def test_disabled_profile(self):
+        self.assertEqual(SqliteModel(enabled=False).pragmas(), {})
+        self.assertNotIn("enabled", SqliteModel().pragmas())
+
+
+class TestTuneSqlite(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, "tuning.db")
+        self.connection = orm.connectionForURI(f"sqlite://{path}",
+                                               cache=False)
+
+    def tearDown(self):
+        self.connection.close()
+        self.directory.cleanup()
+
+    def test_new_connection_tuned(self):
+        self.assertTrue(tune_sqlite(self.connection,
+                                    SqliteModel().pragmas()))
+        mode = self.connection.queryOne("PRAGMA journal_mode")
+        synchronous = self.connection.queryOne("PRAGMA synchronous")
+        busy_timeout = self.connection.queryOne("PRAGMA busy_timeout")
+        self.assertEqual(mode[0].lower(), "wal")
+        # NORMAL
+        self.assertEqual(synchronous[0], 1)
+        self.assertEqual(busy_timeout[0], 5000)
+
+    def test_tune_twice(self):
+        tune_sqlite(self.connection, {"busy_timeout": 100})
+        tune_sqlite(self.connection, {"busy_timeout": 200})
+        busy_timeout = self.connection.queryOne("PRAGMA busy_timeout")
+        self.assertEqual(busy_timeout[0], 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import os
+import tempfile
+import threading
+import unittest
+
+from loguru import logger
+
+from mod.db.dbhandler import DatabaseReadError
+from mod.db.dbhandler import DBHandler
+from mod.db.writer import GroupWriter
+
+
+class TestGroupWriter(unittest.TestCase):
+    def setUp(self):
+        self.groups = []
+
+    def commit(self, items):
+        self.groups.append(list(items))
+        return [ValueError(item) if item < 0 else item * 2
+                for item in items]
+
+    def test_not_started(self):
+        writer = GroupWriter(self.commit)
+        self.assertRaises(RuntimeError, writer.submit, 1)
+
+    def test_wrong_batch_size(self):
+        self.assertRaises(ValueError, GroupWriter, self.commit,
+                          batch_size=0)
+
+    def test_group_commit(self):
+        writer = GroupWriter(self.commit,
+                             window=200,
+                             batch_size=3)
+        writer.start()
+        futures = [writer.submit(item) for item in range(5)]
+        results = [future.result(timeout=5) for future in futures]
+        writer.stop()
+        self.assertEqual(results, [0, 2, 4, 6, 8])
+        self.assertEqual(self.groups, [[0, 1, 2], [3, 4]])
+        self.assertEqual(writer.stats()["max_batch"], 3)
+
+    def test_error_of_item(self):
+        writer = GroupWriter(self.commit)
+        writer.start()
+        future = writer.submit(-1)
+        self.assertRaises(ValueError, future.result, 5)
+        writer.stop()
+
+    def test_error_of_commit(self):
+        def commit(items):
+            raise RuntimeError("commit failed")
+
+        logger.remove()
+        writer = GroupWriter(commit)
+        writer.start()
+        future = writer.submit(1)
+        self.assertRaises(RuntimeError, future.result, 5)
+        writer.stop()
+
+    def test_stop_saves_queue(self):
+        event = threading.Event()
+
+        def prepare():
+            event.wait(5)
+
+        writer = GroupWriter(self.commit, prepare=prepare)
+        writer.start()
+        futures = [writer.submit(item) for item in range(3)]
+        event.set()
+        writer.stop()
+        self.assertTrue(all(future.done() for future in futures))
+
+    def test_submit_after_stop(self):
+        writer = GroupWriter(self.commit)
+        writer.start()
+        writer.stop()
+        self.assertRaises(RuntimeError, writer.submit, 1)
+
+    def test_submit_while_stopping(self):
+        writer = GroupWriter(self.commit,
+                             window=0)
+        writer.start()
+        accepted = []
+
+        def submit():
+            for item in range(1000):
+                try:
+                    accepted.append(writer.submit(item))
+                except RuntimeError:
+                    return
+
+        threads = [threading.Thread(target=submit) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        writer.stop()
+        for thread in threads:
+            thread.join(5)
+        self.assertTrue(all(future.done() for future in accepted))
+
+
+class TestMessageWriter(unittest.TestCase):
+    def setUp(self):
+        logger.remove()
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, "writer.db")
+        self.db = DBHandler(uri=f"sqlite:{path}")
+        self.db.create_table()
+        self.db.add_user(uuid="123",
+                         login="login",
+                         password="password")
+        self.db.add_flow(uuid="07d949",
+                         users=["123"])
+
+    def tearDown(self):
+        self.db.stop_writer()
+        self.db.connection.close()
+        self.directory.cleanup()
+
+    def test_submit_through_writer(self):
+        self.db.start_writer(window=50,
+                             batch_size=10)
+        futures = [self.db.submit_message("07d949",
+                                          "123",
+                                          f"message_{number}",
+                                          number,
+                                          text="Hello!")
+                   for number in range(5)]
+        futures.append(self.db.submit_message("wrong_flow",
+                                              "123",
+                                              "message_wrong",
+                                              1))
+        self.assertEqual(futures[0].result(timeout=5), "message_0")
+        self.assertRaises(DatabaseReadError, futures[-1].result, 5)
+        self.assertEqual(self.db.get_all_message().count(), 5)
+        self.assertEqual(self.db.writer.stats()["batches"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
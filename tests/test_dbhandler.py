@@ -19,6 +19,9 @@ You should have received a copy of the GNU Lesser General Public License
 along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
 """
 
+import os
+import tempfile
+import time
 import unittest
 from loguru import logger
 
@@ -28,6 +31,7 @@ from sqlobject.sresults import SelectResults
 from mod.db.dbhandler import DBHandler
 from mod.db import models
 from mod.db.dbhandler import DatabaseAccessError
+from mod.db.dbhandler import DatabasePoolError
 from mod.db.dbhandler import DatabaseWriteError
 from mod.db.dbhandler import DatabaseReadError
 
@@ -433,6 +437,25 @@ class TestDBHandlerMethods(unittest.TestCase):
         self.assertEqual(dbquery.owner, "User9")
         self.assertEqual(dbquery.users[0].login, "User9")
 
+    def test_add_flow_many_users(self):
+        users = [f"user_{number}" for number in range(1200)]
+        for user in users:
+            self.db.add_user(uuid=user,
+                             login=user,
+                             password="password")
+        dbquery = self.db.add_flow(uuid="666997",
+                                   users=users + users[:10])
+        self.assertEqual(len(dbquery.users), 1200)
+
+    def test_add_flow_wrong_user(self):
+        self.assertRaises(DatabaseReadError,
+                          self.db.add_flow,
+                          uuid="666998",
+                          users=["123456", "wrong_user"])
+        self.assertRaises(DatabaseReadError,
+                          self.db.get_flow_by_uuid,
+                          "666998")
+
     def test_update_flow(self):
         new_flow_type = "new_flow_type"
         new_title = "new_title"
@@ -478,3 +501,485 @@ class TestDBHandlerMethods(unittest.TestCase):
         self.assertIsInstance(dbquery,
                               SQLObject)
         self.assertEqual(dbquery.hash_password, "hash3")
+
+    def test_get_user_fields(self):
+        dbquery = self.db.get_user_fields(("uuid", "username", "is_bot"),
+                                          ["123457"])
+        self.assertEqual(dbquery, [{"uuid": "123457",
+                                    "username": "username",
+                                    "is_bot": False}])
+
+    def test_get_all_user_fields(self):
+        dbquery = self.db.get_user_fields(("uuid", "salt"))
+        self.assertEqual(len(dbquery), 2)
+        self.assertEqual(dbquery[0]["salt"], b"salt")
+
+    def test_get_user_wrong_fields(self):
+        self.assertRaises(DatabaseAccessError,
+                          self.db.get_user_fields,
+                          ("uuid", "wrong_field"))
+
+    def test_get_message_fields(self):
+        dbquery = self.db.get_message_fields(("uuid", "user", "flow"),
+                                             123123)
+        self.assertEqual(dbquery[1], {"uuid": "333444",
+                                      "user": "123457",
+                                      "flow": "666999"})
+
+    def test_get_message_fields_by_flow(self):
+        dbquery = self.db.get_message_fields(("uuid", "text"),
+                                             0,
+                                             flow_uuid="6669")
+        self.assertEqual(dbquery, [{"uuid": "111222",
+                                    "text": "Hello World!"}])
+        self.assertRaises(DatabaseReadError,
+                          self.db.get_message_fields,
+                          ("uuid",),
+                          0,
+                          flow_uuid="wrong_flow")
+
+class TestDBHandlerPool(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = DBHandler(uri="sqlite:/:memory:")
+
+    def setUp(self):
+        self.db.create_table()
+
+    def tearDown(self):
+        self.db.delete_table()
+
+    def test_unit_of_work(self):
+        acquired = self.db.pool_stats()["acquired"]
+        with self.db.unit_of_work():
+            self.db.add_user(uuid="123",
+                             login="login",
+                             password="password")
+            self.db.get_user_by_uuid("123")
+        self.assertEqual(self.db.pool_stats()["acquired"], acquired + 1)
+        self.assertEqual(self.db.pool_stats()["in_use"], 0)
+
+    def test_pool_is_shared(self):
+        db = DBHandler(uri="sqlite:/:memory:")
+        self.assertIs(db.pool, self.db.pool)
+
+    def test_cache_stats(self):
+        self.db.add_user(uuid="123",
+                         login="login",
+                         password="password")
+        self.db.get_user_by_uuid("123")
+        stats = self.db.cache_stats()["UserConfig"]
+        self.assertGreaterEqual(stats["hits"], 1)
+        self.assertLessEqual(stats["size"], 1000)
+
+
+class TestDBHandlerPoolNotPerThread(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, "pool.db")
+        self.db = DBHandler(uri=f"sqlite:{path}",
+                            pool_max_size=1,
+                            pool_timeout=0.01,
+                            pool_per_thread=False)
+        self.db.create_table()
+
+    def tearDown(self):
+        self.db.connection.close()
+        self.directory.cleanup()
+
+    def test_unit_of_work(self):
+        with self.db.unit_of_work():
+            self.db.add_user(uuid="123",
+                             login="login",
+                             password="password")
+            self.db.get_user_by_login("login")
+            self.assertEqual(self.db.pool_stats()["in_use"], 1)
+        self.assertEqual(self.db.pool_stats()["in_use"], 0)
+
+    def test_pool_timeout(self):
+        conn = self.db.pool.acquire()
+        try:
+            self.assertRaises(DatabasePoolError,
+                              self.db.get_user_by_login,
+                              "login")
+        finally:
+            self.db.pool.release(conn)
+
+
+class TestDBHandlerAddMessages(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = DBHandler(uri="sqlite:/:memory:")
+
+    def setUp(self):
+        self.db.create_table()
+        self.db.add_user(uuid="123",
+                         login="login",
+                         password="password")
+        self.db.add_flow(uuid="07d949",
+                         users=["123"])
+
+    def tearDown(self):
+        self.db.delete_table()
+
+    def test_add_messages(self):
+        result = self.db.add_messages([{"flow_uuid": "07d949",
+                                        "user_uuid": "123",
+                                        "message_uuid": "1",
+                                        "time": 1,
+                                        "text": "Hello!"},
+                                       {"flow_uuid": "wrong_flow",
+                                        "user_uuid": "123",
+                                        "message_uuid": "2",
+                                        "time": 1}])
+        self.assertEqual(result[0], "1")
+        self.assertIsInstance(result[1], DatabaseReadError)
+        message = self.db.get_message_by_uuid("1")
+        self.assertEqual(message.text, "Hello!")
+        self.assertEqual(message.user.uuid, "123")
+
+    def test_add_messages_duplicate(self):
+        message = {"flow_uuid": "07d949",
+                   "user_uuid": "123",
+                   "message_uuid": "1",
+                   "time": 1}
+        result = self.db.add_messages([message,
+                                       dict(message, message_uuid="2"),
+                                       message])
+        self.assertEqual(result[:2], ["1", "2"])
+        self.assertIsInstance(result[2], DatabaseWriteError)
+        self.assertEqual(self.db.get_all_message().count(), 2)
+
+    def test_submit_without_writer(self):
+        future = self.db.submit_message("07d949",
+                                        "123",
+                                        "1",
+                                        1)
+        self.assertEqual(future.result(), "1")
+
+
+class TestDBHandlerBulkGetters(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = DBHandler(uri="sqlite:/:memory:")
+
+    def setUp(self):
+        self.db.create_table()
+        self.uuids = [str(number) for number in range(600)]
+        for uuid in self.uuids:
+            self.db.add_user(uuid=uuid,
+                             login="login",
+                             password="password")
+        self.db.add_flow(uuid="07d949",
+                         users=["1"])
+        self.db.add_message(flow_uuid="07d949",
+                            user_uuid="1",
+                            message_uuid="555",
+                            time=1)
+
+    def tearDown(self):
+        self.db.delete_table()
+
+    def test_get_users_by_uuids(self):
+        dbquery = self.db.get_users_by_uuids(self.uuids + ["wrong"])
+        self.assertEqual(len(dbquery), 600)
+        self.assertEqual(dbquery["599"].uuid, "599")
+        self.assertNotIn("wrong", dbquery)
+
+    def test_get_flows_by_uuids(self):
+        dbquery = self.db.get_flows_by_uuids(["07d949", "07d949"])
+        self.assertEqual(list(dbquery), ["07d949"])
+
+    def test_get_messages_by_uuids(self):
+        dbquery = self.db.get_messages_by_uuids(["555", "wrong"])
+        self.assertEqual(dbquery["555"].user.uuid, "1")
+        self.assertEqual(len(dbquery), 1)
+
+    def test_empty_list(self):
+        self.assertEqual(self.db.get_users_by_uuids([]), {})
+
+
+class TestDBHandlerCounters(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = DBHandler(uri="sqlite:/:memory:")
+
+    def setUp(self):
+        self.db.create_table()
+        self.db.add_user(uuid="123456",
+                         login="login",
+                         password="password")
+        self.db.add_flow(uuid="07d949",
+                         users=["123456"])
+        self.db.add_flow(uuid="07d950",
+                         users=["123456"])
+
+    def tearDown(self):
+        self.db.delete_table()
+
+    def test_add_message(self):
+        self.db.add_message(flow_uuid="07d949",
+                            user_uuid="123456",
+                            message_uuid="1",
+                            time=10)
+        flow = self.db.get_flow_by_uuid("07d949")
+        self.assertEqual(flow.message_count, 1)
+        self.assertEqual(flow.last_message_time, 10)
+
+    def test_add_messages(self):
+        self.db.add_messages([{"flow_uuid": "07d949",
+                               "user_uuid": "123456",
+                               "message_uuid": str(number),
+                               "time": time}
+                              for number, time in enumerate((30, 10, 20))])
+        flow = self.db.get_flow_by_uuid("07d949")
+        self.assertEqual(flow.message_count, 3)
+        self.assertEqual(flow.last_message_time, 30)
+        self.assertEqual(self.db.get_flow_by_uuid("07d950").message_count, 0)
+
+    def test_failed_message_not_counted(self):
+        result = self.db.add_messages([{"flow_uuid": "wrong",
+                                        "user_uuid": "123456",
+                                        "message_uuid": "1",
+                                        "time": 1}])
+        self.assertIsInstance(result[0], DatabaseReadError)
+        self.assertEqual(self.db.get_table_count().message_count, 0)
+
+    def test_get_table_count(self):
+        self.db.add_message(flow_uuid="07d949",
+                            user_uuid="123456",
+                            message_uuid="1",
+                            time=1)
+        self.assertEqual(tuple(self.db.get_table_count()), (1, 2, 1))
+
+    def test_recount(self):
+        models.Message(uuid="1",
+                       text="text",
+                       time=5,
+                       user=self.db.get_user_by_uuid("123456"),
+                       flow=self.db.get_flow_by_uuid("07d950"),
+                       connection=self.db.connection)
+        self.db.recount()
+        flow = self.db.get_flow_by_uuid("07d950")
+        self.assertEqual(flow.message_count, 1)
+        self.assertEqual(flow.last_message_time, 5)
+        self.assertEqual(tuple(self.db.get_table_count()), (1, 2, 1))
+
+    def test_get_flow_by_last_activity(self):
+        self.db.add_flow(uuid="07d951",
+                         users=["123456"])
+        self.db.add_message(flow_uuid="07d949",
+                            user_uuid="123456",
+                            message_uuid="1",
+                            time=1)
+        self.db.add_message(flow_uuid="07d950",
+                            user_uuid="123456",
+                            message_uuid="2",
+                            time=2)
+        dbquery = self.db.get_flow_by_last_activity()
+        self.assertEqual([item.uuid for item in dbquery],
+                         ["07d950", "07d949", "07d951"])
+        dbquery = self.db.get_flow_by_last_activity(limit=1)
+        self.assertEqual([item.uuid for item in dbquery], ["07d950"])
+
+    def test_upgrade_old_table(self):
+        self.db.add_message(flow_uuid="07d949",
+                            user_uuid="123456",
+                            message_uuid="1",
+                            time=7)
+        connection = self.db.connection
+        connection.query("ALTER TABLE flow DROP COLUMN message_count")
+        connection.query("DROP TABLE stats")
+        connection.cache.clear()
+        self.db.create_table()
+        flow = self.db.get_flow_by_uuid("07d949")
+        self.assertEqual(flow.message_count, 1)
+        self.assertEqual(flow.last_message_time, 7)
+        self.assertEqual(tuple(self.db.get_table_count()), (1, 2, 1))
+
+
+class TestDBHandlerCompaction(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = DBHandler(uri="sqlite:/:memory:")
+
+    def setUp(self):
+        self.db.create_table()
+        for uuid in ("1", "2", "3"):
+            self.db.add_user(uuid=uuid,
+                             login="login",
+                             password="password")
+        self.db.add_flow(uuid="07d949",
+                         users=["1", "2", "3"])
+        self.db.add_messages([{"flow_uuid": "07d949",
+                               "user_uuid": "1",
+                               "message_uuid": str(number),
+                               "time": number}
+                              for number in range(5)])
+
+    def tearDown(self):
+        self.db.stop_compactor()
+        self.db.delete_table()
+
+    def delete_message(self, uuid, time):
+        self.db.get_message_by_uuid(uuid).deleted_time = time
+
+    def test_purge_deleted_messages(self):
+        self.delete_message("0", 10)
+        self.delete_message("1", 10)
+        self.delete_message("2", 100)
+        self.db.archive_messages(1)
+        self.assertEqual(self.db.purge_deleted_messages(50), 2)
+        self.assertRaises(DatabaseReadError,
+                          self.db.get_message_by_uuid,
+                          "0")
+        self.assertEqual(self.db.get_message_by_uuid("2").uuid, "2")
+        self.assertEqual(self.db.get_flow_by_uuid("07d949").message_count, 3)
+        self.assertEqual(self.db.get_table_count().message_count, 3)
+
+    def test_purge_deleted_messages_batch(self):
+        for uuid in ("0", "1", "2"):
+            self.delete_message(uuid, 10)
+        self.assertEqual(self.db.purge_deleted_messages(50, 2), 2)
+        self.assertEqual(self.db.purge_deleted_messages(50, 2), 1)
+
+    def test_purge_deleted_users(self):
+        for uuid in ("1", "2"):
+            self.db.get_user_by_uuid(uuid).deleted_time = 10
+        self.assertEqual(self.db.purge_deleted_users(50), 1)
+        self.assertRaises(DatabaseReadError,
+                          self.db.get_user_by_uuid,
+                          "2")
+        # User with messages is kept, but removed from flows
+        self.assertEqual(self.db.get_user_by_uuid("1").uuid, "1")
+        self.assertEqual([item.uuid for item
+                          in self.db.get_flow_by_uuid("07d949").users],
+                         ["3"])
+        self.assertEqual(self.db.get_table_count().user_count, 2)
+
+    def test_remove_orphan_joins(self):
+        self.db.connection.query("DELETE FROM user_config WHERE uuid = '3'")
+        self.assertEqual(self.db.remove_orphan_joins(), 1)
+        self.assertEqual(self.db.remove_orphan_joins(), 0)
+
+    def test_compact(self):
+        self.delete_message("0", 10)
+        result = self.db.compact(0)
+        self.assertEqual(result["messages"], 1)
+        self.assertEqual(result["users"], 0)
+
+    def test_start_compactor(self):
+        self.db.start_compactor(30, interval=0.01)
+        self.assertTrue(self.db.compactor.running)
+        self.db.stop_compactor()
+        self.assertIsNone(self.db.compactor)
+
+
+class TestDBHandlerVacuum(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, "vacuum.db")
+        self.db = DBHandler(uri=f"sqlite:{path}",
+                            sqlite_pragmas={"auto_vacuum": "INCREMENTAL"})
+        self.db.create_table()
+        self.db.add_user(uuid="1",
+                         login="login",
+                         password="password")
+        self.db.add_flow(uuid="07d949",
+                         users=["1"])
+        self.db.add_messages([{"flow_uuid": "07d949",
+                               "user_uuid": "1",
+                               "message_uuid": str(number),
+                               "time": number,
+                               "picture": bytes(4000)}
+                              for number in range(50)])
+        self.db.connection.query("DELETE FROM message")
+
+    def tearDown(self):
+        self.db.connection.close()
+        self.directory.cleanup()
+
+    def test_incremental_vacuum(self):
+        free = self.db.connection.queryOne("PRAGMA freelist_count")[0]
+        self.assertGreater(free, 10)
+        self.assertEqual(self.db.vacuum(pages=10), free)
+        self.assertEqual(
+            self.db.connection.queryOne("PRAGMA freelist_count")[0], 0)
+
+    def test_full_vacuum(self):
+        self.assertGreater(self.db.vacuum(full=True), 0)
+
+    def test_vacuum_not_incremental(self):
+        self.db.connection.query("PRAGMA auto_vacuum = NONE")
+        self.db.connection.query("VACUUM")
+        self.db.add_messages([{"flow_uuid": "07d949",
+                               "user_uuid": "1",
+                               "message_uuid": str(number),
+                               "time": number,
+                               "picture": bytes(4000)}
+                              for number in range(50)])
+        self.db.connection.query("DELETE FROM message")
+        messages = []
+        logger.remove()
+        sink = logger.add(messages.append, level="WARNING")
+        self.assertEqual(self.db.vacuum(pages=10), 0)
+        self.assertEqual(self.db.vacuum(pages=10), 0)
+        logger.remove(sink)
+        self.assertEqual(len(messages), 1)
+        self.assertIn("compact --full", messages[0])
+
+
+class TestDBHandlerChangedSince(unittest.TestCase):
+    def setUp(self):
+        logger.remove()
+        self.db = DBHandler(uri="sqlite:/:memory:")
+        self.db.create_table()
+        self.db.add_user(uuid="1",
+                         login="login",
+                         password="password")
+        self.db.add_flow(uuid="07d949",
+                         users=["1"])
+
+    def tearDown(self):
+        self.db.delete_table()
+
+    def test_not_changed(self):
+        self.assertTrue(self.db.changed_since(0))
+        self.assertFalse(self.db.changed_since(time.time() + 1))
+
+    def test_changed_by_message(self):
+        since = time.time()
+        self.assertFalse(self.db.changed_since(since,
+                                               ["messages"]))
+        self.db.add_message(flow_uuid="07d949",
+                            user_uuid="1",
+                            message_uuid="111",
+                            time=111)
+        self.assertTrue(self.db.changed_since(since,
+                                              ["messages"]))
+        self.assertFalse(self.db.changed_since(since,
+                                               ["users"]))
+
+    def test_changed_by_user(self):
+        since = time.time()
+        self.db.update_user(uuid="1",
+                            username="name")
+        self.assertTrue(self.db.changed_since(since))
+        self.assertFalse(self.db.changed_since(since,
+                                               ["flows"]))
+
+    def test_not_changed_by_token(self):
+        since = time.time()
+        self.db.update_user(uuid="1",
+                            auth_id="token",
+                            token_ttl=100)
+        self.db.invalidate_user("1")
+        self.assertFalse(self.db.changed_since(since))
+
+    def test_changed_by_other_process(self):
+        since = time.time()
+        self.db.connection.query("UPDATE change_time SET time = "
+                                 f"{since + 1} WHERE name = 'messages'")
+        self.assertTrue(self.db.changed_since(since))
+        self.assertFalse(self.db.changed_since(since,
+                                               ["users"]))
@@ -21,6 +21,7 @@ along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
 
 import os
 import sys
+import threading
 import unittest
 
 from loguru import logger
@@ -123,5 +124,163 @@ class TestHash(unittest.TestCase):
         self.assertIsInstance(self.generator.get_key, bytes)
 
 
+class TestScryptHash(unittest.TestCase):
+    def setUp(self):
+        self.generator = lib.Hash("password",
+                                  123456,
+                                  b"salt",
+                                  b"key",
+                                  kdf="scrypt",
+                                  scrypt_n=1024)
+        self.hash_password = self.generator.password_hash()
+
+    def make_generator(self, password="password", **kwargs):
+        return lib.Hash(password,
+                        123456,
+                        b"salt",
+                        b"key",
+                        hash_password=self.hash_password,
+                        **kwargs)
+
+    def test_hash_format(self):
+        self.assertTrue(self.hash_password.startswith("scrypt$1024$8$1$"))
+        self.assertEqual(len(self.hash_password.split("$")[-1]), 64)
+
+    def test_check_password(self):
+        self.assertTrue(self.make_generator().check_password())
+        self.assertFalse(self.make_generator("wrong").check_password())
+
+    def test_wrong_kdf(self):
+        self.assertRaises(ValueError,
+                          lib.Hash,
+                          "password",
+                          123456,
+                          kdf="md5")
+
+    def test_needs_rehash(self):
+        self.assertFalse(self.make_generator(
+            kdf="scrypt", scrypt_n=1024).needs_rehash())
+        self.assertTrue(self.make_generator(
+            kdf="scrypt", scrypt_n=2048).needs_rehash())
+        self.assertTrue(self.make_generator().needs_rehash())
+
+    def test_legacy_hash_needs_rehash(self):
+        self.hash_password = self.make_generator().password_hash()
+        generator = self.make_generator(kdf="scrypt",
+                                        scrypt_n=1024)
+        self.assertTrue(generator.check_password())
+        self.assertTrue(generator.needs_rehash())
+
+    def test_calibrate_scrypt(self):
+        results = lib.calibrate_scrypt(0, max_n=2048)
+        self.assertEqual([n for n, _ in results], [1024])
+        results = lib.calibrate_scrypt(100, max_n=2048)
+        self.assertEqual([n for n, _ in results], [1024, 2048])
+
+
+class TestKdfPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = lib.KdfPool()
+        self.generator = lib.Hash("password",
+                                  123456,
+                                  b"salt",
+                                  b"key",
+                                  kdf="scrypt",
+                                  scrypt_n=1024)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_hash_in_thread(self):
+        self.assertEqual(self.pool.password_hash(self.generator),
+                         self.generator.password_hash())
+
+    def test_hash_in_process(self):
+        self.pool.start(1)
+        self.generator.hash_password = self.pool.password_hash(
+            self.generator)
+        self.assertTrue(self.pool.check_password(self.generator))
+        self.assertEqual(self.pool.calls, 2)
+
+    def test_calls_from_threads(self):
+        def check():
+            for _ in range(25):
+                self.pool.password_hash(self.generator)
+
+        threads = [threading.Thread(target=check) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.pool.calls, 100)
+
+
+class TestTokenSigner(unittest.TestCase):
+    def setUp(self):
+        self.signer = lib.TokenSigner(["key"],
+                                      ttl=100)
+
+    def test_issue_and_verify(self):
+        token, expires = self.signer.issue("123456", 1000)
+        self.assertEqual(expires, 1100)
+        self.assertTrue(self.signer.is_signed(token))
+        claims = self.signer.verify(token)
+        self.assertEqual(claims.uuid, "123456")
+        self.assertEqual(claims.issued, 1000)
+        self.assertEqual(claims.expires, 1100)
+
+    def test_changed_token(self):
+        token, _ = self.signer.issue("123456", 1000)
+        self.assertIsNone(self.signer.verify(token.replace(".1100.",
+                                                           ".9100.")))
+        self.assertIsNone(self.signer.verify("auth_id"))
+
+    def test_unknown_key(self):
+        token, _ = lib.TokenSigner(["other"]).issue("123456", 1000)
+        self.assertIsNone(self.signer.verify(token))
+
+    def test_key_rotation(self):
+        token, _ = self.signer.issue("123456", 1000)
+        rotated = lib.TokenSigner(["new_key", "key"])
+        self.assertEqual(rotated.verify(token).uuid, "123456")
+        new_token, _ = rotated.issue("123456", 1000)
+        self.assertIsNone(self.signer.verify(new_token))
+
+    def test_random_key(self):
+        token, _ = lib.TokenSigner().issue("123456", 1000)
+        self.assertIsNone(lib.TokenSigner().verify(token))
+
+
+class TestRevocationList(unittest.TestCase):
+    def setUp(self):
+        self.revoked = lib.RevocationList()
+        self.signer = lib.TokenSigner(["key"],
+                                      ttl=100)
+
+    def test_revoke(self):
+        claims = self.signer.verify(self.signer.issue("1", 1000)[0])
+        other = self.signer.verify(self.signer.issue("1", 1001)[0])
+        self.revoked.revoke(claims, 1000)
+        self.assertTrue(self.revoked.is_revoked(claims))
+        self.assertFalse(self.revoked.is_revoked(other))
+
+    def test_revoke_user(self):
+        old = self.signer.verify(self.signer.issue("1", 1000)[0])
+        new = self.signer.verify(self.signer.issue("1", 1001)[0])
+        self.revoked.revoke_user("1", 1000, 1100)
+        self.assertTrue(self.revoked.is_revoked(old))
+        self.assertFalse(self.revoked.is_revoked(new))
+
+    def test_expired_entries_removed(self):
+        claims = self.signer.verify(self.signer.issue("1", 1000)[0])
+        self.revoked.revoke(claims, 1000)
+        self.revoked.revoke_user("2", 1000, 1100)
+        self.assertEqual(self.revoked.stats(),
+                         {"tokens": 1, "users": 1})
+        self.revoked.revoke_user("3", 1100, 1200)
+        self.assertEqual(self.revoked.stats(),
+                         {"tokens": 0, "users": 1})
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -43,6 +43,7 @@ class TestDevServer(unittest.TestCase):
     def test_run_with_default_params(self, uvicorn_run_mock: mock.Mock) -> None:
         self.cli_runner.invoke(cli, ["devserver"])
 
+        frame_size = ConfigModel().limits.frame_size
         self.assertEqual(uvicorn_run_mock.call_count, 1)
         self.assertEqual(uvicorn_run_mock.call_args,
                          mock.call(app="server:app",
@@ -50,7 +51,8 @@ class TestDevServer(unittest.TestCase):
                                    port=8080,
                                    log_level="critical",
                                    debug=True,
-                                   reload=True))
+                                   reload=True,
+                                   ws_max_size=frame_size))
 
     def test_run_with_custom_params(self, uvicorn_run_mock: mock.Mock) -> None:
         self.cli_runner.invoke(cli, ("devserver",
@@ -58,6 +60,7 @@ class TestDevServer(unittest.TestCase):
                                      "--port", 8081,
                                      "--on-uvicorn-logger"))
 
+        frame_size = ConfigModel().limits.frame_size
         self.assertEqual(uvicorn_run_mock.call_count, 1)
         self.assertEqual(uvicorn_run_mock.call_args,
                          mock.call(app="server:app",
@@ -65,7 +68,8 @@ class TestDevServer(unittest.TestCase):
                                    port=8081,
                                    log_level="debug",
                                    debug=True,
-                                   reload=True))
+                                   reload=True,
+                                   ws_max_size=frame_size))
 
 
 class TestRestoreConfig(unittest.TestCase):
@@ -136,6 +140,56 @@ class TestDeleteTables(unittest.TestCase):
         self.assertEqual(runner_result.output, f"The database is unavailable, "
                                                f"table not deleted. {DatabaseAccessError()}\n")
 
+
+@mock.patch("manage.DBHandler")
+class TestCompact(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.cli_runner = CliRunner()
+
+    def test_successful_compact(self, dbhandler_mock: mock.Mock):
+        dbhandler_mock().compact.return_value = {"messages": 2,
+                                                 "users": 1,
+                                                 "joins": 3,
+                                                 "pages": 10}
+
+        runner_result = self.cli_runner.invoke(cli,
+                                               ["compact", "--days", "7"])
+
+        database = manage.config_option.database
+        self.assertEqual(dbhandler_mock().compact.call_args,
+                         mock.call(7,
+                                   database.compact_batch_size,
+                                   database.vacuum_pages))
+        self.assertEqual(dbhandler_mock().vacuum.call_count, 0)
+        self.assertEqual(runner_result.output,
+                         "Removed 2 messages, 1 users, "
+                         "3 flow members. Freed 10 pages.\n")
+
+    def test_full_vacuum(self, dbhandler_mock: mock.Mock):
+        dbhandler_mock().compact.return_value = {"messages": 0,
+                                                 "users": 0,
+                                                 "joins": 0,
+                                                 "pages": 0}
+        dbhandler_mock().vacuum.return_value = 5
+
+        runner_result = self.cli_runner.invoke(cli, ["compact", "--full"])
+
+        self.assertEqual(dbhandler_mock().vacuum.call_args,
+                         mock.call(full=True))
+        self.assertIn("Freed 5 pages.", runner_result.output)
+
+    def test_database_not_available(self, dbhandler_mock: mock.Mock):
+        dbhandler_mock().compact.side_effect = DatabaseAccessError()
+
+        runner_result = self.cli_runner.invoke(cli, "compact")
+
+        self.assertEqual(runner_result.output,
+                         f"The database is unavailable, "
+                         f"database not compacted. "
+                         f"{DatabaseAccessError()}\n")
+
+
 @mock.patch("manage.Hash")
 @mock.patch("manage.uuid4")
 @mock.patch("manage.DBHandler")
@@ -196,6 +250,24 @@ class TestCreateUser(unittest.TestCase):
                                    salt=b"salt",
                                    key=b"key"))
 
+
+class TestCalibrateKdf(unittest.TestCase):
+    @mock.patch("manage.calibrate_scrypt")
+    def test_calibrate_kdf(self,
+                           calibrate_mock: mock.Mock):
+        cli_runner = CliRunner()
+
+        calibrate_mock.return_value = [(1024, 0.01),
+                                       (2048, 0.02)]
+
+        runner_result = cli_runner.invoke(cli, ["calibrate-kdf",
+                                                "--target=0.02"])
+
+        self.assertEqual(calibrate_mock.call_args,
+                         mock.call(0.02, 8, 1))
+        self.assertIn("scrypt_n = 2048", runner_result.output)
+
+
 class TestCreateGroup(unittest.TestCase):
     @mock.patch("manage.time")
     @mock.patch("manage.uuid4")
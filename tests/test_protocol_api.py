@@ -132,6 +132,19 @@ class TestApiValidation(unittest.TestCase):
         else:
             self.assertIsNone(self.test)
 
+    def test_fields_in_request(self):
+        result = api.FieldsRequest(user=["uuid", "username"],
+                                   message=["text"])
+        self.assertEqual(result.user, ["uuid", "username"])
+
+    def test_wrong_fields_in_request(self):
+        self.assertRaises(ValidationError,
+                          api.FieldsRequest,
+                          user=["wrong_field"])
+        self.assertRaises(ValidationError,
+                          api.FieldsRequest,
+                          message=["wrong_field"])
+
 
 if __name__ == "__main__":
     unittest.main()
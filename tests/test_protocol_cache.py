@@ -0,0 +1,187 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import threading
+import time
+import unittest
+
+from mod.protocol import api
+from mod.protocol import cache
+from mod.protocol import codec
+from mod.protocol.cache import CachedResponse
+from mod.protocol.cache import ResponseCache
+from mod.protocol.cache import SingleFlight
+
+
+def make_response(time=None):
+    flow = [api.FlowResponse(uuid=str(item),
+                             time=item,
+                             users=["1", "2"])
+            for item in range(3)]
+    return api.Response(type="all_flow",
+                        data=api.DataResponse(time=time,
+                                              flow=flow),
+                        errors=api.ErrorsResponse(code=200,
+                                                  status="OK",
+                                                  time=time or 1,
+                                                  detail="successfully"),
+                        jsonapi=api.VersionResponse(version=api.VERSION,
+                                                    revision=api.REVISION))
+
+
+class TestCachedResponse(unittest.TestCase):
+    def setUp(self):
+        self.entry = CachedResponse(make_response())
+        self.calls = 0
+
+    def encoder(self, response, columnar):
+        self.calls += 1
+        return codec.encode(response, columnar)
+
+    def test_stamp(self):
+        response = self.entry.stamp(123)
+        self.assertEqual(response.data.time, 123)
+        self.assertEqual(response.errors.time, 123)
+        self.assertIsNone(self.entry.response.data.time)
+        self.assertIs(response.data.flow, self.entry.response.data.flow)
+
+    def test_encode(self):
+        for columnar in (False, True):
+            for time_ in (123, 456):
+                self.assertEqual(
+                    self.entry.encode(time_, columnar, self.encoder),
+                    codec.encode(make_response(time_), columnar))
+        self.assertEqual(self.calls, 2)
+
+    def test_encode_without_data(self):
+        response = make_response()
+        response.data = None
+        entry = CachedResponse(response)
+        result = json.loads(entry.encode(123, False, self.encoder))
+        self.assertIsNone(result["data"])
+        self.assertEqual(result["errors"]["time"], 123)
+        entry.encode(456, False, self.encoder)
+        self.assertEqual(self.calls, 1)
+
+    def test_marker_in_data(self):
+        response = make_response()
+        response.data.flow[0].time = cache.TIME_MARKER
+        entry = CachedResponse(response)
+        self.assertEqual(entry.encode(123, False, self.encoder),
+                         codec.encode(entry.stamp(123), False))
+        entry.encode(123, False, self.encoder)
+        self.assertEqual(self.calls, 3)
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(max_entries=2)
+
+    def test_wrong_size(self):
+        self.assertRaises(ValueError, ResponseCache, 0)
+
+    def test_get(self):
+        self.assertIsNone(self.cache.get(("all_flow", 1)))
+        entry = self.cache.put(("all_flow", 1), make_response())
+        self.assertIs(self.cache.get(("all_flow", 1)), entry)
+        self.assertIs(self.cache.put(("all_flow", 1), make_response()),
+                      entry)
+        stats = self.cache.stats()
+        self.assertEqual((stats["size"], stats["hits"], stats["misses"]),
+                         (1, 1, 1))
+
+    def test_lru_eviction(self):
+        for version in range(3):
+            self.cache.put(("all_flow", version), make_response())
+            self.cache.get(("all_flow", 0))
+        self.assertIsNotNone(self.cache.get(("all_flow", 0)))
+        self.assertIsNone(self.cache.get(("all_flow", 1)))
+
+    def test_clear(self):
+        self.cache.put(("all_flow", 1), make_response())
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Condition is not reached")
+        time.sleep(0.001)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def func(self):
+        self.calls += 1
+        self.release.wait(5)
+        return object()
+
+    def run_concurrently(self, func, quantity=3):
+        results = []
+
+        def call():
+            try:
+                results.append(self.flights.do("key", func))
+            except Exception as ERROR:
+                results.append(ERROR)
+
+        threads = [threading.Thread(target=call) for _ in range(quantity)]
+        for thread in threads:
+            thread.start()
+        wait_for(lambda: self.flights.stats()["shared"] == quantity - 1)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_shared(self):
+        results = self.run_concurrently(self.func)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len({id(result) for result, _ in results}), 1)
+        self.assertEqual(sorted(shared for _, shared in results),
+                         [False, True, True])
+        self.assertEqual(self.flights.stats(),
+                         {"in_progress": 0, "leaders": 1, "shared": 2})
+
+    def test_exception_shared(self):
+        def func():
+            self.release.wait(5)
+            raise ValueError("error")
+
+        results = self.run_concurrently(func)
+        self.assertTrue(all(isinstance(item, ValueError)
+                            for item in results))
+        self.assertEqual(self.flights.stats()["in_progress"], 0)
+
+    def test_finished_call_is_not_shared(self):
+        self.release.set()
+        first, shared = self.flights.do("key", self.func)
+        second, _ = self.flights.do("key", self.func)
+        self.assertFalse(shared)
+        self.assertIsNot(first, second)
+        self.assertEqual(self.calls, 2)
@@ -0,0 +1,94 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import unittest
+
+from mod.protocol import api
+from mod.protocol import codec
+
+
+class TestColumns(unittest.TestCase):
+    def setUp(self):
+        self.items = [{"uuid": "1", "text": None, "time": None},
+                      {"uuid": "2", "text": "Hi", "time": None},
+                      {"uuid": "3", "text": "Hello", "time": None},
+                      {"uuid": "4", "text": None, "time": None},
+                      {"uuid": "5", "text": "Bye", "time": None}]
+
+    def test_to_columns(self):
+        result = codec.to_columns(self.items)
+        self.assertEqual(result["count"], 5)
+        self.assertEqual(result["columns"]["uuid"],
+                         [[0, ["1", "2", "3", "4", "5"]]])
+        self.assertEqual(result["columns"]["text"],
+                         [[1, ["Hi", "Hello"]], [4, ["Bye"]]])
+
+    def test_null_column_omitted(self):
+        result = codec.to_columns(self.items)
+        self.assertNotIn("time", result["columns"])
+
+    def test_from_columns(self):
+        result = codec.from_columns(codec.to_columns(self.items))
+        self.assertEqual([item["uuid"] for item in result],
+                         ["1", "2", "3", "4", "5"])
+        self.assertEqual(result[3]["text"], None)
+        self.assertEqual(result[4]["text"], "Bye")
+
+    def test_empty_list(self):
+        result = codec.to_columns([])
+        self.assertEqual(result, {"count": 0, "columns": {}})
+
+
+class TestEncode(unittest.TestCase):
+    def setUp(self):
+        message = [api.MessageResponse(uuid=str(item),
+                                       text=f"Hello{item}",
+                                       emoji=b"emoji")
+                   for item in range(3)]
+        self.response = api.Response(
+            type="all_messages",
+            data=api.DataResponse(time=111,
+                                  message=message),
+            jsonapi=api.VersionResponse(version=api.VERSION))
+
+    def test_encode_not_columnar(self):
+        self.assertEqual(codec.encode(self.response),
+                         self.response.json())
+
+    def test_encode_columnar(self):
+        result = json.loads(codec.encode(self.response, True))
+        message = result["data"]["message"]
+        self.assertEqual(message["count"], 3)
+        self.assertEqual(message["columns"]["uuid"],
+                         [[0, ["0", "1", "2"]]])
+        self.assertEqual(message["columns"]["emoji"],
+                         [[0, ["emoji", "emoji", "emoji"]]])
+        self.assertNotIn("file_video", message["columns"])
+        self.assertEqual(result["data"]["time"], 111)
+
+    def test_encode_columnar_smaller(self):
+        self.assertLess(len(codec.encode(self.response, True)),
+                        len(codec.encode(self.response)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import unittest
+
+from mod.protocol.ratelimit import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(burst=3,
+                                   per_minute=6,
+                                   max_keys=10,
+                                   sweep_interval=60,
+                                   clock=self.clock)
+
+    def test_burst(self):
+        self.assertEqual([self.limiter.allow("key") for _ in range(4)],
+                         [True, True, True, False])
+        self.assertTrue(self.limiter.allow("other"))
+        self.assertEqual(self.limiter.stats(),
+                         {"keys": 2, "rejected": 1})
+
+    def test_tokens_restored(self):
+        for _ in range(3):
+            self.limiter.allow("key")
+        self.clock.now += 9
+        self.assertFalse(self.limiter.allow("key"))
+        self.clock.now += 1
+        self.assertTrue(self.limiter.allow("key"))
+        self.assertFalse(self.limiter.allow("key"))
+
+    def test_rejected_attempt_takes_no_token(self):
+        for _ in range(10):
+            self.limiter.allow("key")
+        self.clock.now += 10
+        self.assertTrue(self.limiter.allow("key"))
+
+    def test_sweep(self):
+        self.limiter.allow("key")
+        self.limiter.allow("other")
+        self.limiter.allow("other")
+        self.clock.now += 10
+        self.assertEqual(self.limiter.sweep(), 1)
+        self.assertEqual(self.limiter.stats()["keys"], 1)
+
+    def test_periodic_sweep(self):
+        self.limiter.allow("key")
+        self.clock.now += 60
+        self.limiter.allow("other")
+        self.assertEqual(self.limiter.stats()["keys"], 1)
+
+    def test_max_keys(self):
+        for number in range(12):
+            self.limiter.allow(str(number))
+        self.limiter.allow("0")
+        self.assertEqual(self.limiter.stats()["keys"], 10)
+        self.assertEqual(self.limiter.allow("0"), True)
+        self.assertEqual([self.limiter.allow("3") for _ in range(3)],
+                         [True, True, False])
+
+    def test_disabled(self):
+        limiter = RateLimiter(burst=0,
+                              per_minute=6)
+        self.assertTrue(all(limiter.allow("key") for _ in range(100)))
+        self.assertEqual(limiter.stats()["keys"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import os
+import threading
+import unittest
+
+from loguru import logger
+
+from mod.config.models import ConfigModel
+from mod.db.dbhandler import DBHandler
+from mod.protocol import api
+from mod.protocol import registry
+from mod.protocol import worker
+from mod.protocol.registry import RequestContext
+from mod.protocol.session import Session
+
+BASE_PATH = os.path.abspath(os.path.dirname(__file__))
+FIXTURES_PATH = os.path.join(BASE_PATH, "fixtures")
+PING_PONG = os.path.join(FIXTURES_PATH, "ping_pong.json")
+
+DATABASE = "sqlite:/:memory:"
+
+
+class TestHandlerRegistry(unittest.TestCase):
+    def tearDown(self):
+        registry.HANDLERS.pop("test_type", None)
+
+    def test_registered_handlers(self):
+        for name in ("hello", "register_user", "authentication",
+                     "get_update", "send_message", "all_messages",
+                     "add_flow", "all_flow", "user_info", "delete_user",
+                     "delete_message", "edited_message", "ping_pong"):
+            self.assertIsNotNone(registry.get_handler(name))
+
+    def test_auth_of_handlers(self):
+        self.assertIsNone(registry.get_handler("hello").auth)
+        self.assertFalse(registry.get_handler("register_user").auth)
+        self.assertTrue(registry.get_handler("send_message").auth)
+
+    def test_not_registered(self):
+        self.assertIsNone(registry.get_handler("wrong_type"))
+
+    def test_register_and_stats(self):
+        @registry.handler("test_type", auth=None)
+        def test_handler(ctx):
+            return ctx
+
+        self.assertEqual(test_handler("context"), "context")
+        stats = registry.get_stats()["test_type"]
+        self.assertEqual(stats["count"], 1)
+        self.assertGreaterEqual(stats["max_time"], 0.0)
+
+    def test_stats_from_threads(self):
+        stats = registry.HandlerStats()
+
+        def add():
+            for _ in range(10000):
+                stats.add(0.001)
+
+        threads = [threading.Thread(target=add) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(stats.as_dict()["count"], 40000)
+
+
+class TestDispatch(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logger.remove()
+        cls.db = DBHandler(uri=DATABASE)
+        cls.config = ConfigModel()
+
+    def setUp(self):
+        self.db.create_table()
+        self.db.add_user(uuid="123456",
+                         login="login",
+                         password="password",
+                         auth_id="auth_id")
+        self.test = api.Request.parse_file(PING_PONG)
+
+    def tearDown(self):
+        self.db.delete_table()
+        del self.test
+
+    def test_context_is_not_shared(self):
+        session = Session()
+        first = RequestContext(self.db, self.config, session)
+        second = RequestContext(self.db, self.config, session)
+        worker.process(self.test.dict(), first)
+        self.assertIsNotNone(first.request)
+        self.assertIsNone(second.request)
+
+    def test_process(self):
+        ctx = RequestContext(self.db, self.config, Session())
+        response = worker.process(self.test.dict(), ctx)
+        self.assertEqual(response.errors.code, 200)
+
+    def test_process_not_valid(self):
+        ctx = RequestContext(self.db, self.config, Session())
+        response = worker.process({"data": None}, ctx)
+        self.assertEqual(response.errors.code, 415)
+
+    def test_process_without_user(self):
+        ctx = RequestContext(self.db, self.config, Session())
+        response = worker.process({"type": "ping_pong"}, ctx)
+        self.assertEqual(response.errors.code, 401)
+
+    def test_handler_stats(self):
+        count = registry.get_stats()["ping_pong"]["count"]
+        ctx = RequestContext(self.db, self.config, Session())
+        worker.process(self.test.dict(), ctx)
+        self.assertEqual(registry.get_stats()["ping_pong"]["count"],
+                         count + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Copyright (c) 2022 - present MoreliaTalk team and other.
+Look at the file AUTHORS.md(located at the root of the project) to get the
+full list.
+
+This file is part of Morelia Server.
+
+Morelia Server is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Morelia Server is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import unittest
+
+from mod.protocol.session import is_version_supported
+from mod.protocol.session import parse_version
+from mod.protocol.session import Session
+
+
+class TestParseVersion(unittest.TestCase):
+    def test_parse_version(self):
+        self.assertEqual(parse_version("1.0"), (1, 0))
+
+    def test_numeric_compare(self):
+        self.assertGreater(parse_version("1.10"), parse_version("1.9"))
+
+    def test_wrong_version(self):
+        self.assertRaises(ValueError, parse_version, "one.zero")
+
+
+class TestIsVersionSupported(unittest.TestCase):
+    def test_supported(self):
+        self.assertTrue(is_version_supported("1.10", "1.0", "1.12"))
+
+    def test_not_supported(self):
+        self.assertFalse(is_version_supported("1.10", "1.0", "1.9"))
+        self.assertFalse(is_version_supported("0.9", "1.0", "1.9"))
+
+    def test_not_valid_version(self):
+        self.assertFalse(is_version_supported("abc", "1.0", "1.9"))
+
+
+class TestSession(unittest.TestCase):
+    def test_new_session(self):
+        session = Session("127.0.0.1")
+        self.assertFalse(session.negotiated)
+        self.assertEqual(session.codec, "json")
+        self.assertEqual(session.host, "127.0.0.1")
+
+    def test_negotiate(self):
+        session = Session()
+        session.negotiate("1.0", "json", ["columnar", "unknown_feature"])
+        self.assertTrue(session.negotiated)
+        self.assertEqual(session.version, "1.0")
+        self.assertEqual(session.features, frozenset(("columnar",)))
+
+
+if __name__ == "__main__":
+    unittest.main()
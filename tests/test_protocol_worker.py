@@ -21,19 +21,26 @@ along with Morelia Server. If not, see <https://www.gnu.org/licenses/>.
 
 # TODO: need refactor all module
 
+from concurrent.futures import Future
 import json
 import os
+import threading
+import time
 import unittest
+from unittest import mock
 from uuid import uuid4
 
 from loguru import logger
 
 from mod.config.models import ConfigModel
 from mod.protocol import api
+from mod.protocol import worker
 from mod import lib
 from mod.db.dbhandler import DBHandler
 from mod.protocol.worker import MTProtocol
 from mod.protocol.worker import MTPErrorResponse
+from mod.protocol.registry import RequestContext
+from mod.protocol.session import Session
 
 # Add path to directory with code being checked
 # to variable 'PATH' to import modules from directory
@@ -155,6 +162,7 @@ class TestRegisterUser(unittest.TestCase):
     def setUp(self):
         self.db.create_table()
         self.test = api.Request.parse_file(REGISTER_USER)
+        worker.LIMITERS.clear()
 
     def tearDown(self):
         self.db.delete_table()
@@ -337,6 +345,44 @@ class TestGetUpdate(unittest.TestCase):
         self.assertEqual(result["data"]["user"][2]["uuid"],
                          "666555")
 
+    def test_update_requested_fields(self):
+        self.test.data.fields = api.FieldsRequest(user=["username"],
+                                                  message=["from_flow"])
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["data"]["user"][2],
+                         {"uuid": "666555", "username": None})
+        self.assertEqual(result["data"]["message"][1],
+                         {"uuid": "112", "from_flow": "07d949"})
+        self.assertEqual(result["data"]["flow"][0]["owner"], "123456")
+
+    def test_update_not_modified(self):
+        self.test.data.time = int(time.time()) + 1
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["code"], 304)
+        self.assertEqual(result["errors"]["time"], result["data"]["time"])
+        self.assertIsNone(result["data"]["message"])
+
+    def test_update_modified(self):
+        self.test.data.time = int(time.time())
+        self.db.add_message(flow_uuid="07d949",
+                            user_uuid="123456",
+                            message_uuid="116",
+                            text="Hello3",
+                            time=self.test.data.time + 1)
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["status"], "OK")
+        self.assertEqual(result["data"]["message"][0]["uuid"], "116")
+
+
     @unittest.skip("Не работает, пока не будет добавлен фильтр по времени")
     def test_no_new_data_in_database(self):
         self.test.data.time = 444
@@ -380,6 +426,19 @@ class TestSendMessage(unittest.TestCase):
         self.assertEqual(result["errors"]["status"],
                          "OK")
 
+    def test_send_message_timeout(self):
+        config = ConfigModel()
+        config.database.write_timeout = 0.01
+        with mock.patch.object(self.db,
+                               "submit_message",
+                               return_value=Future()):
+            run_method = MTProtocol(self.test,
+                                    self.db,
+                                    config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["status"],
+                         "Service Unavailable")
+
     def test_check_id_in_response(self):
         run_method = MTProtocol(self.test,
                                 self.db,
@@ -549,6 +608,98 @@ class TestAllMessages(unittest.TestCase):
                          "Not Found")
 
 
+    def test_all_message_requested_fields(self):
+        self.test.data.flow[0].uuid = "07d950"
+        self.test.data.fields = api.FieldsRequest(message=["text",
+                                                           "from_user"])
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["status"], "OK")
+        self.assertEqual(result["data"]["message"][-1],
+                         {"uuid": "2715207240631768797",
+                          "text": "Privet",
+                          "from_user": "654321"})
+
+    def test_all_message_requested_fields_partial(self):
+        self.test.data.fields = api.FieldsRequest(message=["time"])
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["status"], "Partial Content")
+        self.assertEqual(set(result["data"]["message"][0]),
+                         {"uuid", "time"})
+
+    def test_all_message_archived(self):
+        self.db.archive_messages(50)
+        self.test.data.flow[0].uuid = "07d950"
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["status"], "OK")
+        self.assertEqual(len(result["data"]["message"]),
+                         self.limit_message - 11)
+        self.assertEqual(result["data"]["message"][0]["text"], "Kak Dela2")
+        self.assertEqual(result["data"]["message"][-1]["text"], "Privet")
+
+    def test_all_message_coalesced(self):
+        self.test.data.fields = api.FieldsRequest(message=["text"])
+        shared = worker.FLIGHTS.stats()["shared"]
+        contexts = [RequestContext(self.db, self.config, Session(), self.test)
+                    for _ in range(2)]
+        responses = []
+
+        def build(ctx):
+            deadline = time.monotonic() + 5
+            while worker.FLIGHTS.stats()["shared"] == shared \
+                    and time.monotonic() < deadline:
+                time.sleep(0.001)
+            ctx.projections["message"] = ("uuid", "text")
+            return worker.error_response("OK")
+
+        def request(ctx):
+            responses.append(worker.coalesced_response(ctx, build))
+
+        threads = [threading.Thread(target=request, args=(ctx,))
+                   for ctx in contexts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(worker.FLIGHTS.stats()["shared"], shared + 1)
+        self.assertEqual(len(responses), 2)
+        self.assertIs(contexts[0].cached[0], contexts[1].cached[0])
+        for ctx in contexts:
+            self.assertEqual(ctx.projections,
+                             {"message": ("uuid", "text")})
+
+    def test_all_message_recent_changes(self):
+        self.test.data.flow[0].uuid = "07d950"
+        MTProtocol(self.test,
+                   self.db,
+                   self.config)
+        self.db.update_message("2715207240631768797",
+                               text="Poka")
+        self.db.add_message(flow_uuid="07d950",
+                            user_uuid="123456",
+                            message_uuid="1",
+                            text="New",
+                            time=667)
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertGreater(self.db.recent_stats()["hits"], 0)
+        self.assertEqual(result["data"]["message"][-2]["text"], "Poka")
+        self.assertEqual(result["data"]["message"][-1]["text"], "New")
+        self.assertEqual(result["data"]["message"][-1]["from_user"],
+                         "123456")
+
+
 class TestAddFlow(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -616,6 +767,16 @@ class TestAddFlow(unittest.TestCase):
         self.assertEqual(result["errors"]["status"],
                          "Bad Request")
 
+    def test_add_flow_wrong_user(self):
+        self.test.data.flow[0].users.append("wrong_user")
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["status"],
+                         "Not Found")
+        self.assertEqual(self.db.get_flow_by_title("title").count(), 0)
+
     def test_check_flow_in_database(self):
         run_method = MTProtocol(self.test,
                                 self.db,
@@ -667,6 +828,47 @@ class TestAllFlow(unittest.TestCase):
         self.assertEqual(result["errors"]["status"],
                          "Not Found")
 
+    def test_all_flow_cached(self):
+        self.db.add_flow(uuid="07d949",
+                         users=["123456"],
+                         owner="123456")
+        first = MTProtocol(self.test,
+                           self.db,
+                           self.config)
+        hits = worker.RESPONSES.stats()["hits"]
+        second = MTProtocol(self.test,
+                            self.db,
+                            self.config)
+        self.assertEqual(worker.RESPONSES.stats()["hits"], hits + 1)
+        self.assertEqual(first.get_response(), second.get_response())
+        self.assertEqual(json.loads(second.get_response())["data"]["time"],
+                         second._context.current_time)
+
+    def test_all_flow_changed(self):
+        MTProtocol(self.test,
+                   self.db,
+                   self.config)
+        self.db.add_flow(uuid="07d949",
+                         users=["123456"],
+                         owner="123456")
+        self.db.add_user(uuid="654321",
+                         login="login2",
+                         password="password")
+        self.db.add_flow_members("07d949", ["654321"])
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["status"], "OK")
+        self.assertEqual(result["data"]["flow"][0]["users"],
+                         ["123456", "654321"])
+        self.db.update_flow("07d949", title="new")
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["data"]["flow"][0]["title"], "new")
+
 
 class TestUserInfo(unittest.TestCase):
     @classmethod
@@ -718,6 +920,36 @@ class TestUserInfo(unittest.TestCase):
         self.assertEqual(result["errors"]["status"],
                          "Too Many Requests")
 
+    def test_user_info_not_found(self):
+        self.test.data.user.append(api.UserRequest(uuid="wrong_uuid"))
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["code"], 520)
+        self.assertEqual(len(result["data"]["user"]), 4)
+
+    def test_user_info_requested_fields(self):
+        self.test.data.fields = api.FieldsRequest(user=["username"])
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["status"], "OK")
+        self.assertEqual(len(result["data"]["user"]), 4)
+        self.assertEqual(result["data"]["user"][0],
+                         {"uuid": "123457", "username": "username"})
+
+    def test_user_info_not_allowed_fields(self):
+        self.test.data.fields = api.FieldsRequest(user=["password",
+                                                        "bio"])
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["data"]["user"][0],
+                         {"uuid": "123457", "bio": "bio"})
+
 
 class TestAuthentication(unittest.TestCase):
     @classmethod
@@ -738,6 +970,7 @@ class TestAuthentication(unittest.TestCase):
                          salt=b"salt",
                          key=b"key")
         self.test = api.Request.parse_file(AUTH)
+        worker.LIMITERS.clear()
 
     def tearDown(self):
         self.db.delete_table()
@@ -751,6 +984,60 @@ class TestAuthentication(unittest.TestCase):
         self.assertEqual(result["errors"]["status"],
                          "OK")
 
+    def test_new_auth_id_is_checked(self):
+        self.assertIsNone(self.db.get_user_identity("123456").auth_id)
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        auth_id = result["data"]["user"][0]["auth_id"]
+        self.assertTrue(run_method._check_auth("123456",
+                                               auth_id).result)
+
+    def test_legacy_hash_rehashed(self):
+        MTProtocol(self.test,
+                   self.db,
+                   self.config)
+        dbquery = self.db.get_user_by_login("login")
+        self.assertTrue(dbquery.hash_password.startswith("scrypt$"))
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["status"], "OK")
+
+    def test_login_rate_limit(self):
+        self.test.data.user[0].password = "wrong_password"
+        for _ in range(self.config.limits.auth_login_burst):
+            run_method = MTProtocol(self.test,
+                                    self.db,
+                                    self.config)
+            result = json.loads(run_method.get_response())
+            self.assertEqual(result["errors"]["status"], "Unauthorized")
+        with mock.patch.object(worker.PASSWORDS,
+                               "check_password") as check_password:
+            run_method = MTProtocol(self.test,
+                                    self.db,
+                                    self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["type"], "authentication")
+        self.assertEqual(result["errors"]["code"], 429)
+        self.assertEqual(result["errors"]["detail"],
+                         "Too many attempts for login")
+        self.assertFalse(check_password.called)
+
+    def test_host_rate_limit(self):
+        session = Session(host="127.0.0.1")
+        for number in range(self.config.limits.auth_host_burst + 1):
+            self.test.data.user[0].login = f"login{number}"
+            run_method = MTProtocol(self.test,
+                                    self.db,
+                                    self.config,
+                                    session)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["detail"],
+                         "Too many attempts from client address")
+
     def test_blank_database(self):
         login = self.test.data.user[0].login
         dbquery = self.db.get_user_by_login(login)
@@ -831,6 +1118,122 @@ class TestDeleteUser(unittest.TestCase):
                          "Not Found")
 
 
+    def test_delete_user_revokes_tokens(self):
+        token, _ = worker.get_signer(self.config).issue(
+            "123456", int(time.time()))
+        MTProtocol(self.test,
+                   self.db,
+                   self.config)
+        check_auth = worker.check_auth(self.db,
+                                       "123456",
+                                       token,
+                                       worker.get_signer(self.config))
+        self.assertEqual(check_auth.error_message,
+                         "Token was revoked")
+        worker.REVOKED.clear()
+
+    def test_deleted_user_token_after_restart(self):
+        token, _ = worker.get_signer(self.config).issue(
+            "123456", int(time.time()))
+        MTProtocol(self.test,
+                   self.db,
+                   self.config)
+        # List of revoked tokens is lost by restart of server
+        worker.REVOKED.clear()
+        check_auth = worker.check_auth(self.db,
+                                       "123456",
+                                       token,
+                                       worker.get_signer(self.config))
+        self.assertFalse(check_auth.result)
+        self.assertEqual(check_auth.error_message,
+                         "User was deleted")
+
+
+class TestSignedToken(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logger.remove()
+        cls.db = DBHandler(uri=DATABASE)
+        cls.config = ConfigModel()
+        cls.config.auth.secret_keys = ["key"]
+
+    def setUp(self):
+        self.db.create_table()
+        self.db.add_user(uuid="123456",
+                         login="login",
+                         password="password",
+                         auth_id="auth_id")
+        self.signer = worker.get_signer(self.config)
+        self.token, _ = self.signer.issue("123456", int(time.time()))
+        self.test = api.Request.parse_file(PING_PONG)
+        self.test.data.user[0].auth_id = self.token
+
+    def tearDown(self):
+        self.db.delete_table()
+        worker.REVOKED.clear()
+        del self.test
+
+    def test_signed_token(self):
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["status"], "OK")
+
+    def test_token_of_other_user(self):
+        self.test.data.user[0].uuid = "987654"
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["status"], "Unauthorized")
+
+    def test_expired_token(self):
+        token, _ = self.signer.issue("123456",
+                                     int(time.time()) - 86400)
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        check_auth = run_method._check_auth("123456",
+                                            token)
+        self.assertFalse(check_auth.result)
+        self.assertEqual(check_auth.error_message,
+                         "Token has expired")
+
+    def test_refresh_token(self):
+        self.test.type = "refresh_token"
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["status"], "OK")
+        auth_id = result["data"]["user"][0]["auth_id"]
+        self.assertTrue(run_method._check_auth("123456",
+                                               auth_id).result)
+        self.assertEqual(run_method._check_auth("123456",
+                                                self.token).error_message,
+                         "Token was revoked")
+
+    def test_revoke_token(self):
+        self.test.type = "revoke_token"
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["status"], "OK")
+        self.assertFalse(run_method._check_auth("123456",
+                                                self.token).result)
+
+    def test_revoke_not_signed_token(self):
+        self.test.type = "revoke_token"
+        self.test.data.user[0].auth_id = "auth_id"
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["status"], "Bad Request")
+
+
 class TestDeleteMessage(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -1115,5 +1518,153 @@ class TestCheckProtocolVersion(unittest.TestCase):
         self.assertEqual(result["errors"]["status"], "Version Not Supported")
 
 
+class TestRequestLimits(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logger.remove()
+        cls.db = DBHandler(uri=DATABASE)
+
+    def setUp(self):
+        self.config = ConfigModel()
+        self.db.create_table()
+        self.db.add_user(uuid="123456",
+                         login="login",
+                         password="password",
+                         auth_id="auth_id")
+        self.db.add_flow(uuid="07d949",
+                         users=["123456"],
+                         time_created=111,
+                         flow_type="group",
+                         owner="123456")
+
+    def tearDown(self):
+        self.db.delete_table()
+
+    def test_text_longer_than_limit(self):
+        self.config.limits.text_length = 5
+        self.test = api.Request.parse_file(SEND_MESSAGE)
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["code"], 413)
+        self.assertEqual(self.db.get_message_by_text("Hello!").count(), 0)
+
+    def test_attachment_larger_than_limit(self):
+        self.config.limits.attachment_size = 5
+        self.test = api.Request.parse_file(SEND_MESSAGE)
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["code"], 413)
+
+    def test_flow_users_more_than_limit(self):
+        self.config.limits.flow_users = 1
+        self.test = api.Request.parse_file(ADD_FLOW)
+        self.test.data.flow[0].users = ["123456", "654321"]
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["code"], 413)
+
+    def test_request_within_limits(self):
+        self.test = api.Request.parse_file(SEND_MESSAGE)
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["status"], "OK")
+
+
+class TestHello(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logger.remove()
+        cls.db = DBHandler(uri=DATABASE)
+        cls.config = ConfigModel()
+
+    def setUp(self):
+        self.db.create_table()
+        self.db.add_user(uuid="123456",
+                         login="login",
+                         password="password",
+                         auth_id="auth_id")
+        self.session = Session()
+        self.test = {"type": "hello",
+                     "jsonapi": {"version": "1.0"},
+                     "meta": {"codec": "json"}}
+
+    def tearDown(self):
+        self.db.delete_table()
+        del self.test
+
+    def test_hello(self):
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config,
+                                self.session)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["status"], "OK")
+        self.assertEqual(result["meta"]["version"], "1.0")
+        self.assertEqual(result["meta"]["codec"], "json")
+        self.assertTrue(self.session.negotiated)
+
+    def test_hello_wrong_version(self):
+        self.test["jsonapi"]["version"] = "1.10"
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config,
+                                self.session)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["code"], 505)
+        self.assertFalse(self.session.negotiated)
+
+    def test_hello_wrong_codec(self):
+        self.test["meta"]["codec"] = "xml"
+        run_method = MTProtocol(self.test,
+                                self.db,
+                                self.config,
+                                self.session)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["code"], 415)
+        self.assertFalse(self.session.negotiated)
+
+    def test_request_without_jsonapi_after_hello(self):
+        MTProtocol(self.test, self.db, self.config, self.session)
+        request = json.loads(api.Request.parse_file(PING_PONG).json())
+        del request["jsonapi"]
+        run_method = MTProtocol(request,
+                                self.db,
+                                self.config,
+                                self.session)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["status"], "OK")
+
+    def test_columnar_response_after_hello(self):
+        self.test["meta"]["features"] = ["columnar"]
+        MTProtocol(self.test, self.db, self.config, self.session)
+        request = api.Request.parse_file(GET_UPDATE)
+        run_method = MTProtocol(request,
+                                self.db,
+                                self.config,
+                                self.session)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["data"]["user"]["count"], 1)
+        self.assertEqual(result["data"]["user"]["columns"]["uuid"],
+                         [[0, ["123456"]]])
+
+    def test_request_without_jsonapi_before_hello(self):
+        request = json.loads(api.Request.parse_file(PING_PONG).json())
+        del request["jsonapi"]
+        run_method = MTProtocol(request,
+                                self.db,
+                                self.config,
+                                self.session)
+        result = json.loads(run_method.get_response())
+        self.assertEqual(result["errors"]["code"], 505)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -80,5 +80,33 @@ class TestWebsocket(unittest.TestCase):
                 connection.receive_bytes()
 
 
+class TestFrameSizeLimit(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logger.remove()
+
+    @patch("server.DBHandler")
+    def test_send_oversize_message(self, _):
+        server = MoreliaServer()
+        server._config_options.limits.frame_size = 64
+        ws_client = TestClient(server.get_starlette_app())
+        with ws_client.websocket_connect("/ws") as connection:
+            connection.send_text("x" * 65)
+            response = connection.receive_json()
+            self.assertEqual(response["errors"]["code"], 413)
+            self.assertEqual(response["type"], "error")
+
+    @patch("server.DBHandler")
+    def test_frame_size_in_bytes(self, _):
+        server = MoreliaServer()
+        server._config_options.limits.frame_size = 64
+        ws_client = TestClient(server.get_starlette_app())
+        with ws_client.websocket_connect("/ws") as connection:
+            # 40 characters take 80 bytes in UTF-8
+            connection.send_text("я" * 40)
+            response = connection.receive_json()
+            self.assertEqual(response["errors"]["code"], 413)
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file